@@ -0,0 +1,758 @@
+"""
+<Purpose>
+  Benchmark every stage of parsing system call definitions, offline.
+
+  The corpus directory holds the man pages behind the 389 system call names
+  of definitions.txt and the syscalls man page, so no man installation is
+  needed:
+    corpus/man/        the roff source of the pages, as found in
+                       /usr/share/man, including the pages redirected to.
+    corpus/rendered/   the text of each page up to its DESCRIPTION line, as
+                       read by SyscallManual.read_man_page, and the whole text
+                       of the syscalls page. It is read with a DirectorySource.
+
+  The stages timed are:
+    syscall_names         parse_syscall_names_list over the syscalls page.
+    read_rendered         reading the rendered page of every name.
+    read_roff             read_roff_man_page for every name.
+    parse_definition      SyscallManual over the page of every name, ie
+                          SyscallManual._parse_definition.
+    definition            Definition over every definition found.
+    definition_file       Definition over the definitions listed in
+                          definitions.txt, ie in the output of
+                          parse_syscall_definitions.py.
+    parameter             SyscallParameter over every parameter found.
+    pickle_dump           dump_definitions of all SyscallManual objects.
+    pickle_load           load_definitions of the same pickle.
+    decode_strace         decode_line over an strace line for every
+                          definition found, with and without strings and
+                          structures as arguments.
+    ctypes_prototype      calls to getpid, getppid, getuid, geteuid, getgid
+                          and getegid through the module of ctypes prototypes
+                          generated by sysDef.CtypesGenerator.
+    ctypes_getattr        the same calls looked up on a ctypes.CDLL object
+                          with getattr for every call, to compare with.
+    server_lookup         a lookup of every name through a DefinitionsClient
+                          connected to a DefinitionsServer, run by a thread of
+                          the benchmark, serving the same pickle.
+    syscalls_per_library  syscalls_per_library over all SyscallManual
+                          objects and the libraries of syscall_libraries.py.
+    import_libraries      a python process importing syscall_libraries.
+    find_libc             a python process importing syscall_libraries and
+                          finding libc, with the path of libc already cached
+                          by an earlier run.
+
+  Each stage is run several times and the best time is kept. Its throughput,
+  the peak memory it allocates and the number of memory blocks still
+  allocated once it returns, not the number of allocations it makes, are
+  reported. Memory is traced with tracemalloc, so it is only reported by
+  python 3. syscalls_per_library comes from the python 2 program
+  syscall_libraries.py and is only run by python 2, as are import_libraries
+  and find_libc, which also report the number of processes spawned by the
+  python process they run. The parameter cache is cleared before every run
+  so all parameters are parsed.
+
+  The results are compared against the stored baseline of the same major
+  python version. A stage is a regression if its time per item, its peak
+  memory or the number of processes it spawns is more than the tolerance above
+  the baseline.
+
+  Example running this program:
+
+  running:
+    python benchmarks/benchmark.py
+
+  will run all the stages and compare them to benchmarks/baseline.json,
+  exiting with status 1 if there is a regression, and running:
+    python benchmarks/benchmark.py --save-baseline
+
+  will store the results as the new baseline. The corpus is rebuilt from the
+  man pages of the system with:
+    python benchmarks/benchmark.py --make-corpus
+
+"""
+
+import argparse
+import atexit
+import ctypes
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIRECTORY))
+
+from sysDef import RoffManual
+from sysDef.Definition import Definition
+from sysDef.DefinitionsPickle import dump_definitions
+from sysDef.DefinitionsPickle import load_definitions
+from sysDef.ManPageSource import DirectorySource
+from sysDef.SyscallManual import SyscallManual
+from sysDef.SyscallManual import parse_syscall_names_list
+from sysDef.SyscallParameter import SyscallParameter
+from sysDef.SyscallParameter import parameter_cache
+from sysDef.StraceDecoder import build_argument_table
+from sysDef.StraceDecoder import decode_line
+from sysDef.CtypesGenerator import write_prototypes_module
+from sysDef.DefinitionsClient import DefinitionsClient
+from sysDef.DefinitionsServer import DefinitionsServer
+
+
+CORPUS_DIRECTORY = os.path.join(BENCHMARKS_DIRECTORY, "corpus")
+BASELINE_FILE = os.path.join(BENCHMARKS_DIRECTORY, "baseline.json")
+DEFINITIONS_FILE = os.path.join(os.path.dirname(BENCHMARKS_DIRECTORY),
+                                "definitions.txt")
+
+# the number of times each stage is run, and how much slower or larger than
+# the baseline a stage can be.
+REPEAT = 5
+TOLERANCE = 0.25
+
+# each timed run calls the stage as many times as it takes to last at least
+# this long, so that short stages are not dominated by timer noise.
+MIN_RUN_SECONDS = 0.2
+
+# the libc functions called by the ctypes stages, harmless and without
+# arguments.
+CTYPES_CALLS = ["getpid", "getppid", "getuid", "geteuid", "getgid", "getegid"]
+
+# run by a child python to import syscall_libraries from the directory given
+# as its first argument and, if its second argument is libc, to find libc with
+# the cache file given as its third. Prints the number of processes spawned.
+_LIBRARIES_SCRIPT = """
+import subprocess
+import sys
+
+spawned = []
+execute_child = subprocess.Popen._execute_child
+
+def count_child(self, *args, **kwargs):
+    spawned.append(args[0])
+    return execute_child(self, *args, **kwargs)
+
+subprocess.Popen._execute_child = count_child
+
+sys.path.insert(0, sys.argv[1])
+import syscall_libraries
+if sys.argv[2] == "libc":
+    syscall_libraries.get_libc_name(sys.argv[3])
+
+sys.stdout.write(str(len(spawned)))
+"""
+
+# the python version the results and the baseline refer to.
+PYTHON = "python" + str(sys.version_info[0])
+
+
+
+def get_corpus_names():
+    """
+    Returns the list of the system call names of definitions.txt, in order.
+    """
+
+    names = []
+    definitions_file = open(DEFINITIONS_FILE)
+    try:
+        for line in definitions_file:
+            if line.startswith("Syscall Name:"):
+                name = line.split(":", 1)[1].strip()
+                if name not in names:
+                    names.append(name)
+    finally:
+        definitions_file.close()
+
+    return names
+
+
+
+def get_definition_lines():
+    """
+    Returns the definitions listed in definitions.txt, in order, as lines
+    ending with a semicolon.
+    """
+
+    definition_lines = []
+    definitions_file = open(DEFINITIONS_FILE)
+    try:
+        for line in definitions_file:
+            if line.startswith("Definition:"):
+                line = line[len("Definition:"):].strip()
+                if line.endswith(")"):
+                    definition_lines.append(line + ";")
+    finally:
+        definitions_file.close()
+
+    return definition_lines
+
+
+
+def make_corpus(man_directories=None):
+    """
+    <Purpose>
+      Rebuilds the corpus directory from the man pages of this system.
+
+    <Arguments>
+      man_directories:
+        The man directories to copy the pages from. See
+        RoffManual.find_man_page.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      Replaces the corpus directory.
+
+    <Returns>
+      The list of the names whose man page was not found.
+    """
+
+    if os.path.isdir(CORPUS_DIRECTORY):
+        shutil.rmtree(CORPUS_DIRECTORY)
+
+    rendered_directory = os.path.join(CORPUS_DIRECTORY, "rendered")
+    os.makedirs(rendered_directory)
+
+    missing = []
+    for name in get_corpus_names() + ["syscalls"]:
+        path = RoffManual._find_syscall_man_page(name, "2", man_directories)
+        if path is None:
+            missing.append(name)
+            continue
+
+        # copy every file from the page of the name to the page holding the
+        # content, keeping symbolic links and ".so" redirections.
+        for redirect in range(RoffManual.MAX_REDIRECTS + 1):
+            path = _copy_man_file(path)
+            roff_text = RoffManual.read_roff_file(path)
+            so_target = RoffManual._get_so_target(roff_text)
+            if so_target is None:
+                break
+
+            target_path = os.path.join(os.path.dirname(os.path.dirname(path)),
+                                       so_target)
+            for extension in RoffManual._EXTENSIONS:
+                if os.path.isfile(target_path + extension):
+                    path = target_path + extension
+                    break
+            else:
+                break
+
+        if name == "syscalls":
+            man_page = "\n".join(RoffManual.render_roff(roff_text)) + "\n"
+        else:
+            man_page = RoffManual.read_roff_man_page(name, man_directories)
+
+        rendered_file = open(os.path.join(rendered_directory, name), "wb")
+        try:
+            rendered_file.write(man_page.encode("utf-8"))
+        finally:
+            rendered_file.close()
+
+    return missing
+
+
+
+def _copy_man_file(path):
+    # copies a man page file, and the file a symbolic link points to, into the
+    # same section of the corpus. Returns the path of the file with the content.
+    section = os.path.basename(os.path.dirname(path))
+    corpus_section = os.path.join(CORPUS_DIRECTORY, "man", section)
+    if not os.path.isdir(corpus_section):
+        os.makedirs(corpus_section)
+
+    corpus_path = os.path.join(corpus_section, os.path.basename(path))
+    if os.path.islink(path):
+        real_path = os.path.realpath(path)
+        _copy_man_file(real_path)
+        real_corpus_path = os.path.join(CORPUS_DIRECTORY, "man",
+                                        os.path.basename(os.path.dirname(real_path)),
+                                        os.path.basename(real_path))
+        if not os.path.lexists(corpus_path):
+            os.symlink(os.path.relpath(real_corpus_path, corpus_section),
+                       corpus_path)
+        return real_path
+
+    if not os.path.exists(corpus_path):
+        shutil.copy2(path, corpus_path)
+
+    return path
+
+
+
+class Stage(object):
+    """
+    <Purpose>
+      A stage of the benchmark.
+
+    <Attributes>
+      name:
+        The name of the stage.
+
+      function:
+        A function without arguments running the stage once.
+
+      items:
+        The number of items, eg man pages, processed by each run.
+
+      setup:
+        An optional function without arguments called before each run,
+        outside of the timing.
+
+      processes:
+        An optional function without arguments returning the number of
+        processes spawned by the last run.
+
+      failures:
+        The number of items each run fails to process, which are not counted
+        in items.
+
+    """
+
+    def __init__(self, name, function, items, setup=None, processes=None,
+                 failures=0):
+        self.name = name
+        self.function = function
+        self.items = items
+        self.setup = setup
+        self.processes = processes
+        self.failures = failures
+
+
+    def _time(self):
+        # a single call of the stage, after its setup. Garbage collection is
+        # left enabled since the stages are also run with it.
+        if self.setup is not None:
+            self.setup()
+
+        start = time.time()
+        self.function()
+        return time.time() - start
+
+
+    def run(self, repeat=REPEAT):
+        """
+        <Purpose>
+          Runs the stage repeat times, then once more to measure its memory.
+          Each timed run calls the stage for at least MIN_RUN_SECONDS.
+
+        <Arguments>
+          repeat:
+            The number of timed runs.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          A dictionary with the results of the stage: items, failures,
+          seconds (a call of the best run), usec_per_item, items_per_second,
+          peak_kb, live_blocks (the memory blocks allocated by the stage and
+          still allocated once it returns, mostly the objects it returns) and
+          processes. peak_kb and live_blocks are None if memory cannot be
+          traced, and processes if the stage does not count them.
+        """
+
+        loops = max(1, int(MIN_RUN_SECONDS / max(self._time(), 1e-6)) + 1)
+
+        best = None
+        for run in range(repeat):
+            seconds = 0.0
+            for loop in range(loops):
+                seconds += self._time()
+
+            if best is None or seconds / loops < best:
+                best = seconds / loops
+
+        peak_kb = None
+        live_blocks = None
+        if tracemalloc is not None:
+            if self.setup is not None:
+                self.setup()
+
+            gc.collect()
+            tracemalloc.start()
+            try:
+                start_size = tracemalloc.get_traced_memory()[0]
+                result = self.function()
+                peak_kb = (tracemalloc.get_traced_memory()[1] - start_size) / 1024.0
+                snapshot = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+
+            # the blocks allocated by the stage that are still allocated,
+            # mostly the objects it returns.
+            live_blocks = sum([statistic.count for statistic in
+                          snapshot.statistics("filename")])
+            del result
+
+        return {
+            "items": self.items,
+            "failures": self.failures,
+            "seconds": best,
+            "usec_per_item": best * 1000000.0 / max(self.items, 1),
+            "items_per_second": self.items / best if best > 0 else None,
+            "peak_kb": peak_kb,
+            "live_blocks": live_blocks,
+            "processes": None if self.processes is None else self.processes(),
+        }
+
+
+
+def get_stages():
+    """
+    <Purpose>
+      Prepares the stages of the benchmark over the corpus.
+
+    <Arguments>
+      None
+
+    <Exceptions>
+      Exception if the corpus directory is missing.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A list of Stage objects, in the order they are run.
+    """
+
+    if not os.path.isdir(CORPUS_DIRECTORY):
+        raise Exception("Corpus not found in " + CORPUS_DIRECTORY +
+                        ", run with --make-corpus.")
+
+    names = get_corpus_names()
+    man_directories = [os.path.join(CORPUS_DIRECTORY, "man")]
+    rendered = DirectorySource(os.path.join(CORPUS_DIRECTORY, "rendered"))
+    man_pages = [(name, rendered.read_page(name)) for name in names]
+
+    # the man pages of modern systems hold definitions some of which cannot be
+    # parsed. Those names are counted as failures of the parse_definition
+    # stage and left out of the stages after parsing.
+    def parse_definitions(failed_names=None):
+        syscall_manuals = []
+        for name, man_page in man_pages:
+            try:
+                syscall_manuals.append(SyscallManual(name, man_page))
+            except Exception:
+                if failed_names is not None:
+                    failed_names.append(name)
+        return syscall_manuals
+
+    parameter_cache.clear()
+    failed_names = []
+    syscall_manuals = parse_definitions(failed_names)
+    definition_lines = []
+    for sm in syscall_manuals:
+        if sm.definition is None:
+            continue
+        # definitions without parameters are given as (void) in man pages.
+        if sm.definition.parameters:
+            definition_lines.append(repr(sm.definition) + ";")
+        else:
+            definition_lines.append(repr(sm.definition)[:-1] + "void);")
+    parameter_strings = []
+    for sm in syscall_manuals:
+        if sm.definition is not None:
+            parameter_strings.extend([repr(p) for p in sm.definition.parameters])
+
+    # same as parse_definitions, the definitions that cannot be parsed are
+    # counted as failures.
+    file_lines = []
+    file_failures = 0
+    for line in get_definition_lines():
+        try:
+            Definition(line)
+        except Exception:
+            file_failures += 1
+            continue
+        file_lines.append(line)
+
+    stages = []
+
+    syscalls_page = rendered.read_page("syscalls")
+    stages.append(Stage("syscall_names",
+                        lambda: parse_syscall_names_list(syscalls_page),
+                        len(parse_syscall_names_list(syscalls_page))))
+
+    stages.append(Stage("read_rendered",
+                        lambda: [rendered.read_page(name) for name in names],
+                        len(names)))
+    stages.append(Stage("read_roff",
+                        lambda: [RoffManual.read_roff_man_page(name, man_directories)
+                                 for name in names],
+                        len(names)))
+    stages.append(Stage("parse_definition", parse_definitions,
+                        len(syscall_manuals), parameter_cache.clear,
+                        failures=len(failed_names)))
+    stages.append(Stage("definition",
+                        lambda: [Definition(line) for line in definition_lines],
+                        len(definition_lines), parameter_cache.clear))
+    stages.append(Stage("definition_file",
+                        lambda: [Definition(line) for line in file_lines],
+                        len(file_lines), parameter_cache.clear,
+                        failures=file_failures))
+    stages.append(Stage("parameter",
+                        lambda: [SyscallParameter(string) for string in parameter_strings],
+                        len(parameter_strings)))
+
+    pickle_directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, pickle_directory, True)
+    pickle_name = os.path.join(pickle_directory, "definitions.pickle")
+    dump_definitions(syscall_manuals, pickle_name)
+    stages.append(Stage("pickle_dump",
+                        lambda: dump_definitions(syscall_manuals, pickle_name),
+                        len(syscall_manuals)))
+    stages.append(Stage("pickle_load", lambda: load_definitions(pickle_name),
+                        len(syscall_manuals)))
+
+    argument_table = build_argument_table(syscall_manuals)
+    strace_lines = []
+    for index, name in enumerate(sorted(argument_table)):
+        arguments = ["\"/tmp/a, b\"", "{st_mode=S_IFREG|0644, st_size=42}",
+                     "O_RDONLY|O_CLOEXEC", "3"]
+        arguments = arguments[index % 2 * 2:] * 3
+        strace_lines.append("%d  %s(%s) = 0 <0.000012>" %
+                            (1000 + index, name,
+                             ", ".join(arguments[:len(argument_table[name])])))
+    stages.append(Stage("decode_strace",
+                        lambda: [decode_line(line, argument_table)
+                                 for line in strace_lines],
+                        len(strace_lines)))
+
+    # the prototypes module is generated in the pickle directory and imported
+    # from there.
+    write_prototypes_module(syscall_manuals,
+                            os.path.join(pickle_directory, "libc_prototypes.py"))
+    sys.path.insert(0, pickle_directory)
+    try:
+        import libc_prototypes
+    finally:
+        sys.path.remove(pickle_directory)
+
+    prototypes = [getattr(libc_prototypes, name) for name in CTYPES_CALLS]
+    cdll = ctypes.CDLL(libc_prototypes.LIBRARY_PATH)
+    ctypes_calls = CTYPES_CALLS * 100
+    stages.append(Stage("ctypes_prototype",
+                        lambda: [prototype() for prototype in prototypes * 100],
+                        len(ctypes_calls)))
+    stages.append(Stage("ctypes_getattr",
+                        lambda: [getattr(cdll, name)() for name in ctypes_calls],
+                        len(ctypes_calls)))
+
+    server = DefinitionsServer(pickle_name,
+                               os.path.join(pickle_directory, "definitions.sock"),
+                               reload_interval=None)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    atexit.register(server.server_close)
+    atexit.register(server.shutdown)
+    client = DefinitionsClient(server.server_address)
+    stages.append(Stage("server_lookup",
+                        lambda: [client.lookup_name(name) for name in names],
+                        len(names)))
+
+    try:
+        import syscall_libraries
+    except SyntaxError:
+        syscall_libraries = None
+
+    if syscall_libraries is not None:
+        import socket
+        from sysDef.ElfSymbols import SharedLibrary
+
+        libc = SharedLibrary(syscall_libraries.get_libc_name())
+        sock_obj = socket.socket
+
+        def get_libraries():
+            return [syscall_libraries.SyscallLibrary("os", os),
+                    syscall_libraries.SyscallLibrary("sys", sys),
+                    syscall_libraries.SyscallLibrary("libc", libc),
+                    syscall_libraries.SyscallLibrary("socket", socket),
+                    syscall_libraries.SyscallLibrary("sock_obj", sock_obj)]
+
+        order = ["os", "socket", "sock_obj", "sys", "libc"]
+        stages.append(Stage("syscalls_per_library",
+                            lambda: syscall_libraries.syscalls_per_library(
+                                get_libraries(), syscall_manuals, order),
+                            len(syscall_manuals)))
+
+        # the path of libc is cached in the pickle directory by a first run.
+        library_cache_name = os.path.join(pickle_directory, "libraries.json")
+        spawned = {}
+
+        def run_libraries_script(step):
+            output = subprocess.check_output([sys.executable, "-c",
+                                              _LIBRARIES_SCRIPT,
+                                              os.path.dirname(BENCHMARKS_DIRECTORY),
+                                              step, library_cache_name])
+            spawned[step] = int(output)
+
+        run_libraries_script("libc")
+        stages.append(Stage("import_libraries",
+                            lambda: run_libraries_script("import"), 1,
+                            processes=lambda: spawned["import"]))
+        stages.append(Stage("find_libc", lambda: run_libraries_script("libc"), 1,
+                            processes=lambda: spawned["libc"]))
+
+    return stages
+
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    <Purpose>
+      Compares the results of the stages against a baseline.
+
+    <Arguments>
+      results:
+        A dictionary from the name of each stage to its results.
+
+      baseline:
+        A dictionary of the same form.
+
+      tolerance:
+        How much larger, as a fraction, the time per item or the peak memory
+        of a stage can be before it is a regression.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A list of (stage name, measure, baseline value, value) tuples, one for
+      each regression.
+    """
+
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+
+        for measure in ("usec_per_item", "peak_kb", "processes"):
+            value = results[name].get(measure)
+            baseline_value = baseline[name].get(measure)
+            if value is None or baseline_value is None:
+                continue
+
+            if value > baseline_value * (1 + tolerance):
+                regressions.append((name, measure, baseline_value, value))
+
+    return regressions
+
+
+
+def _format(value, format_string):
+    if value is None:
+        return "-"
+    return format_string % value
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every stage of " +
+                                     "parsing system call definitions.")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="number of timed runs of each stage.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="fraction above the baseline that is a regression.")
+    parser.add_argument("--baseline", default=BASELINE_FILE,
+                        help="the baseline file.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the baseline of this " +
+                        "python version.")
+    parser.add_argument("--json", metavar="FILE", default=None,
+                        help="also write the results to FILE.")
+    parser.add_argument("--make-corpus", action="store_true",
+                        help="rebuild the corpus from the man pages of this " +
+                        "system.")
+    args = parser.parse_args()
+
+    if args.make_corpus:
+        missing = make_corpus()
+        print("Corpus written to " + CORPUS_DIRECTORY + ", no man page for: " +
+              " ".join(missing))
+        return
+
+    results = {}
+    print("%-22s %7s %12s %14s %12s %11s %10s" % ("stage", "items", "usec/item",
+                                                  "items/second", "peak kB",
+                                                  "live blocks", "processes"))
+    for stage in get_stages():
+        result = stage.run(args.repeat)
+        results[stage.name] = result
+        print("%-22s %7d %12.2f %14s %12s %11s %10s" % (
+              stage.name, result["items"], result["usec_per_item"],
+              _format(result["items_per_second"], "%.0f"),
+              _format(result["peak_kb"], "%.1f"),
+              _format(result["live_blocks"], "%d"),
+              _format(result["processes"], "%d")))
+
+    # the items that failed are not counted, but should not go unnoticed.
+    for name in sorted(results):
+        if results[name]["failures"]:
+            print("\n" + name + ": " + str(results[name]["failures"]) + " of " +
+                  str(results[name]["items"] + results[name]["failures"]) +
+                  " items failed and are not counted.")
+
+    if args.json:
+        json_file = open(args.json, "w")
+        try:
+            json.dump({PYTHON: results}, json_file, indent=2, sort_keys=True,
+                      separators=(",", ": "))
+        finally:
+            json_file.close()
+
+    baselines = {}
+    if os.path.isfile(args.baseline):
+        baseline_file = open(args.baseline)
+        try:
+            baselines = json.load(baseline_file)
+        finally:
+            baseline_file.close()
+
+    if args.save_baseline:
+        baselines[PYTHON] = results
+        baseline_file = open(args.baseline, "w")
+        try:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True,
+                      separators=(",", ": "))
+            baseline_file.write("\n")
+        finally:
+            baseline_file.close()
+        print("\nBaseline of " + PYTHON + " saved to " + args.baseline)
+        return
+
+    if PYTHON not in baselines:
+        print("\nNo baseline for " + PYTHON + " in " + args.baseline)
+        return
+
+    regressions = compare(results, baselines[PYTHON], args.tolerance)
+    if not regressions:
+        print("\nNo regressions against the " + PYTHON + " baseline.")
+        return
+
+    print("\nRegressions against the " + PYTHON + " baseline:")
+    for name, measure, baseline_value, value in regressions:
+        print("  %s %s: %.2f -> %.2f (%+.0f%%)" % (
+              name, measure, baseline_value, value,
+              (value / baseline_value - 1) * 100))
+    sys.exit(1)
+
+if __name__ == "__main__":
+    main()
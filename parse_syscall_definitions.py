@@ -13,12 +13,48 @@
   its man page and get its definition.
 
 
-  Manual pages (man) are read using the subprocess library.
+  Manual pages (man) are read using the subprocess library. Alternatively, with
+  the --roff option, man pages are read directly from their roff source files
+  without invoking man (see sysDef/RoffManual.py), and with the --source option
+  they are read from a directory or archive of pre-rendered man pages (see
+  sysDef/ManPageSource.py). With the --cache option the
+  man pages read are kept in a cache directory and reused on subsequent runs
+  for as long as the man pages do not change (see sysDef/ManPageCache.py).
+
+  System calls sharing a man page, eg chown, fchown, lchown and chown32, are
+  grouped together and each man page is read and parsed only once.
+
+  With the --update option a previously pickled list of definitions is loaded
+  and only the system calls that are new or whose man page changed are parsed
+  again. The merged list is written back to the same pickle file, along with
+  a fingerprint of the man page of each definition. Definitions pickled
+  without --update have no fingerprint and are all parsed again.
+
+  With the --database option the definitions are also stored in an indexed
+  binary database file that can be read through mmap (see
+  sysDef/DefinitionsDatabase.py).
+
+  With the --names headers option the names of the system calls are read from
+  the installed kernel headers, eg asm/unistd_64.h, or from the header or
+  syscall table file given with --syscall-table, instead of the syscalls man
+  page. With --names merged the names of both are used, and the names found
+  in only one of them are printed to the standard error (see
+  sysDef/SyscallHeaders.py).
+
+  With the --stats option the time taken by each stage of the run and by each
+  man page, the number of man subprocesses spawned, bytes read and cache hits
+  and misses are stored in a JSON file, and the slowest man pages printed to
+  the standard error (see sysDef/Instrumentation.py).
 
 
   Example running this program:
     run:
-      python parse_syscall_definitions.py
+      python parse_syscall_definitions.py [--roff | --source PATH] [--workers N]
+                                          [--cache DIR] [--update PICKLE]
+                                          [--database FILE]
+                                          [--names {man,headers,merged}]
+                                          [--syscall-table PATH]
+                                          [--stats FILE [--top N]]
 
     - several different views are provided. read the main method at the end of
     this file and uncomment appropriately.
@@ -28,21 +64,75 @@
 
 """
 
-import re
-import signal
-import subprocess
-
+import argparse
+import hashlib
+import multiprocessing
+import multiprocessing.pool
+import os
+import sys
+import time
+
+from sysDef import Instrumentation
+from sysDef import SyscallManual as SyscallManualModule
+from sysDef.DefinitionsPickle import dump_definitions
+from sysDef.DefinitionsPickle import load_definitions
+from sysDef.DefinitionsDatabase import write_database
+from sysDef.ManPageCache import MAX_SIZE
+from sysDef.ManPageCache import ManPageCache
+from sysDef.ManPageSource import ManCommandSource
+from sysDef.ManPageSource import RoffSource
+from sysDef.ManPageSource import get_source_page_identity
+from sysDef.ManPageSource import group_by_source_page
+from sysDef.ManPageSource import open_source
+from sysDef.SyscallHeaders import diff_syscall_names_lists
+from sysDef.SyscallHeaders import get_syscall_names_list
+from sysDef.SyscallHeaders import merge_syscall_names_lists
 from sysDef.SyscallManual import SyscallManual
+from sysDef.SyscallManual import parse_man_page
+from sysDef.SyscallManual import parse_syscall_names_list
 
 
-def parse_syscall_names_list():
+def get_syscall_definitions_list(syscall_names_list, workers=None,
+                                 processes=False, read_man_page=None,
+                                 fingerprint=False):
     """
     <Purpose>
-      Reads the man entry for 'syscalls' and parses all the names of the system 
-      calls in the system.
+      Given a list of syscall names, it returns a list of SyscallManual  objects.
+
+      System calls sharing the same man page, eg chown, fchown, lchown and
+      chown32, are grouped together by the source of the man pages (see
+      ManPageSource.group) so that each man page is read and parsed only once
+      and the definition of every name is chosen from it.
+
+      Each man page blocks on its own man subprocess, so the manual pages are
+      fetched and parsed concurrently by a pool of workers. The returned list
+      keeps the order of syscall_names_list.
+
+      If instrumentation is enabled (see sysDef/Instrumentation.py) the time
+      taken to fetch and to parse each man page is added to its stats, along
+      with the counters of worker processes.
     
     <Arguments>
-      None
+      syscall_names_list:
+        a list of system call names.
+
+      workers:
+        The number of concurrent workers. Defaults to the number of cores in
+        the system. If set to 1 the manual pages are read one at a time.
+
+      processes:
+        If True a pool of processes is used instead of a pool of threads.
+        Threads are enough in most cases since the time is spent waiting for
+        the man subprocesses.
+
+      read_man_page:
+        The function used to read the man page of each system call eg
+        read_roff_man_page or a ManPageSource. Defaults to reading the man page
+        using man.
+
+      fingerprint:
+        If True the page_fingerprint of each SyscallManual object is set, so
+        that it can be updated later. See update_syscall_definitions_list.
     
     <Exceptions>
       None
@@ -51,124 +141,214 @@ def parse_syscall_names_list():
       None
     
     <Returns>
-      syscall_names_list: 
-        A list of all the system call names gathered from the man page of the 
-        syscalls man entry.
+      syscall_definitions_list:
+        A list of SyscallManual objects.
+    
     """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if read_man_page is None:
+        read_man_page = SyscallManualModule.read_man_page
+
+    stats = Instrumentation.get_stats()
+
+    page_names_lists = group_by_source_page(read_man_page, syscall_names_list)
+    in_process = workers <= 1 or len(page_names_lists) <= 1
+
+    # the function has to be passed along with each page so that it can reach
+    # the workers of a process pool. Worker processes count into stats of
+    # their own, returned with each page. Pages read in this process count
+    # into the stats of the caller.
+    collect_counts = stats is not None and processes and not in_process
+    arguments_list = [(page_names_list, read_man_page, fingerprint,
+                       collect_counts)
+                      for page_names_list in page_names_lists]
+
+    # the pages are added to the stats as soon as they are read.
+    page_manuals_lists = []
+    if in_process:
+        for arguments in arguments_list:
+            page_manuals_lists.append(_add_page(stats,
+                                                _get_page_syscall_manuals(arguments)))
+
+    else:
+        if processes:
+            pool = multiprocessing.Pool(workers)
+        else:
+            pool = multiprocessing.pool.ThreadPool(workers)
+
+        try:
+            for result in pool.imap(_get_page_syscall_manuals, arguments_list):
+                page_manuals_lists.append(_add_page(stats, result))
+        finally:
+            pool.close()
+            pool.join()
+
+    # put the SyscallManual objects back in the order of the given names.
+    syscall_manuals = {}
+    for page_manuals_list in page_manuals_lists:
+        for syscall_manual in page_manuals_list:
+            syscall_manuals[syscall_manual.name] = syscall_manual
 
+    syscall_definitions_list = []
+    for syscall_name in syscall_names_list:
+        syscall_definitions_list.append(syscall_manuals[syscall_name])
 
+    return syscall_definitions_list
 
-    # read the man page for 'syscalls' into a byte string.
-    #
-    # https://blog.nelhage.com/2010/02/a-very-subtle-bug/
-    # read link for supporting this operation on python v2. python v3 fixes this so the second
-    # argument of check_output is not needed.
-    man_page_bytestring = subprocess.check_output(['man', 'syscalls'], preexec_fn=lambda:
-                      signal.signal(signal.SIGPIPE, signal.SIG_DFL))
 
-    # cast to string and split into a list of lines.
-    man_page_lines = man_page_bytestring.decode("utf-8").split("\n")
 
-    # a regular expression used to sanitize the read lines. Specifically removes
-    # the backspace characters and the character they hide to allow searching for
-    # substrings.
-    char_backspace = re.compile(".\b")
+def _get_page_syscall_manuals(arguments):
+    # read and parse a man page once, through the first of the system call
+    # names sharing it, and choose the definition of every name from it. If
+    # asked, also remember which man page each definition was parsed from.
+    # Returns the SyscallManual objects along with the stats page of the man
+    # page.
+    page_names_list, read_man_page, fingerprint, collect_counts = arguments
 
-    # remove all lines until the line with the first system call which includes
-    # the text "_llseek(2)" on a GNU/Linux 3.5.0-36-generic
-    while True:
-        if len(man_page_lines) == 0:
-            raise Exception("_llseek not found in syscalls man page.")
+    if collect_counts:
+        stats = Instrumentation.enable()
 
-        line = man_page_lines[0]
+    start = time.time()
+    man_page = read_man_page(page_names_list[0])
+    fetched = time.time()
+    page_definitions = parse_man_page(man_page)
+    parsed = time.time()
 
-        # line could include backspaces \b which prevents from searching the line
-        # correctly. Remove backspaces.
-        # eg: # __llllsseeeekk(2)                  1.2
-        line = char_backspace.sub("", line)
+    syscall_manuals = []
+    for syscall_name in page_names_list:
+        syscall_manual = SyscallManual(syscall_name, page_definitions=page_definitions)
+        if fingerprint:
+            syscall_manual.page_fingerprint = \
+                (get_source_page_identity(read_man_page, syscall_name),
+                 _get_page_digest(man_page))
+        syscall_manuals.append(syscall_manual)
 
-        if "_llseek(2)" in line:
-            break
+    page = {"page": page_names_list[0],
+            "names": list(page_names_list),
+            "fetch_seconds": fetched - start,
+            "parse_seconds": parsed - fetched}
 
-        # if this is not the line we are looking for then remove the line and
-        # continue.
-        man_page_lines.pop(0)
+    if collect_counts:
+        Instrumentation.disable()
+        page["counts"] = stats.counts
 
-    # At this point the first item in man_page_lines should contain the name of
-    # the first system call. Get the names of all system calls up to the last one
-    # which should be the "writev" system call.
-    syscall_names_list = []
+    return syscall_manuals, page
 
-    # loop until the last entry of the list of syscall names is writev.
-    while True:
-        if len(man_page_lines) == 0:
-            raise Exception("Reached the end of syscalls man page while trying to " +
-                          "read the syscall names.")
 
-        line = man_page_lines.pop(0).strip()
 
-        # sanitize line (remove backspaces)
-        line = char_backspace.sub("", line)
+def _get_page_digest(man_page):
+    # a hash of the text of a man page, or None if there is no man page.
+    if man_page == "":
+        return None
 
-        # skip empty lines.
-        if(line == ''):
-            continue
+    return hashlib.sha1(man_page.encode("utf-8")).hexdigest()
 
-        # we only need the name of the system call which should be the first part of
-        # the line.
-        #
-        # Example lines in syscalls man entry:
-        # afs_syscall(2)                            Not implemented
-        # alarm(2)
-        # alloc_hugepages(2)          2.5.36        Removed in 2.5.44
-        # perf_event_open(2)          2.6.31        Was called perf_counter_open()
-        #                                           in 2.6.31; renamed in 2.6.32
-        syscall_name = line.split(None, 1)[0].strip()
-
-        # all syscall names are followed by the "(2)" text. if not then they must be
-        # something else we don't need, so let's skip it.
-        if(not syscall_name.endswith("(2)")):
-            continue
 
-        # remove the "(2)" part and add it to the list.
-        syscall_name = syscall_name[:syscall_name.find("(2)")]
-        syscall_names_list.append(syscall_name)
 
+def _add_page(stats, result):
+    # add the page of a result of _get_page_syscall_manuals to the stats, if
+    # any, and return its SyscallManual objects.
+    syscall_manuals, page = result
 
-        # once we add the writev syscall we break since there are no more syscalls
-        # after this.
-        if(syscall_name == "writev"):
-            break
+    if stats is not None:
+        stats.merge_counts(page.pop("counts", {}))
+        stats.add_page(page)
 
-    return syscall_names_list
+    return syscall_manuals
 
 
 
-def get_syscall_definitions_list(syscall_names_list):
+def update_syscall_definitions_list(syscall_definitions_list, syscall_names_list,
+                                    workers=None, processes=False,
+                                    read_man_page=None):
     """
     <Purpose>
-      Given a list of syscall names, it returns a list of SyscallManual  objects.
-    
+      Given a previously parsed list of SyscallManual objects and the current
+      list of syscall names, it returns an up to date list of SyscallManual
+      objects, parsing only the system calls whose definition might have
+      changed:
+        - names not in the previous list,
+        - names whose man page changed since it was parsed.
+
+      A man page is considered changed if the identity its source gives it,
+      eg the path, modification time and size of its file, changed and the
+      hash of its text differs as well. Only the man pages whose identity
+      changed are read for this.
+
     <Arguments>
+      syscall_definitions_list:
+        The previous list of SyscallManual objects.
+
       syscall_names_list:
-        a list of system call names.
-    
+        The current list of system call names.
+
+      workers, processes, read_man_page:
+        Used to parse the changed system calls. See
+        get_syscall_definitions_list.
+
     <Exceptions>
       None
-    
+
     <Side Effects>
-      None
-    
+      Updates the page_fingerprint of the unchanged SyscallManual objects if
+      their man page was modified without changing its text.
+
     <Returns>
-      syscall_definitions_list:
-        A list of SyscallManual objects.
-    
+      (syscall_definitions_list, updated_names_list):
+        The up to date list of SyscallManual objects in the order of
+        syscall_names_list, and the list of names that were parsed again.
     """
+
+    if read_man_page is None:
+        read_man_page = SyscallManualModule.read_man_page
+
+    previous_definitions = {}
+    for sd in syscall_definitions_list:
+        previous_definitions[sd.name] = sd
+
+    updated_names_list = []
+    for syscall_name in syscall_names_list:
+        sd = previous_definitions.get(syscall_name)
+        if sd is None or not _is_page_unchanged(sd, read_man_page):
+            updated_names_list.append(syscall_name)
+
+    updated_definitions = {}
+    for sd in get_syscall_definitions_list(updated_names_list, workers, processes,
+                                           read_man_page, fingerprint=True):
+        updated_definitions[sd.name] = sd
+
     syscall_definitions_list = []
     for syscall_name in syscall_names_list:
-        syscall_definitions_list.append(SyscallManual(syscall_name))
+        if syscall_name in updated_definitions:
+            syscall_definitions_list.append(updated_definitions[syscall_name])
+        else:
+            syscall_definitions_list.append(previous_definitions[syscall_name])
 
-    return syscall_definitions_list
+    return syscall_definitions_list, updated_names_list
+
+
+
+def _is_page_unchanged(syscall_manual, read_man_page):
+    # definitions parsed without a fingerprint are always parsed again.
+    page_fingerprint = getattr(syscall_manual, "page_fingerprint", None)
+    if page_fingerprint is None:
+        return False
+
+    identity, digest = page_fingerprint
+    current_identity = get_source_page_identity(read_man_page,
+                                                syscall_manual.name)
+    if current_identity is not None and current_identity == identity:
+        return True
+
+    # the man page changed, or cannot be identified, but its text might still
+    # be the same eg if the man pages were reinstalled.
+    if _get_page_digest(read_man_page(syscall_manual.name)) != digest:
+        return False
+
+    syscall_manual.page_fingerprint = (current_identity, digest)
+    return True
 
 
 
@@ -299,36 +479,185 @@ def print_definitions3(syscall_definitions_list):
 
 
 
-def pickle_syscall_definitions(syscall_definitions_list):
+def pickle_syscall_definitions(syscall_definitions_list,
+                               pickle_name="syscall_definitions.pickle"):
     """
     Store the syscall_definitions_list into a pickle file.
     """
 
-    import pickle
-    pickle_name = "syscall_definitions.pickle"
-    pickle_file = open(pickle_name, 'wb')
-    pickle.dump(syscall_definitions_list, pickle_file)
-    pickle_file.close()
+    dump_definitions(syscall_definitions_list, pickle_name)
+
+
+
+def unpickle_syscall_definitions(pickle_name="syscall_definitions.pickle"):
+    """
+    Load a syscall_definitions_list from a pickle file, including pickle files
+    written by older versions.
+    """
+
+    return load_definitions(pickle_name)
 
 
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Parse the definitions of all " +
+                                     "system calls from their man pages.")
+    sources = parser.add_mutually_exclusive_group()
+    sources.add_argument("--roff", action="store_true",
+                         help="read man pages from their roff source files " +
+                         "instead of invoking man.")
+    sources.add_argument("--source", metavar="PATH", default=None,
+                         help="read pre-rendered man pages from the directory " +
+                         "or tar/zip archive PATH instead of invoking man.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of man pages read concurrently. Defaults " +
+                        "to the number of cores.")
+    parser.add_argument("--cache", metavar="DIR", default=None,
+                        help="keep the man pages read in DIR and reuse them " +
+                        "on subsequent runs.")
+    parser.add_argument("--cache-size", type=int, default=MAX_SIZE,
+                        help="size limit of the cache directory in bytes.")
+    parser.add_argument("--update", metavar="PICKLE", default=None,
+                        help="only parse the system calls that changed since " +
+                        "PICKLE was written, and write the result back to it.")
+    parser.add_argument("--database", metavar="FILE", default=None,
+                        help="also store the definitions in an indexed " +
+                        "database FILE.")
+    parser.add_argument("--names", choices=["man", "headers", "merged"],
+                        default="man",
+                        help="read the system call names from the syscalls " +
+                        "man page, the kernel headers or both. Defaults to man.")
+    parser.add_argument("--syscall-table", metavar="PATH", default=None,
+                        help="the unistd header or syscall_*.tbl file the " +
+                        "names are read from with --names headers or merged. " +
+                        "Defaults to the installed header of this machine.")
+    parser.add_argument("--stats", metavar="FILE", default=None,
+                        help="store the time taken by each stage and man " +
+                        "page and other figures of the run in the JSON FILE.")
+    parser.add_argument("--top", metavar="N", type=int,
+                        default=Instrumentation.TOP_PAGES,
+                        help="number of the slowest man pages reported with " +
+                        "--stats.")
+    args = parser.parse_args()
+
+    stats = None
+    if args.stats:
+        stats = Instrumentation.enable()
+
+    if args.source:
+        source = open_source(args.source)
+    elif args.roff:
+        source = RoffSource()
+    else:
+        source = ManCommandSource()
+
+    # the syscalls man page is read as a whole since the names are listed after
+    # its DESCRIPTION line.
+    read_syscalls_page = source.read_page
+    read_man_page = source
+
+    if args.cache:
+        read_syscalls_page = ManPageCache(args.cache, args.cache_size,
+                                          source.read_page, synopsis_only=False)
+        read_man_page = ManPageCache(args.cache, args.cache_size, source)
+
+    with Instrumentation.stage("syscall_names"):
+        if args.names != "headers":
+            syscalls_man_page = read_syscalls_page("syscalls")
+            if syscalls_man_page == "":
+                raise Exception("syscalls man page not found.")
+
+            # get a list with all the system call names available in this system.
+            syscall_names_list = parse_syscall_names_list(syscalls_man_page)
+
+        if args.names != "man":
+            header_names_list = get_syscall_names_list(args.syscall_table)
+
+        if args.names == "headers":
+            syscall_names_list = header_names_list
+
+        elif args.names == "merged":
+            only_in_man, only_in_headers = \
+                diff_syscall_names_lists(syscall_names_list, header_names_list)
+            sys.stderr.write("Only in the syscalls man page: " +
+                             " ".join(only_in_man) + "\n")
+            sys.stderr.write("Only in the headers: " +
+                             " ".join(only_in_headers) + "\n")
+
+            syscall_names_list = merge_syscall_names_lists(syscall_names_list,
+                                                           header_names_list)
+
+    if args.update:
+        # start from the previous definitions, if any.
+        if os.path.exists(args.update):
+            previous_definitions_list = unpickle_syscall_definitions(args.update)
+        else:
+            previous_definitions_list = []
+
+        with Instrumentation.stage("definitions"):
+            syscall_definitions_list, updated_names_list = \
+                update_syscall_definitions_list(previous_definitions_list,
+                                                syscall_names_list, args.workers,
+                                                read_man_page=read_man_page)
+
+        print str(len(updated_names_list)) + " system call definitions updated"
+        print "-----------------------------------"
+        for name in updated_names_list:
+            print name
+
+        print
+        print
 
-    # get a list with all the system call names available in this system.
-    syscall_names_list = parse_syscall_names_list()
+        with Instrumentation.stage("pickle"):
+            pickle_syscall_definitions(syscall_definitions_list, args.update)
+
+        if args.database:
+            with Instrumentation.stage("database"):
+                write_database(syscall_definitions_list, args.database)
+
+        if stats is not None:
+            _write_stats(stats, syscall_definitions_list, args.stats, args.top)
+        return
 
     # use the list of names just parsed to generate a list of system call
     # definitions.
-    syscall_definitions_list = get_syscall_definitions_list(syscall_names_list)
+    with Instrumentation.stage("definitions"):
+        syscall_definitions_list = get_syscall_definitions_list(syscall_names_list,
+                                                                args.workers,
+                                                                read_man_page=read_man_page)
 
     # different views:
-    print_definitions1(syscall_definitions_list)
-    print_definitions2(syscall_definitions_list)
-    print_definitions3(syscall_definitions_list)
+    with Instrumentation.stage("views"):
+        print_definitions1(syscall_definitions_list)
+        print_definitions2(syscall_definitions_list)
+        print_definitions3(syscall_definitions_list)
 
     # pickle syscall_definitions_list
-    pickle_syscall_definitions(syscall_definitions_list)
+    with Instrumentation.stage("pickle"):
+        pickle_syscall_definitions(syscall_definitions_list)
+
+    if args.database:
+        with Instrumentation.stage("database"):
+            write_database(syscall_definitions_list, args.database)
+
+    if stats is not None:
+        _write_stats(stats, syscall_definitions_list, args.stats, args.top)
+
+
+
+def _write_stats(stats, syscall_definitions_list, stats_name, top):
+    # store the stats of the run and print its slowest man pages to the
+    # standard error, keeping the standard output for the views.
+    Instrumentation.disable()
+    stats.add_syscall_manuals(syscall_definitions_list)
+    stats.write(stats_name, top)
+
+    sys.stderr.write("Slowest man pages (fetch + parse seconds):\n")
+    for page in stats.get_slowest_pages(top):
+        sys.stderr.write("%-24s %.4f + %.4f  %s\n" %
+                         (page["page"], page["fetch_seconds"],
+                          page["parse_seconds"], " ".join(page["names"])))
 
 if __name__ == "__main__":
     main()
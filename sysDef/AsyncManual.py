@@ -0,0 +1,261 @@
+"""
+<Purpose>
+  Read the man pages of a list of system calls using asyncio and parse them into
+  SyscallManual objects.
+
+  The man subprocesses are spawned on the asyncio event loop of the caller. At
+  most max_processes of them are running at any point in time and each man page
+  is parsed as soon as its man subprocess exits, while the remaining man pages
+  are still being read. System calls sharing a man page, eg chown and chown32,
+  share a single man subprocess. The names are grouped by man page in the
+  default executor of the loop, since that reads the man page files, so the
+  loop is never blocked.
+
+  Only the callback based api of asyncio is used, so this module can be
+  imported on any python version, but asyncio (python 3.4 and later) is
+  required to call get_syscall_manuals.
+
+  Example use from within a coroutine:
+
+    syscall_manuals = await get_syscall_manuals(syscall_names_list)
+
+"""
+
+import signal
+import subprocess
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from sysDef import Instrumentation
+from sysDef.RoffManual import group_by_man_page
+from sysDef.SyscallManual import SyscallManual
+from sysDef.SyscallManual import parse_man_page
+
+
+# default number of man subprocesses running at the same time.
+MAX_PROCESSES = 16
+
+
+
+def get_syscall_manuals(syscall_names_list, max_processes=MAX_PROCESSES,
+                        loop=None, manual_callback=None):
+    """
+    <Purpose>
+      Reads and parses the man pages of all the given system call names using
+      the asyncio event loop.
+
+    <Arguments>
+      syscall_names_list:
+        A list of system call names.
+
+      max_processes:
+        The maximum number of man subprocesses running at the same time.
+
+      loop:
+        The asyncio event loop to use. Defaults to the current event loop.
+
+      manual_callback:
+        An optional function called with each SyscallManual object as soon as
+        it is parsed. Objects are not passed in any particular order.
+
+    <Exceptions>
+      Exception if asyncio is not available or max_processes is less than 1.
+
+    <Side Effects>
+      Groups the names by man page in the default executor of the event loop
+      and spawns man subprocesses on the event loop.
+
+    <Returns>
+      An asyncio Future whose result is the list of SyscallManual objects in the
+      same order as syscall_names_list.
+    """
+
+    if asyncio is None:
+        raise Exception("asyncio is required to read man pages asynchronously.")
+
+    if max_processes < 1:
+        raise Exception("max_processes must be at least 1.")
+
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    reader = _ManualReader(syscall_names_list, max_processes, loop,
+                           manual_callback)
+    reader.start()
+
+    return reader.result
+
+
+
+class _ManualReader:
+    """
+    Keeps track of the man subprocesses of a single get_syscall_manuals call.
+    A new man subprocess is spawned every time one exits, until all man pages
+    are read.
+    """
+
+    def __init__(self, syscall_names_list, max_processes, loop, manual_callback):
+        self.syscall_names_list = syscall_names_list
+        self.max_processes = max_processes
+        self.loop = loop
+        self.manual_callback = manual_callback
+
+        # the indexes of the names sharing each man page, once grouped.
+        self.pages = []
+
+        # the index of the next page to read and the number of names parsed.
+        self.next_index = 0
+        self.parsed = 0
+        self.running = 0
+
+        self.syscall_manuals = [None] * len(syscall_names_list)
+        self.result = loop.create_future()
+
+
+    def start(self):
+        if len(self.syscall_names_list) == 0:
+            self.result.set_result([])
+            return
+
+        # grouping reads the man page files, so it must not block the loop.
+        grouping = self.loop.run_in_executor(None, group_by_man_page,
+                                             self.syscall_names_list)
+        grouping.add_done_callback(self._grouped)
+
+
+    def _grouped(self, grouping):
+        if grouping.cancelled():
+            self._fail(asyncio.CancelledError())
+            return
+        if grouping.exception() is not None:
+            self._fail(grouping.exception())
+            return
+
+        name_indexes = {}
+        for index, syscall_name in enumerate(self.syscall_names_list):
+            name_indexes.setdefault(syscall_name, []).append(index)
+
+        for page_names_list in grouping.result():
+            page_indexes = []
+            for syscall_name in page_names_list:
+                page_indexes.append(name_indexes[syscall_name].pop(0))
+            self.pages.append(page_indexes)
+
+        self._spawn_next()
+
+
+    def _spawn_next(self):
+        # spawn man subprocesses until the limit is reached or there are no more
+        # pages to read. Each page is read through its first name.
+        while(self.running < self.max_processes and
+              self.next_index < len(self.pages)):
+            index = self.next_index
+            self.next_index += 1
+            self.running += 1
+            self._spawn(index, self.syscall_names_list[self.pages[index][0]])
+
+
+    def _spawn(self, index, page_name):
+        protocol_factory = lambda: _ManPageProtocol(self, index, page_name)
+        coroutine = self.loop.subprocess_exec(protocol_factory,
+                                              'man', '2', page_name,
+                                              stdin=subprocess.DEVNULL,
+                                              stderr=subprocess.DEVNULL,
+                                              preexec_fn=lambda:
+                                                  signal.signal(signal.SIGPIPE, signal.SIG_DFL))
+        task = self.loop.create_task(coroutine)
+        task.add_done_callback(self._spawned)
+        Instrumentation.count("man_processes")
+
+
+    def _spawned(self, task):
+        # failing to spawn man at all is not the same as a missing man entry.
+        if task.cancelled():
+            self._fail(asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._fail(task.exception())
+
+
+    def _page_read(self, index, page_name, returncode, man_page_bytestring):
+        if self.result.done():
+            return
+
+        syscall_name = self.syscall_names_list[self.pages[index][0]]
+
+        if returncode != 0:
+            # if a man entry does not exist no definition exists.
+            man_page = ""
+        else:
+            Instrumentation.count("bytes_read", len(man_page_bytestring))
+            man_page = man_page_bytestring.decode("utf-8")
+
+        # same as read_man_page, retry syscalls ending with 32 or 64 without the
+        # number at the end if their man page is empty.
+        if(returncode == 0 and man_page == "" and page_name == syscall_name and
+           (syscall_name.endswith("32") or syscall_name.endswith("64"))):
+            self._spawn(index, syscall_name[:-2])
+            return
+
+        self.running -= 1
+
+        # parse the man page once and choose the definition of every name
+        # sharing it.
+        try:
+            page_definitions = parse_man_page(man_page)
+            for name_index in self.pages[index]:
+                syscall_manual = SyscallManual(self.syscall_names_list[name_index],
+                                               page_definitions=page_definitions)
+                if self.manual_callback is not None:
+                    self.manual_callback(syscall_manual)
+
+                self.syscall_manuals[name_index] = syscall_manual
+                self.parsed += 1
+        except Exception as e:
+            self._fail(e)
+            return
+
+        if self.parsed == len(self.syscall_names_list):
+            self.result.set_result(self.syscall_manuals)
+        else:
+            self._spawn_next()
+
+
+    def _fail(self, exception):
+        if not self.result.done():
+            self.result.set_exception(exception)
+
+
+
+if asyncio is not None:
+
+    class _ManPageProtocol(asyncio.SubprocessProtocol):
+        """
+        Collects the output of a single man subprocess.
+        """
+
+        def __init__(self, reader, index, page_name):
+            self.reader = reader
+            self.index = index
+            self.page_name = page_name
+            self.transport = None
+            self.output = []
+
+
+        def connection_made(self, transport):
+            self.transport = transport
+
+
+        def pipe_data_received(self, fd, data):
+            if fd == 1:
+                self.output.append(data)
+
+
+        def connection_lost(self, exc):
+            # called once the process has exited and all its pipes are closed.
+            returncode = self.transport.get_returncode()
+            self.transport.close()
+            self.reader._page_read(self.index, self.page_name, returncode,
+                                   b"".join(self.output))
@@ -0,0 +1,429 @@
+"""
+<Purpose>
+  Generate a python module of ctypes prototypes for the system call wrappers
+  of libc, from the definitions parsed from the man pages.
+
+  Calling a libc function through ctypes needs its argtypes and restype set
+  by hand, and looking it up on a ctypes.CDLL object for every call is slow.
+  The generated module binds every FOUND definition libc exports once, when
+  it is imported, to a ctypes function with its argtypes and restype set from
+  the definition:
+    - scalar types and their typedefs eg int, size_t or pid_t map to the
+      ctypes type of the same size,
+    - char pointers and arrays map to c_char_p, pointers and arrays of other
+      scalars to POINTER of their type, and pointers to structs, unions, void
+      and functions to c_void_p,
+    - pointers to pointers eg char *const argv[] map to POINTER(c_char_p) or
+      POINTER(c_void_p),
+    - variadic parameters (...) end the argtypes, so any further arguments
+      are passed as given.
+
+  Definitions with a type that cannot be mapped, eg a struct passed by value
+  or an unknown typedef, are left out and listed at the end of the module.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.CtypesGenerator syscall_definitions.pickle libc_prototypes.py
+
+  will write the libc_prototypes module, which is used as:
+
+    import libc_prototypes
+    fd = libc_prototypes.open(b"/etc/hostname", os.O_RDONLY, 0)
+
+"""
+
+import keyword
+import re
+
+from sysDef.ElfSymbols import SharedLibrary
+from sysDef.ElfSymbols import find_library_path
+from sysDef.SyscallManual import SyscallManual
+
+
+# the ctypes types of scalar types and the typedefs of the system call
+# definitions, on Linux with glibc.
+SCALAR_TYPES = {
+    "char": "c_char",
+    "short": "c_short",
+    "int": "c_int",
+    "long": "c_long",
+    "size_t": "c_size_t",
+    "ssize_t": "c_ssize_t",
+    "pid_t": "c_int",
+    "uid_t": "c_uint",
+    "gid_t": "c_uint",
+    "id_t": "c_uint",
+    "mode_t": "c_uint",
+    "off_t": "c_long",
+    "off64_t": "c_int64",
+    "loff_t": "c_int64",
+    "dev_t": "c_uint64",
+    "key_t": "c_int",
+    "key_serial_t": "c_int32",
+    "socklen_t": "c_uint",
+    "clockid_t": "c_int",
+    "mqd_t": "c_int",
+    "time_t": "c_long",
+    "clock_t": "c_long",
+    "aio_context_t": "c_ulong",
+    "uint32_t": "c_uint32",
+    "uint64_t": "c_uint64",
+    "int32_t": "c_int32",
+    "int64_t": "c_int64",
+    "u32": "c_uint32",
+    "u64": "c_uint64",
+}
+
+# the unsigned variants of scalar types.
+UNSIGNED_TYPES = {
+    "char": "c_ubyte",
+    "short": "c_ushort",
+    "int": "c_uint",
+    "long": "c_ulong",
+}
+
+# typedefs of pointers.
+POINTER_TYPES = ["timer_t", "caddr_t", "sighandler_t"]
+
+# typedefs of structs, only passed through pointers.
+OPAQUE_TYPES = ["cpu_set_t", "sigset_t", "fd_set"]
+
+# attributes a return type may start with eg [[deprecated]] int.
+_ATTRIBUTES = re.compile(r"^(?:\[\[[^\]]*\]\]\s*)+")
+
+
+
+def get_parameter_ctype(parameter):
+    """
+    <Purpose>
+      Maps a parameter to the ctypes type of its argument.
+
+    <Arguments>
+      parameter:
+        A SyscallParameter object, not an ellipsis.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The ctypes type as a python expression eg "ctypes.c_int", or None if
+      the parameter cannot be mapped.
+    """
+
+    # arrays are passed as pointers. Man pages give array sizes in the name
+    # eg void buf[.count].
+    levels = 0
+    if parameter.pointer:
+        levels += 1
+    if parameter.const_pointer:
+        levels += 1
+    if parameter.array or "[" in parameter.name:
+        levels += 1
+
+    if parameter.function:
+        return "ctypes.c_void_p"
+
+    if parameter.enum:
+        scalar = "c_int"
+    elif(parameter.struct or parameter.union or parameter.type == "void" or
+         parameter.type in OPAQUE_TYPES):
+        scalar = None
+    elif parameter.type in POINTER_TYPES:
+        scalar = None
+        levels += 1
+    elif parameter.unsigned:
+        scalar = UNSIGNED_TYPES.get(parameter.type)
+        if scalar is None:
+            return None
+    else:
+        scalar = SCALAR_TYPES.get(parameter.type)
+        if scalar is None:
+            return None
+
+    return _get_pointer_ctype(scalar, levels)
+
+
+
+def _get_pointer_ctype(scalar, levels):
+    # the ctypes type of levels pointers to a scalar, or to anything opaque if
+    # scalar is None.
+    if levels == 0:
+        if scalar is None:
+            return None
+        return "ctypes." + scalar
+
+    if scalar == "c_char":
+        ctype = "ctypes.c_char_p"
+    elif scalar is None or levels > 1:
+        ctype = "ctypes.c_void_p"
+    else:
+        return "ctypes.POINTER(ctypes." + scalar + ")"
+
+    # pointers to pointers.
+    if levels > 1:
+        ctype = "ctypes.POINTER(" + ctype + ")"
+
+    return ctype
+
+
+
+def get_return_ctype(ret_type):
+    """
+    <Purpose>
+      Maps the return type of a definition to a ctypes restype.
+
+    <Arguments>
+      ret_type:
+        The return type of a Definition eg "int", "void*" or
+        "[[deprecated]] pid_t".
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The ctypes type as a python expression, "None" for void, or None if the
+      return type cannot be mapped.
+    """
+
+    ret_type = _ATTRIBUTES.sub("", ret_type).strip()
+
+    levels = ret_type.count("*")
+    words = ret_type.replace("*", " ").split()
+
+    if words == ["void"]:
+        return "None" if levels == 0 else "ctypes.c_void_p"
+
+    if words and words[0] == "unsigned":
+        scalar = UNSIGNED_TYPES.get(words[-1] if len(words) > 1 else "int")
+    elif words and words[-1] in POINTER_TYPES:
+        return "ctypes.c_void_p"
+    elif len(words) == 1:
+        scalar = SCALAR_TYPES.get(words[0])
+    else:
+        scalar = None
+
+    if scalar is None:
+        return None
+
+    return _get_pointer_ctype(scalar, levels)
+
+
+
+def generate_prototypes(syscall_manuals, library_path=None):
+    """
+    <Purpose>
+      Generates the source of a python module of ctypes prototypes.
+
+    <Arguments>
+      syscall_manuals:
+        A list of SyscallManual objects.
+
+      library_path:
+        The path of the library the prototypes are bound to. Defaults to
+        libc. Only the definitions it exports are generated.
+
+    <Exceptions>
+      ElfError or IOError if the library cannot be read.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A tuple of the source of the module and a list of (name, reason)
+      tuples, one for each FOUND definition left out.
+    """
+
+    if library_path is None:
+        library_path = find_library_path("c")
+
+    exported_names = SharedLibrary(library_path).exported_names
+
+    prototypes = []
+    skipped = []
+    generated = set()
+    for syscall_manual in syscall_manuals:
+        name = syscall_manual.name
+        if syscall_manual.type != SyscallManual.FOUND or name in generated:
+            continue
+
+        if name not in exported_names:
+            skipped.append((name, "not exported"))
+            continue
+
+        definition = syscall_manual.definition
+        restype = get_return_ctype(definition.ret_type)
+        if restype is None:
+            skipped.append((name, "return type " + definition.ret_type))
+            continue
+
+        argtypes, unmapped_parameter = _get_argtypes(definition)
+        if unmapped_parameter is not None:
+            skipped.append((name, "parameter " + repr(unmapped_parameter)))
+            continue
+
+        generated.add(name)
+        prototypes.append((name, restype, argtypes, repr(definition)))
+
+    return _format_module(library_path, prototypes, skipped), skipped
+
+
+
+def _get_argtypes(definition):
+    # the argtypes of a definition up to any ellipsis, and the first parameter
+    # that cannot be mapped, if any.
+    argtypes = []
+    for parameter in definition.parameters:
+        if parameter.ellipsis:
+            break
+
+        argtype = get_parameter_ctype(parameter)
+        if argtype is None:
+            return None, parameter
+        argtypes.append(argtype)
+
+    return argtypes, None
+
+
+
+def _format_module(library_path, prototypes, skipped):
+    lines = ['"""',
+             "Prototypes of the system call wrappers of " + library_path + ",",
+             "generated by sysDef.CtypesGenerator. Do not edit.",
+             '"""',
+             "",
+             "import ctypes",
+             "import ctypes.util",
+             "",
+             "LIBRARY_PATH = " + _quote(library_path),
+             "",
+             "try:",
+             "    _library = ctypes.CDLL(LIBRARY_PATH, use_errno=True)",
+             "except OSError:",
+             "    _library = ctypes.CDLL(ctypes.util.find_library(" +
+             _quote(_get_library_name(library_path)) + "), use_errno=True)",
+             "",
+             "",
+             "",
+             "def _bind(name, restype, argtypes):",
+             "    # a function pointer of its own, not shared with _library.",
+             "    function = _library[name]",
+             "    function.restype = restype",
+             "    function.argtypes = argtypes",
+             "    return function",
+             "",
+             ""]
+
+    names = []
+    for name, restype, argtypes, definition in prototypes:
+        # names that are python keywords get an underscore.
+        attribute = name + "_" if keyword.iskeyword(name) else name
+        names.append(attribute)
+
+        lines.append("")
+        lines.append("# " + definition)
+        lines.append(attribute + " = _bind(" + _quote(name) + ", " + restype +
+                     ", [" + ", ".join(argtypes) + "])")
+
+    lines.append("")
+    lines.append("")
+    lines.append("__all__ = [")
+    for attribute in names:
+        lines.append("    " + _quote(attribute) + ",")
+    lines.append("]")
+
+    if skipped:
+        lines.append("")
+        lines.append("# not generated:")
+        for name, reason in skipped:
+            lines.append("#   " + name + ": " + reason)
+
+    return "\n".join(lines) + "\n"
+
+
+
+def _quote(text):
+    # a string literal the same under python 2 and 3, where repr of unpickled
+    # names gives u'...' with python 2.
+    return repr(str(text))
+
+
+
+def _get_library_name(library_path):
+    # the name ctypes.util.find_library takes eg c for libc.so.6.
+    base_name = library_path.rsplit("/", 1)[-1]
+    if base_name.startswith("lib"):
+        base_name = base_name[3:]
+    return base_name.split(".so", 1)[0]
+
+
+
+def write_prototypes_module(syscall_manuals, module_file_name, library_path=None):
+    """
+    <Purpose>
+      Writes the module of ctypes prototypes of generate_prototypes.
+
+    <Arguments>
+      syscall_manuals:
+        A list of SyscallManual objects.
+
+      module_file_name:
+        The name of the python file to write eg libc_prototypes.py.
+
+      library_path:
+        The path of the library the prototypes are bound to. Defaults to
+        libc.
+
+    <Exceptions>
+      ElfError or IOError if the library cannot be read.
+
+    <Side Effects>
+      Writes the module file.
+
+    <Returns>
+      The list of (name, reason) tuples of the definitions left out.
+    """
+
+    source, skipped = generate_prototypes(syscall_manuals, library_path)
+
+    module_file = open(module_file_name, "w")
+    try:
+        module_file.write(source)
+    finally:
+        module_file.close()
+
+    return skipped
+
+
+
+def main():
+    import sys
+
+    from sysDef.DefinitionsDatabase import read_definitions
+
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python -m sysDef.CtypesGenerator <definitions> " +
+              "<module.py> [library]")
+        exit()
+
+    library_path = None
+    if len(sys.argv) == 4:
+        library_path = find_library_path(sys.argv[3])
+
+    syscall_manuals = read_definitions(sys.argv[1])
+    skipped = write_prototypes_module(syscall_manuals, sys.argv[2], library_path)
+
+    found = len([sm for sm in syscall_manuals if sm.type == SyscallManual.FOUND])
+    print(str(found - len(skipped)) + " prototypes written to " + sys.argv[2] +
+          ", " + str(len(skipped)) + " definitions left out:")
+    for name, reason in skipped:
+        print("  " + name + ": " + reason)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-from SyscallParameter import SyscallParameter
+from sysDef.SyscallParameter import parameter_cache
 
-class Definition:
+class Definition(object):
     """
     <Purpose>
       A Definition object is made up of three parts: 
@@ -18,9 +18,15 @@ class Definition:
     
       self.parameters:
         A list of SyscallParameter objects each describing a parameter of the definition.
+        Equal parameters of different definitions are the same, immutable,
+        object.
     
     """
 
+    # definitions are kept without an instance dictionary.
+    __slots__ = ("ret_type", "name", "parameters")
+
+
     def __init__(self, definition_line):
         """
         <Purpose>
@@ -61,6 +67,14 @@ class Definition:
             self.name = self.name[1:]    # remove the asterisk from name
             self.ret_type += "*"    # and add it to the return type.
 
+        # return types are shared by many definitions.
+        self.ret_type = parameter_cache.intern(self.ret_type)
+
+        # replace whitespace with space and join any "*" on its own with the
+        # subsequent parameter name, once for all the parameters. This can happen
+        # eg: int sched_rr_get_interval(pid_t pid, struct timespec * tp);
+        parameters_string = " ".join(parameters_string.split()).replace("* ", "*")
+
         # remove brackets and semi-colon from the end of the parameters and split
         # them into a list of type-name parameters.
         parameters_list = parameters_string.strip("();").split(", ")
@@ -74,21 +88,25 @@ class Definition:
         if(parameters_list[0] == "void"):
             return
 
+        # each parameter is parsed in a single pass, and only the first time it
+        # is met. Only parameters that are represented exactly as they appear in
+        # the definition are accepted, so there is no need to compare their
+        # representation to param_string.
         for param_string in parameters_list:
-            # replace whitespace with space
-            param_string = " ".join(param_string.split())
+            self.parameters.append(parameter_cache(param_string.strip()))
+
 
-            # if there is a "*" on its own, join it with the subsequent parameter. This
-            # can happen eg: int sched_rr_get_interval(pid_t pid, struct timespec * tp);
-            param_string = param_string.replace("* ", "*")
+    def __getstate__(self):
+        return (self.ret_type, self.name, self.parameters)
 
-            # parse the parameter.
-            parameter = SyscallParameter(param_string)
 
-            # test whether the parameter was parsed completely and correctly.
-            assert(repr(parameter) == param_string)
+    def __setstate__(self, state):
+        # definitions pickled by older versions have a dictionary of attributes
+        # as their state.
+        if isinstance(state, dict):
+            state = (state["ret_type"], state["name"], state["parameters"])
 
-            self.parameters.append(parameter)
+        self.ret_type, self.name, self.parameters = state
 
 
     def __repr__(self):
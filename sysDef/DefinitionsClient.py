@@ -0,0 +1,345 @@
+"""
+<Purpose>
+  A thin client of the definitions server (see sysDef/DefinitionsServer.py),
+  which answers questions about system call definitions over a Unix domain
+  socket without loading them, so each call only pays for a round trip.
+
+  Messages in both directions are frames made up of the length of their body
+  as a 4 byte big endian unsigned integer followed by the body, a UTF-8 JSON
+  object. A request is one of:
+    {"op": "name", "name": "open"}
+    {"op": "number", "number": 2}
+    {"op": "query", "predicate": ["takes", "sockaddr", ["struct", "pointer"]]}
+    {"op": "stats"}
+    {"op": "reload"}
+
+  and is answered with {"ok": true, "result": ...} or {"ok": false, "error":
+  "..."}. Any number of requests can be sent over the same connection.
+
+  Definitions are given as dictionaries with the name and type of the system
+  call and its definition, or None. Predicates are nested lists:
+    ["takes", TYPE, [FLAG, ...]]   takes a parameter of base type TYPE with
+                                   all the flags given, eg "pointer".
+    ["flag", FLAG]                 has a parameter with the flag.
+    ["args", COUNT]                has COUNT parameters.
+    ["returns", TYPE]              returns TYPE.
+    ["all"]                        has a definition.
+    ["and", P, P, ...], ["or", P, P, ...], ["not", P, Q]  (P but not Q).
+
+  This module only imports the python standard library so the client starts
+  quickly.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.DefinitionsClient name chown32
+    python -m sysDef.DefinitionsClient number 59
+    python -m sysDef.DefinitionsClient query '["and", ["flag", "function"], ["returns", "int"]]'
+
+  will print the definitions of chown32, of system call 59 and of the system
+  calls returning int with a function pointer parameter, and running:
+    python -m sysDef.DefinitionsClient stats
+
+  will print the number of requests the server answered and their latency
+  percentiles.
+
+"""
+
+import json
+import os
+import socket
+import struct
+import tempfile
+
+
+# the header of a frame: the length of its body.
+_HEADER = struct.Struct(">I")
+
+# frames larger than this are refused.
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+
+class ProtocolError(Exception):
+    """
+    A malformed frame was received, or the connection was closed in the middle
+    of one.
+    """
+
+
+
+class ServerError(Exception):
+    """
+    The server answered a request with an error.
+    """
+
+
+
+def get_default_socket_path():
+    """
+    Returns the path of the socket the server listens on by default, in the
+    runtime directory of the user if there is one.
+    """
+
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, "syscall-definitions-" + str(os.getuid()) +
+                        ".sock")
+
+
+
+def send_frame(sock, message):
+    """
+    Sends a message, any object JSON can encode, as a single frame.
+    """
+
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+
+def receive_frame(sock):
+    """
+    <Purpose>
+      Receives a frame and decodes its message.
+
+    <Arguments>
+      sock:
+        A connected socket.
+
+    <Exceptions>
+      ProtocolError if the frame is too large, is not valid JSON or the
+      connection is closed in the middle of it.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The message, or None if the connection was closed before the frame.
+    """
+
+    header = _receive_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+
+    size = _HEADER.unpack(header)[0]
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError("Frame of " + str(size) + " bytes is too large.")
+
+    body = _receive_exactly(sock, size)
+    if body is None:
+        raise ProtocolError("Connection closed in the middle of a frame.")
+
+    try:
+        return json.loads(body.decode("utf-8"))
+    except ValueError:
+        raise ProtocolError("Frame is not valid JSON.")
+
+
+
+def _receive_exactly(sock, size):
+    # the next size bytes, or None if the connection is closed before any of
+    # them.
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ProtocolError("Connection closed in the middle of a frame.")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+
+    return b"".join(chunks)
+
+
+
+class DefinitionsClient(object):
+    """
+    <Purpose>
+      A connection to the definitions server.
+
+    <Attributes>
+      socket_path:
+        The path of the socket of the server.
+
+    """
+
+    def __init__(self, socket_path=None, timeout=None):
+        """
+        <Purpose>
+          Connects to the definitions server.
+
+        <Arguments>
+          socket_path:
+            The path of the socket of the server. Defaults to
+            get_default_socket_path().
+
+          timeout:
+            The timeout of each request in seconds. Defaults to none.
+
+        <Exceptions>
+          socket.error if the server cannot be reached.
+
+        <Side Effects>
+          Opens a socket.
+
+        <Returns>
+          None
+        """
+
+        if socket_path is None:
+            socket_path = get_default_socket_path()
+
+        self.socket_path = socket_path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(socket_path)
+        except Exception:
+            self._socket.close()
+            raise
+
+
+    def request(self, message):
+        """
+        <Purpose>
+          Sends a request and waits for its answer.
+
+        <Arguments>
+          message:
+            The request, a dictionary with an "op" key.
+
+        <Exceptions>
+          ServerError if the server answered with an error.
+          ProtocolError if the connection was closed or the answer malformed.
+
+        <Side Effects>
+          None
+
+        <Returns>
+          The result of the request.
+        """
+
+        send_frame(self._socket, message)
+        response = receive_frame(self._socket)
+        if response is None:
+            raise ProtocolError("Connection closed by the server.")
+
+        if not response.get("ok"):
+            raise ServerError(response.get("error"))
+
+        return response.get("result")
+
+
+    def lookup_name(self, name):
+        """
+        Returns the definition of the system call with the given name, or None.
+        """
+
+        return self.request({"op": "name", "name": name})
+
+
+    def lookup_number(self, number):
+        """
+        Returns the definition of the system call with the given number of the
+        architecture of the server, or None.
+        """
+
+        return self.request({"op": "number", "number": number})
+
+
+    def query(self, predicate):
+        """
+        Returns the definitions of the system calls matching a predicate, given
+        as nested lists eg ["flag", "function"].
+        """
+
+        return self.request({"op": "query", "predicate": predicate})
+
+
+    def stats(self):
+        """
+        Returns the statistics of the server, including the latency
+        percentiles of the requests it answered.
+        """
+
+        return self.request({"op": "stats"})
+
+
+    def reload(self):
+        """
+        Makes the server load its definitions file again. Returns its stats.
+        """
+
+        return self.request({"op": "reload"})
+
+
+    def close(self):
+        self._socket.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.close()
+
+
+
+def main():
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Ask the definitions " +
+                                     "server about system call definitions.")
+    parser.add_argument("op", choices=["name", "number", "query", "stats",
+                                       "reload"],
+                        help="the kind of request.")
+    parser.add_argument("argument", nargs="?", default=None,
+                        help="the name, number or JSON predicate to look up.")
+    parser.add_argument("--socket", metavar="PATH", default=None,
+                        help="the socket of the server. Defaults to " +
+                        get_default_socket_path() + ".")
+    args = parser.parse_args()
+
+    if args.op in ("name", "number", "query") and args.argument is None:
+        parser.error(args.op + " needs an argument.")
+
+    try:
+        client = DefinitionsClient(args.socket)
+    except socket.error as error:
+        sys.stderr.write("Cannot connect to the definitions server: " +
+                         str(error) + "\n")
+        sys.exit(1)
+
+    try:
+        if args.op == "name":
+            results = [client.lookup_name(args.argument)]
+        elif args.op == "number":
+            results = [client.lookup_number(int(args.argument, 0))]
+        elif args.op == "query":
+            results = client.query(json.loads(args.argument))
+        elif args.op == "stats":
+            results = None
+            print(json.dumps(client.stats(), indent=2, sort_keys=True))
+        else:
+            results = None
+            print(json.dumps(client.reload(), indent=2, sort_keys=True))
+    except ServerError as error:
+        sys.stderr.write(str(error) + "\n")
+        sys.exit(1)
+    finally:
+        client.close()
+
+    for result in results or []:
+        if result is None:
+            print("-")
+        elif result["definition"] is None:
+            print(result["name"] + ": " + result["type"])
+        else:
+            print(result["name"] + ": " + result["definition"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+"""
+<Purpose>
+  Store a list of SyscallManual objects in an indexed binary database file
+  that can be read through mmap.
+
+  Reading a pickle of definitions rebuilds every object before any single
+  definition can be looked at. A database file is instead mapped into memory
+  and a definition is looked up by its system call name through a hash index,
+  touching only the few pages holding its records. Several processes reading
+  the same database share the same physical pages.
+
+  All integers are little-endian. A database file is made up of:
+
+    header:
+      magic "SYSDEFDB", version, number of manuals, number of parameters,
+      number of index slots, and the offsets of the sections below.
+
+    manual records, one for each SyscallManual, MANUAL_RECORD.size bytes each:
+      system call name, definition name, return type, page fingerprint
+      identity and digest (as strings), index of the first parameter record,
+      number of parameters and the type of the manual.
+
+    parameter records, PARAMETER_RECORD.size bytes each:
+      type, name and flags of a SyscallParameter. The parameters of a manual
+      are stored in consecutive records.
+
+    hash index:
+      a table of manual record indexes with open addressing, the slot of a
+      name given by the crc32 of the name. Empty slots hold EMPTY.
+
+    string table:
+      the UTF-8 bytes of all strings, each distinct string stored once.
+      Strings are referenced by their (offset, length) in the string table;
+      None is stored with length NONE.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.DefinitionsDatabase build syscall_definitions.pickle syscall_definitions.db
+    python -m sysDef.DefinitionsDatabase lookup syscall_definitions.db open chown32
+
+  will store the definitions of the pickle file into a database file and then
+  print the definitions of open and chown32.
+
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+from sysDef.Definition import Definition
+from sysDef.DefinitionsPickle import load_definitions
+from sysDef.SyscallManual import SyscallManual
+from sysDef.SyscallParameter import SyscallParameter
+
+
+MAGIC = b"SYSDEFDB"
+VERSION = 1
+
+# magic, version, manuals, parameters, index slots, then the offsets of the
+# manual records, the parameter records, the index and the string table and
+# the size of the string table.
+HEADER = struct.Struct("<8sIIII5I")
+
+# name, definition name, return type, fingerprint identity and fingerprint
+# digest as (offset, length) pairs, first parameter, number of parameters and
+# type.
+MANUAL_RECORD = struct.Struct("<10IIHBx")
+
+# type and name as (offset, length) pairs, and flags.
+PARAMETER_RECORD = struct.Struct("<4IHxx")
+
+INDEX_SLOT = struct.Struct("<I")
+
+# an empty index slot, and the length of a string that is None.
+EMPTY = 0xFFFFFFFF
+NONE = 0xFFFFFFFF
+
+# zero-copy views of the mapped file.
+try:
+    _view = buffer
+except NameError:
+    def _view(data, offset, size):
+        return memoryview(data)[offset:offset + size]
+
+
+
+def write_database(syscall_definitions_list, database_name):
+    """
+    <Purpose>
+      Stores a list of SyscallManual objects into a database file.
+
+    <Arguments>
+      syscall_definitions_list:
+        A list of SyscallManual objects. If a name appears more than once,
+        eg setpgid in some versions of the syscalls man page, all of them are
+        stored but only the first is found by name.
+
+      database_name:
+        The name of the database file.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      Writes the database file. The file is written to a temporary file first
+      and then renamed, so processes reading the old database file are not
+      affected.
+
+    <Returns>
+      None
+    """
+
+    strings = _StringTable()
+    manual_records = []
+    parameter_records = []
+
+    for sd in syscall_definitions_list:
+        definition = sd.definition
+        if definition is None:
+            definition_strings = (None, None)
+            parameters = []
+        else:
+            definition_strings = (definition.name, definition.ret_type)
+            parameters = definition.parameters
+
+        page_fingerprint = getattr(sd, "page_fingerprint", None)
+        if page_fingerprint is None:
+            page_fingerprint = (None, None)
+
+        manual_fields = []
+        for string in (sd.name,) + definition_strings + tuple(page_fingerprint):
+            manual_fields.extend(strings.add(string))
+
+        manual_fields.extend([len(parameter_records), len(parameters), sd.type])
+        manual_records.append(MANUAL_RECORD.pack(*manual_fields))
+
+        for parameter in parameters:
+            parameter_fields = strings.add(parameter.type) + strings.add(parameter.name)
+            parameter_fields.append(parameter.flags)
+            parameter_records.append(PARAMETER_RECORD.pack(*parameter_fields))
+
+    # the index has at least twice as many slots as manuals, and a power of two
+    # slots so that the slot of a hash is a mask away.
+    index_size = 1
+    while index_size < 2 * len(manual_records):
+        index_size *= 2
+
+    index = [EMPTY] * index_size
+    for manual_index, sd in enumerate(syscall_definitions_list):
+        slot = _hash(sd.name.encode("utf-8")) & (index_size - 1)
+        while index[slot] != EMPTY:
+            if syscall_definitions_list[index[slot]].name == sd.name:
+                break
+            slot = (slot + 1) & (index_size - 1)
+        else:
+            index[slot] = manual_index
+
+    manuals_offset = HEADER.size
+    parameters_offset = manuals_offset + len(manual_records) * MANUAL_RECORD.size
+    index_offset = parameters_offset + len(parameter_records) * PARAMETER_RECORD.size
+    strings_offset = index_offset + index_size * INDEX_SLOT.size
+    string_table = strings.get_bytes()
+
+    header = HEADER.pack(MAGIC, VERSION, len(manual_records),
+                         len(parameter_records), index_size, manuals_offset,
+                         parameters_offset, index_offset, strings_offset,
+                         len(string_table))
+
+    database_directory = os.path.dirname(os.path.abspath(database_name))
+    file_descriptor, temporary_name = tempfile.mkstemp(dir=database_directory,
+                                                       prefix=".tmp")
+    database_file = os.fdopen(file_descriptor, "wb")
+    try:
+        database_file.write(header)
+        database_file.write(b"".join(manual_records))
+        database_file.write(b"".join(parameter_records))
+        database_file.write(struct.pack("<%dI" % index_size, *index))
+        database_file.write(string_table)
+    except:
+        database_file.close()
+        os.remove(temporary_name)
+        raise
+
+    database_file.close()
+
+    # temporary files are only readable by their owner.
+    os.chmod(temporary_name, 0o644)
+    os.rename(temporary_name, database_name)
+
+
+
+def is_database(file_name):
+    """
+    Returns whether the given file is a definitions database file.
+    """
+
+    database_file = open(file_name, "rb")
+    try:
+        return database_file.read(len(MAGIC)) == MAGIC
+    finally:
+        database_file.close()
+
+
+
+def read_definitions(file_name):
+    """
+    Returns the list of SyscallManual objects stored in the given database or
+    pickle file.
+    """
+
+    if not is_database(file_name):
+        return load_definitions(file_name)
+
+    database = DefinitionsDatabase(file_name)
+    try:
+        return database.load()
+    finally:
+        database.close()
+
+
+
+class _StringTable:
+    """
+    Gathers the distinct strings of a database, and their offsets.
+    """
+
+    def __init__(self):
+        self.offsets = {}
+        self.data = []
+        self.size = 0
+
+
+    def add(self, string):
+        # returns the (offset, length) of a string, adding it if it is new.
+        if string is None:
+            return [0, NONE]
+
+        data = string.encode("utf-8")
+        if data not in self.offsets:
+            self.offsets[data] = self.size
+            self.data.append(data)
+            self.size += len(data)
+
+        return [self.offsets[data], len(data)]
+
+
+    def get_bytes(self):
+        return b"".join(self.data)
+
+
+
+def _hash(name_bytes):
+    return zlib.crc32(name_bytes) & 0xFFFFFFFF
+
+
+
+class DefinitionsDatabase(object):
+    """
+    <Purpose>
+      A read-only view of a database file written by write_database. The file
+      is mapped into memory and nothing is read from it until it is accessed.
+
+      Manuals are identified by their index in the database, in the order of
+      the list they were written from. lookup and __getitem__ build
+      SyscallManual objects, while the get_*_view methods return views of the
+      mapped file without copying it (buffer objects on python 2 and
+      memoryview objects on python 3). The database cannot be closed while
+      views of it are held, on python 3.
+
+    <Attributes>
+      database_name:
+        The name of the database file.
+
+    """
+
+    def __init__(self, database_name):
+        """
+        <Purpose>
+          Opens a database file.
+
+        <Arguments>
+          database_name:
+            The name of the database file.
+
+        <Exceptions>
+          Exception if the file is not a database file or its version is not
+          supported.
+
+        <Side Effects>
+          Maps the database file into memory.
+
+        <Returns>
+          None
+        """
+
+        self.database_name = database_name
+
+        database_file = open(database_name, "rb")
+        try:
+            self._data = mmap.mmap(database_file.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            database_file.close()
+
+        (magic, version, self._manuals, self._parameters, self._index_size,
+         self._manuals_offset, self._parameters_offset, self._index_offset,
+         self._strings_offset, strings_size) = HEADER.unpack_from(self._data, 0)
+
+        if magic != MAGIC:
+            self._data.close()
+            raise Exception(database_name + " is not a definitions database.")
+
+        if version != VERSION:
+            self._data.close()
+            raise Exception("Unsupported definitions database version " +
+                            str(version) + " in " + database_name)
+
+
+    def close(self):
+        """
+        Unmaps the database file.
+        """
+
+        self._data.close()
+
+
+    def __len__(self):
+        return self._manuals
+
+
+    def __contains__(self, syscall_name):
+        return self.find(syscall_name) is not None
+
+
+    def __getitem__(self, manual_index):
+        """
+        Returns the SyscallManual object with the given index.
+        """
+
+        if not 0 <= manual_index < self._manuals:
+            raise IndexError("manual index out of range")
+
+        fields = self._get_manual_fields(manual_index)
+        page_fingerprint = None
+        if fields[7] != NONE:
+            page_fingerprint = (self._get_string(fields[6], fields[7]),
+                                self._get_string(fields[8], fields[9]))
+
+        definition = None
+        if fields[3] != NONE:
+            parameters = []
+            for parameter_index in range(fields[10], fields[10] + fields[11]):
+                parameter_fields = self._get_parameter_fields(parameter_index)
+                parameter = SyscallParameter.__new__(SyscallParameter)
+                parameter.__setstate__((self._get_string(parameter_fields[0], parameter_fields[1]),
+                                        self._get_string(parameter_fields[2], parameter_fields[3]),
+                                        parameter_fields[4]))
+                parameters.append(parameter)
+
+            definition = Definition.__new__(Definition)
+            definition.__setstate__((self._get_string(fields[4], fields[5]),
+                                     self._get_string(fields[2], fields[3]),
+                                     parameters))
+
+        syscall_manual = SyscallManual.__new__(SyscallManual)
+        syscall_manual.__setstate__((self._get_string(fields[0], fields[1]),
+                                     fields[12], definition, page_fingerprint))
+        return syscall_manual
+
+
+    def find(self, syscall_name):
+        """
+        <Purpose>
+          Finds the index of the manual of a system call through the hash index.
+
+        <Arguments>
+          syscall_name:
+            The name of the system call.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          The index of the manual, or None if the system call is not in the
+          database.
+        """
+
+        name_bytes = syscall_name.encode("utf-8")
+        mask = self._index_size - 1
+        slot = _hash(name_bytes) & mask
+        while True:
+            manual_index = INDEX_SLOT.unpack_from(self._data, self._index_offset +
+                                                  slot * INDEX_SLOT.size)[0]
+            if manual_index == EMPTY:
+                return None
+
+            name_offset, name_length = MANUAL_RECORD.unpack_from(
+                self._data, self._manuals_offset + manual_index * MANUAL_RECORD.size)[:2]
+            name_offset += self._strings_offset
+            if self._data[name_offset:name_offset + name_length] == name_bytes:
+                return manual_index
+
+            slot = (slot + 1) & mask
+
+
+    def lookup(self, syscall_name):
+        """
+        Returns the SyscallManual object of a system call, or None if the system
+        call is not in the database.
+        """
+
+        manual_index = self.find(syscall_name)
+        if manual_index is None:
+            return None
+
+        return self[manual_index]
+
+
+    def load(self):
+        """
+        Returns the list of all the SyscallManual objects in the database.
+        """
+
+        return [self[manual_index] for manual_index in range(self._manuals)]
+
+
+    def get_type(self, manual_index):
+        """
+        Returns the type of the manual with the given index eg
+        SyscallManual.FOUND.
+        """
+
+        return self._get_manual_fields(manual_index)[12]
+
+
+    def get_name_view(self, manual_index):
+        """
+        Returns a view of the UTF-8 encoded system call name of the manual with
+        the given index.
+        """
+
+        fields = self._get_manual_fields(manual_index)
+        return self._get_view(fields[0], fields[1])
+
+
+    def get_definition_views(self, manual_index):
+        """
+        <Purpose>
+          Returns views of the definition of the manual with the given index.
+
+        <Arguments>
+          manual_index:
+            The index of the manual.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          None if the manual has no definition. Otherwise a
+          (ret_type, name, parameters) tuple where ret_type and name are views
+          of UTF-8 encoded strings and parameters is a list of
+          (type, name, flags) tuples, one for each parameter. type and name of a
+          parameter are views, or None for the ellipsis.
+        """
+
+        fields = self._get_manual_fields(manual_index)
+        if fields[3] == NONE:
+            return None
+
+        parameters = []
+        for parameter_index in range(fields[10], fields[10] + fields[11]):
+            parameter_fields = self._get_parameter_fields(parameter_index)
+            parameters.append((self._get_view(parameter_fields[0], parameter_fields[1]),
+                               self._get_view(parameter_fields[2], parameter_fields[3]),
+                               parameter_fields[4]))
+
+        return (self._get_view(fields[4], fields[5]),
+                self._get_view(fields[2], fields[3]), parameters)
+
+
+    def _get_manual_fields(self, manual_index):
+        return MANUAL_RECORD.unpack_from(self._data, self._manuals_offset +
+                                         manual_index * MANUAL_RECORD.size)
+
+
+    def _get_parameter_fields(self, parameter_index):
+        return PARAMETER_RECORD.unpack_from(self._data, self._parameters_offset +
+                                            parameter_index * PARAMETER_RECORD.size)
+
+
+    def _get_string(self, offset, length):
+        if length == NONE:
+            return None
+
+        offset += self._strings_offset
+        return self._data[offset:offset + length].decode("utf-8")
+
+
+    def _get_view(self, offset, length):
+        if length == NONE:
+            return None
+
+        return _view(self._data, self._strings_offset + offset, length)
+
+
+
+def main():
+    import sys
+
+    if(len(sys.argv) == 4 and sys.argv[1] == "build"):
+        syscall_definitions_list = load_definitions(sys.argv[2])
+        write_database(syscall_definitions_list, sys.argv[3])
+        print(str(len(syscall_definitions_list)) + " system call definitions stored.")
+
+    elif(len(sys.argv) >= 4 and sys.argv[1] == "lookup"):
+        database = DefinitionsDatabase(sys.argv[2])
+        for syscall_name in sys.argv[3:]:
+            syscall_manual = database.lookup(syscall_name)
+            if syscall_manual is None:
+                print(syscall_name + " not found.")
+            else:
+                print(syscall_manual)
+        database.close()
+
+    else:
+        print("Usage: python -m sysDef.DefinitionsDatabase build <pickle> <database>")
+        print("       python -m sysDef.DefinitionsDatabase lookup <database> <syscall_name>...")
+
+if __name__ == "__main__":
+    main()
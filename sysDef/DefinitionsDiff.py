@@ -0,0 +1,390 @@
+"""
+<Purpose>
+  Compare the definitions of two or more pickle or database files, eg
+  Linux_syscall_definitions.pickle against a fresh run, or the definitions
+  parsed on several kernels and distributions.
+
+  Every SyscallParameter and Definition gets a content fingerprint, a 64 bit
+  integer taken from the SHA-1 digest of its parts, so it is the same across
+  runs, machines and python versions. Parameters are shared by many
+  definitions and their fingerprints are remembered, up to
+  MAX_PARAMETER_FINGERPRINTS of them.
+
+  A fingerprint index maps each system call name of a list of SyscallManual
+  objects to the fingerprint of its whole entry, along with the fingerprints
+  of the parts of its definition. Two indexes are compared in a single pass
+  over their names: entries with equal fingerprints are unchanged, and the
+  others are classified as:
+    - added               only in the new index.
+    - removed             only in the old index.
+    - status-changed      the type of the entry changed, eg FOUND to
+                          NOT_FOUND.
+    - type-changed        the return type or the name of the definition
+                          changed.
+    - parameter-changed   the parameters of the definition changed.
+
+  Several files are compared pairwise by a pool of worker processes: the
+  index of each file is built once, and each pair of indexes is then diffed
+  by a worker.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.DefinitionsDiff Linux_syscall_definitions.pickle syscall_definitions.pickle
+
+  will print the differences between the two files, one per line, and
+  running:
+    python -m sysDef.DefinitionsDiff --summary ubuntu.db gentoo.db fedora.db
+
+  will print the number of differences of each kind for every pair of files.
+
+"""
+
+import hashlib
+import multiprocessing
+
+from sysDef.SyscallManual import SyscallManual
+
+
+# the kinds of differences.
+ADDED = "added"
+REMOVED = "removed"
+STATUS_CHANGED = "status-changed"
+TYPE_CHANGED = "type-changed"
+PARAMETER_CHANGED = "parameter-changed"
+
+KINDS = [ADDED, REMOVED, STATUS_CHANGED, TYPE_CHANGED, PARAMETER_CHANGED]
+
+# the number of parameter fingerprints remembered. Once reached they are
+# forgotten and remembered again from scratch, same as a ParameterCache.
+MAX_PARAMETER_FINGERPRINTS = 8192
+
+# the fingerprints of the parameters seen so far, keyed by their state.
+_parameter_fingerprints = {}
+
+
+
+def _digest(text):
+    # a 64 bit integer from the SHA-1 digest of a string.
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:16], 16)
+
+
+
+def get_parameter_fingerprint(parameter):
+    """
+    <Purpose>
+      Returns the content fingerprint of a parameter, made up of its type,
+      name and flags.
+
+    <Arguments>
+      parameter:
+        A SyscallParameter object.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      Remembers the fingerprint, so equal parameters are usually digested
+      once. See MAX_PARAMETER_FINGERPRINTS.
+
+    <Returns>
+      The fingerprint as a 64 bit integer.
+    """
+
+    key = (parameter.type, parameter.name, parameter.flags)
+    fingerprint = _parameter_fingerprints.get(key)
+    if fingerprint is None:
+        fingerprint = _digest(str(parameter.type) + " " + str(parameter.name) +
+                              " " + str(parameter.flags))
+        if len(_parameter_fingerprints) >= MAX_PARAMETER_FINGERPRINTS:
+            _parameter_fingerprints.clear()
+        _parameter_fingerprints[key] = fingerprint
+
+    return fingerprint
+
+
+
+def _get_definition_fingerprints(definition):
+    # the fingerprints of the return type and name, and of the parameters of a
+    # definition.
+    head_fingerprint = _digest(definition.ret_type + " " + definition.name)
+    parameters_fingerprint = _digest(" ".join(
+        ["%016x" % get_parameter_fingerprint(parameter)
+         for parameter in definition.parameters]))
+
+    return head_fingerprint, parameters_fingerprint
+
+
+
+def get_definition_fingerprint(definition):
+    """
+    <Purpose>
+      Returns the content fingerprint of a definition, made up of its return
+      type, name and the fingerprints of its parameters in order.
+
+    <Arguments>
+      definition:
+        A Definition object.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The fingerprint as a 64 bit integer.
+    """
+
+    return _digest("%016x %016x" % _get_definition_fingerprints(definition))
+
+
+
+def build_fingerprint_index(syscall_manuals):
+    """
+    <Purpose>
+      Builds the fingerprint index of a list of SyscallManual objects.
+
+    <Arguments>
+      syscall_manuals:
+        A list of SyscallManual objects. Only the first one of each name is
+        indexed.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A dictionary from each system call name to a tuple of the fingerprint
+      of its entry, its type, the fingerprints of the return type and name
+      and of the parameters of its definition (0 without a definition), and
+      the representation of its definition or None.
+    """
+
+    index = {}
+    for syscall_manual in syscall_manuals:
+        if syscall_manual.name in index:
+            continue
+
+        definition = syscall_manual.definition
+        if definition is None:
+            head_fingerprint = parameters_fingerprint = 0
+            definition_string = None
+        else:
+            head_fingerprint, parameters_fingerprint = \
+                _get_definition_fingerprints(definition)
+            definition_string = repr(definition)
+
+        fingerprint = _digest("%d %016x %016x" % (syscall_manual.type,
+                                                  head_fingerprint,
+                                                  parameters_fingerprint))
+
+        index[syscall_manual.name] = (fingerprint, syscall_manual.type,
+                                      head_fingerprint, parameters_fingerprint,
+                                      definition_string)
+
+    return index
+
+
+
+def _describe(entry):
+    # the definition of an entry of an index, or the name of its type.
+    if entry[4] is None:
+        return SyscallManual.TYPE_NAMES.get(entry[1], str(entry[1]))
+    return entry[4]
+
+
+
+def diff_indexes(old_index, new_index):
+    """
+    <Purpose>
+      Compares two fingerprint indexes in a single pass over their names.
+
+    <Arguments>
+      old_index:
+        The index of the old definitions, as built by build_fingerprint_index.
+
+      new_index:
+        The index of the new definitions.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A list of (kind, name, old, new) tuples sorted by name, one for each
+      entry that differs, where kind is one of KINDS and old and new are the
+      definition of the entry, or the name of its type if it has none, in
+      each index. old is None for added entries and new for removed ones.
+    """
+
+    differences = []
+    for name, old_entry in old_index.items():
+        new_entry = new_index.get(name)
+        if new_entry is None:
+            differences.append((REMOVED, name, _describe(old_entry), None))
+            continue
+
+        if new_entry[0] == old_entry[0]:
+            continue
+
+        if new_entry[1] != old_entry[1]:
+            kind = STATUS_CHANGED
+        elif new_entry[2] != old_entry[2]:
+            kind = TYPE_CHANGED
+        else:
+            kind = PARAMETER_CHANGED
+
+        differences.append((kind, name, _describe(old_entry),
+                            _describe(new_entry)))
+
+    for name, new_entry in new_index.items():
+        if name not in old_index:
+            differences.append((ADDED, name, None, _describe(new_entry)))
+
+    differences.sort(key=lambda difference: difference[1])
+
+    return differences
+
+
+
+def diff_definitions(old_syscall_manuals, new_syscall_manuals):
+    """
+    Compares two lists of SyscallManual objects. See diff_indexes.
+    """
+
+    return diff_indexes(build_fingerprint_index(old_syscall_manuals),
+                        build_fingerprint_index(new_syscall_manuals))
+
+
+
+def count_differences(differences):
+    """
+    Returns a dictionary from each of KINDS to the number of differences of
+    that kind.
+    """
+
+    counts = dict.fromkeys(KINDS, 0)
+    for difference in differences:
+        counts[difference[0]] += 1
+
+    return counts
+
+
+
+def _build_file_index(file_name):
+    # the fingerprint index of the definitions of a pickle or database file.
+    from sysDef.DefinitionsDatabase import read_definitions
+
+    return build_fingerprint_index(read_definitions(file_name))
+
+
+
+def _diff_pair(arguments):
+    old_index, new_index = arguments
+    return diff_indexes(old_index, new_index)
+
+
+
+def diff_files(file_names, pairs=None, workers=None):
+    """
+    <Purpose>
+      Compares the definitions of several pickle or database files pairwise,
+      in parallel.
+
+    <Arguments>
+      file_names:
+        A list of pickle or database files of definitions.
+
+      pairs:
+        A list of (old, new) tuples of indexes into file_names, the pairs to
+        compare. Defaults to every file against each file after it.
+
+      workers:
+        The number of worker processes. Defaults to the number of cores in
+        the system. If set to 1 the files are compared in this process.
+
+    <Exceptions>
+      IOError if a file cannot be read.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A list of (old file name, new file name, differences) tuples in the
+      order of pairs, where differences are as returned by diff_indexes.
+    """
+
+    if pairs is None:
+        pairs = [(old, new) for old in range(len(file_names))
+                 for new in range(old + 1, len(file_names))]
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    # each file is indexed once, however many pairs it is part of.
+    if workers <= 1 or len(file_names) <= 1:
+        indexes = [_build_file_index(file_name) for file_name in file_names]
+        results = [_diff_pair((indexes[old], indexes[new]))
+                   for old, new in pairs]
+    else:
+        pool = multiprocessing.Pool(min(workers, max(len(file_names),
+                                                     len(pairs))))
+        try:
+            indexes = pool.map(_build_file_index, file_names, chunksize=1)
+            results = pool.map(_diff_pair, [(indexes[old], indexes[new])
+                                            for old, new in pairs])
+        finally:
+            pool.close()
+            pool.join()
+
+    return [(file_names[old], file_names[new], differences)
+            for (old, new), differences in zip(pairs, results)]
+
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the definitions " +
+                                     "of pickle or database files.")
+    parser.add_argument("files", metavar="FILE", nargs="+",
+                        help="two or more pickle or database files of " +
+                        "definitions, compared pairwise.")
+    parser.add_argument("--summary", action="store_true",
+                        help="print the number of differences of each kind " +
+                        "instead of the differences.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes. Defaults to the " +
+                        "number of cores.")
+    args = parser.parse_args()
+
+    if len(args.files) < 2:
+        parser.error("at least two files are needed.")
+
+    results = diff_files(args.files, workers=args.workers)
+
+    for old_file_name, new_file_name, differences in results:
+        if len(results) > 1 or args.summary:
+            print(old_file_name + " -> " + new_file_name)
+
+        if args.summary:
+            counts = count_differences(differences)
+            for kind in KINDS:
+                print("  " + kind + ": " + str(counts[kind]))
+            continue
+
+        for kind, name, old, new in differences:
+            if kind == ADDED:
+                print(kind + "\t" + name + "\t" + new)
+            elif kind == REMOVED:
+                print(kind + "\t" + name + "\t" + old)
+            else:
+                print(kind + "\t" + name + "\t" + old + "\t->\t" + new)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+<Purpose>
+  Store and load lists of SyscallManual objects in pickle files.
+
+  SyscallManual, Definition and SyscallParameter objects are pickled in a
+  compact form: each object is stored as a tuple of its attributes, and the
+  boolean attributes of a SyscallParameter as a single integer. Pickles are
+  written with protocol 2 so they can be read by both python 2 and python 3.
+
+  Pickles written by older versions are loaded as well and can be migrated to
+  the compact form. These include:
+    - pickles of the older classic classes which stored a dictionary of
+      attributes for each object,
+    - pickles of the SyscallDefinition module, eg
+      Linux_syscall_definitions.pickle, whose classes were later renamed to
+      SyscallManual, Definition and SyscallParameter. This pickle was written
+      by python 3 so it can only be read by python 3.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.DefinitionsPickle Linux_syscall_definitions.pickle migrated.pickle
+
+  will store the definitions of Linux_syscall_definitions.pickle into
+  migrated.pickle in the compact form.
+
+"""
+
+import pickle
+
+try:
+    import copy_reg as copyreg
+except ImportError:
+    import copyreg
+
+from sysDef.Definition import Definition
+from sysDef.SyscallManual import SyscallManual
+from sysDef.SyscallParameter import SyscallParameter
+
+
+# the pickle protocol used to store definitions.
+PROTOCOL = 2
+
+# the classes that can be found in a pickle of definitions, by their module and
+# name.
+_CLASSES = {
+    ("sysDef.SyscallManual", "SyscallManual"): SyscallManual,
+    ("sysDef.Definition", "Definition"): Definition,
+    ("sysDef.SyscallParameter", "SyscallParameter"): SyscallParameter,
+    ("SyscallDefinition", "SyscallDefinition"): SyscallManual,
+    ("SyscallDefinition", "Definition"): Definition,
+    ("SyscallDefinition", "Parameter"): SyscallParameter,
+}
+
+
+
+def dump_definitions(syscall_definitions_list, pickle_name):
+    """
+    <Purpose>
+      Stores a list of SyscallManual objects into a pickle file.
+
+    <Arguments>
+      syscall_definitions_list:
+        A list of SyscallManual objects.
+
+      pickle_name:
+        The name of the pickle file.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      Writes the pickle file.
+
+    <Returns>
+      None
+    """
+
+    pickle_file = open(pickle_name, 'wb')
+    try:
+        pickle.dump(syscall_definitions_list, pickle_file, PROTOCOL)
+    finally:
+        pickle_file.close()
+
+
+
+def load_definitions(pickle_name):
+    """
+    <Purpose>
+      Loads a list of SyscallManual objects from a pickle file written by this
+      or an older version.
+
+    <Arguments>
+      pickle_name:
+        The name of the pickle file.
+
+    <Exceptions>
+      pickle.UnpicklingError if the pickle file holds classes other than the
+      ones making up a list of definitions.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The list of SyscallManual objects.
+    """
+
+    pickle_file = open(pickle_name, 'rb')
+    try:
+        return _DefinitionsUnpickler(pickle_file).load()
+    finally:
+        pickle_file.close()
+
+
+
+class _DefinitionsUnpickler(pickle.Unpickler):
+    """
+    Only allows the classes of definitions to be loaded, and maps the classes
+    of older versions to the current ones.
+    """
+
+    def find_class(self, module, name):
+        if (module, name) in _CLASSES:
+            return _get_restorer(_CLASSES[(module, name)])
+
+        # objects pickled with protocol 0 or 1 are reconstructed through
+        # copy_reg.
+        if name == "_reconstructor" and module in ("copy_reg", "copyreg"):
+            return _reconstructor
+
+        if name == "object" and module in ("__builtin__", "builtins"):
+            return object
+
+        raise pickle.UnpicklingError("Unexpected class in definitions: " +
+                                     module + "." + name)
+
+
+
+_restorers = {}
+
+def _get_restorer(cls):
+    # pickles of classic classes create objects by calling their class without
+    # arguments, while newer pickles call __new__. A restorer creates an object
+    # of cls without calling its __init__ in both cases.
+    if cls not in _restorers:
+        class Restorer(object):
+            restored_class = cls
+
+            def __new__(restorer_cls, *args):
+                return cls.__new__(cls)
+
+        _restorers[cls] = Restorer
+
+    return _restorers[cls]
+
+
+
+def _reconstructor(cls, base, state):
+    return copyreg._reconstructor(getattr(cls, "restored_class", cls), base, state)
+
+
+
+def main():
+    import sys
+
+    if(len(sys.argv) != 3):
+        print("Usage: python -m sysDef.DefinitionsPickle <old_pickle> <new_pickle>")
+        exit()
+
+    syscall_definitions_list = load_definitions(sys.argv[1])
+    dump_definitions(syscall_definitions_list, sys.argv[2])
+    print(str(len(syscall_definitions_list)) + " system call definitions migrated.")
+
+if __name__ == "__main__":
+    main()
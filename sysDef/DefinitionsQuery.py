@@ -0,0 +1,451 @@
+"""
+<Purpose>
+  Answer questions about a list of system call definitions, such as "every
+  system call that takes a struct sockaddr *", "every system call with a
+  function pointer parameter" or "every system call returning ssize_t",
+  without scanning the whole list.
+
+  A DefinitionsQuery is built once over a list of SyscallManual objects and
+  keeps inverted indexes from:
+    - the base type of a parameter and its flags, eg ("sockaddr",
+      STRUCT | POINTER),
+    - each SyscallParameter flag,
+    - the number of parameters,
+    - the return type,
+  to the set of system calls having them. Only manuals of type FOUND are
+  indexed.
+
+  Questions are asked with predicates which can be combined with & (and),
+  | (or) and - (and not):
+
+    query = DefinitionsQuery(syscall_definitions_list)
+    query.select(takes("sockaddr", SyscallParameter.STRUCT |
+                       SyscallParameter.POINTER) & returns("int"))
+
+  A predicate is answered by set operations over the indexes, intersecting
+  the smallest sets first, so its cost depends on the sizes of the sets
+  involved rather than the number of definitions.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.DefinitionsQuery syscall_definitions.pickle --takes sockaddr --flag pointer
+
+  will print the definitions of all system calls taking a pointer to a
+  sockaddr.
+
+"""
+
+from sysDef.SyscallManual import SyscallManual
+from sysDef.SyscallParameter import SyscallParameter
+
+
+# the flags of a parameter by their name.
+FLAGS = dict(SyscallParameter.FLAG_NAMES)
+
+# returned by predicates matching nothing.
+_EMPTY = frozenset()
+
+
+
+class DefinitionsQuery(object):
+    """
+    <Purpose>
+      Inverted indexes over a list of SyscallManual objects.
+
+    <Attributes>
+      syscall_definitions_list:
+        The list of SyscallManual objects indexed. System calls are referred
+        to by their index in this list.
+
+      by_type:
+        A dictionary from the base type of a parameter, eg "sockaddr", to a
+        dictionary from the flags of the parameter to the set of system calls
+        taking such a parameter.
+
+      by_flag:
+        A dictionary from each flag of SyscallParameter to the set of system
+        calls with a parameter having that flag.
+
+      by_arg_count:
+        A dictionary from a number of parameters to the set of system calls
+        with that many parameters. An ellipsis counts as a parameter.
+
+      by_ret_type:
+        A dictionary from a return type, eg "ssize_t" or "void*", to the set
+        of system calls returning it.
+
+      found:
+        The set of all the system calls with a definition.
+
+    """
+
+    def __init__(self, syscall_definitions_list):
+        """
+        <Purpose>
+          Builds the indexes of a list of definitions.
+
+        <Arguments>
+          syscall_definitions_list:
+            A list of SyscallManual objects.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          None
+        """
+
+        self.syscall_definitions_list = syscall_definitions_list
+        self.by_type = {}
+        self.by_flag = {}
+        self.by_arg_count = {}
+        self.by_ret_type = {}
+        self.found = set()
+
+        for flag_name, flag in SyscallParameter.FLAG_NAMES:
+            self.by_flag[flag] = set()
+
+        for index, syscall_manual in enumerate(syscall_definitions_list):
+            if syscall_manual.type != SyscallManual.FOUND:
+                continue
+
+            definition = syscall_manual.definition
+            self.found.add(index)
+            self.by_ret_type.setdefault(definition.ret_type, set()).add(index)
+            self.by_arg_count.setdefault(len(definition.parameters),
+                                         set()).add(index)
+
+            for parameter in definition.parameters:
+                flags = parameter.flags
+                self.by_type.setdefault(parameter.type, {}).setdefault(
+                    flags, set()).add(index)
+
+                # each bit of the flags.
+                while flags:
+                    flag = flags & -flags
+                    self.by_flag[flag].add(index)
+                    flags ^= flag
+
+
+    def __len__(self):
+        return len(self.found)
+
+
+    def find(self, predicate):
+        """
+        Returns the set of the indexes of all the system calls matching the
+        given predicate.
+        """
+
+        return predicate.evaluate(self)
+
+
+    def select(self, predicate):
+        """
+        <Purpose>
+          Returns the system calls matching a predicate.
+
+        <Arguments>
+          predicate:
+            A predicate, eg takes("sockaddr") & returns("int").
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          A list of the matching SyscallManual objects, in the order they
+          appear in the list of definitions.
+        """
+
+        return [self.syscall_definitions_list[index]
+                for index in sorted(predicate.evaluate(self))]
+
+
+    def count(self, predicate):
+        """
+        Returns the number of system calls matching the given predicate.
+        """
+
+        return len(predicate.evaluate(self))
+
+
+
+class Predicate(object):
+    """
+    <Purpose>
+      A question asked to a DefinitionsQuery. Predicates are combined with
+      & (both), | (either) and - (the first but not the second).
+
+      evaluate returns a set of system call indexes which must not be
+      modified.
+
+    """
+
+    def evaluate(self, query):
+        raise NotImplementedError
+
+
+    def __and__(self, other):
+        return _And([self, other])
+
+
+    def __or__(self, other):
+        return _Or([self, other])
+
+
+    def __sub__(self, other):
+        return _Difference(self, other)
+
+
+
+class _Lookup(Predicate):
+    """
+    A predicate answered by a single index.
+    """
+
+    def __init__(self, index_name, key):
+        self.index_name = index_name
+        self.key = key
+
+
+    def evaluate(self, query):
+        return getattr(query, self.index_name).get(self.key, _EMPTY)
+
+
+    def __repr__(self):
+        return self.index_name + "[" + repr(self.key) + "]"
+
+
+
+class _Takes(Predicate):
+    """
+    The system calls with a parameter of a base type having all the given
+    flags. Only the flags of the parameters of that type are looked at.
+    """
+
+    def __init__(self, parameter_type, flags):
+        self.parameter_type = parameter_type
+        self.flags = flags
+
+
+    def evaluate(self, query):
+        by_flags = query.by_type.get(self.parameter_type)
+        if by_flags is None:
+            return _EMPTY
+
+        matching = [indexes for flags, indexes in by_flags.items()
+                    if flags & self.flags == self.flags]
+        if len(matching) == 1:
+            return matching[0]
+
+        return set().union(*matching)
+
+
+    def __repr__(self):
+        return "takes(" + repr(self.parameter_type) + ", " + str(self.flags) + ")"
+
+
+
+class _And(Predicate):
+
+    def __init__(self, predicates):
+        self.predicates = predicates
+
+
+    def __and__(self, other):
+        return _And(self.predicates + [other])
+
+
+    def evaluate(self, query):
+        # intersecting the smallest set first keeps every intermediate result
+        # no larger than it.
+        sets = sorted([predicate.evaluate(query) for predicate in self.predicates],
+                      key=len)
+        result = sets[0]
+        for indexes in sets[1:]:
+            if not result:
+                break
+            result = result & indexes
+
+        return result
+
+
+    def __repr__(self):
+        return "(" + " & ".join([repr(p) for p in self.predicates]) + ")"
+
+
+
+class _Or(Predicate):
+
+    def __init__(self, predicates):
+        self.predicates = predicates
+
+
+    def __or__(self, other):
+        return _Or(self.predicates + [other])
+
+
+    def evaluate(self, query):
+        return set().union(*[predicate.evaluate(query)
+                             for predicate in self.predicates])
+
+
+    def __repr__(self):
+        return "(" + " | ".join([repr(p) for p in self.predicates]) + ")"
+
+
+
+class _Difference(Predicate):
+
+    def __init__(self, predicate, excluded):
+        self.predicate = predicate
+        self.excluded = excluded
+
+
+    def evaluate(self, query):
+        return self.predicate.evaluate(query) - self.excluded.evaluate(query)
+
+
+    def __repr__(self):
+        return "(" + repr(self.predicate) + " - " + repr(self.excluded) + ")"
+
+
+
+class _All(Predicate):
+
+    def evaluate(self, query):
+        return query.found
+
+
+    def __repr__(self):
+        return "everything()"
+
+
+
+def takes(parameter_type, flags=0):
+    """
+    <Purpose>
+      Matches the system calls taking a parameter of the given base type, eg
+      takes("sockaddr", SyscallParameter.STRUCT | SyscallParameter.POINTER)
+      for a "struct sockaddr *" parameter.
+
+    <Arguments>
+      parameter_type:
+        The base type of the parameter, without qualifiers, eg "char" for
+        "const char *pathname".
+
+      flags:
+        The flags the same parameter must have. It may have other flags too.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A Predicate.
+    """
+
+    return _Takes(parameter_type, flags)
+
+
+
+def has_flag(flag):
+    """
+    Matches the system calls with any parameter having the given flag, eg
+    has_flag(SyscallParameter.FUNCTION) or has_flag(SyscallParameter.ELLIPSIS).
+    """
+
+    return _Lookup("by_flag", flag)
+
+
+
+def arg_count(count):
+    """
+    Matches the system calls with the given number of parameters.
+    """
+
+    return _Lookup("by_arg_count", count)
+
+
+
+def returns(ret_type):
+    """
+    Matches the system calls with the given return type, eg "ssize_t".
+    """
+
+    return _Lookup("by_ret_type", ret_type)
+
+
+
+def everything():
+    """
+    Matches all the system calls with a definition, eg to exclude others with
+    everything() - has_flag(SyscallParameter.POINTER).
+    """
+
+    return _All()
+
+
+
+def main():
+    import argparse
+    import timeit
+
+    from sysDef.DefinitionsDatabase import read_definitions
+
+    parser = argparse.ArgumentParser(description="Find the system calls " +
+                                     "matching all the given conditions.")
+    parser.add_argument("definitions", metavar="FILE",
+                        help="a pickle or database file of definitions.")
+    parser.add_argument("--takes", metavar="TYPE", default=None,
+                        help="takes a parameter of base TYPE, with the flags " +
+                        "given by --flag.")
+    parser.add_argument("--flag", action="append", default=[],
+                        choices=sorted(FLAGS),
+                        help="has a parameter with this flag.")
+    parser.add_argument("--args", type=int, default=None,
+                        help="has this many parameters.")
+    parser.add_argument("--returns", metavar="TYPE", default=None,
+                        help="returns TYPE.")
+    args = parser.parse_args()
+
+    flags = 0
+    for flag_name in args.flag:
+        flags |= FLAGS[flag_name]
+
+    predicates = []
+    if args.takes is not None:
+        predicates.append(takes(args.takes, flags))
+    else:
+        predicates.extend([has_flag(FLAGS[flag_name]) for flag_name in args.flag])
+    if args.args is not None:
+        predicates.append(arg_count(args.args))
+    if args.returns is not None:
+        predicates.append(returns(args.returns))
+
+    predicate = everything()
+    for other in predicates:
+        predicate = predicate & other
+
+    syscall_definitions_list = read_definitions(args.definitions)
+    query = DefinitionsQuery(syscall_definitions_list)
+
+    for syscall_manual in query.select(predicate):
+        print(syscall_manual)
+
+    seconds = min(timeit.repeat(lambda: query.find(predicate), repeat=3,
+                                number=1000))
+    print(str(query.count(predicate)) + " of " + str(len(query)) +
+          " system calls matched in %.2f usec" % (seconds * 1000.0))
+
+if __name__ == "__main__":
+    main()
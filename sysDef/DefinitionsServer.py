@@ -0,0 +1,580 @@
+"""
+<Purpose>
+  A resident server answering questions about system call definitions over a
+  Unix domain socket, so that tools asking many of them pay for interpreter
+  startup, finding libc and loading the definitions only once.
+
+  The server loads a pickle or database file of definitions along with the
+  system call numbers of an architecture (see sysDef/SyscallNumberTable.py)
+  and the indexes of a DefinitionsQuery, and answers lookups:
+    - by system call name,
+    - by system call number,
+    - by predicate (see sysDef/DefinitionsQuery.py),
+  using the framed protocol of sysDef/DefinitionsClient.py. Each connection
+  is served by a thread of its own.
+
+  The definitions file is checked for changes periodically and loaded again
+  when it changes. The new definitions replace the old ones only once they
+  are fully loaded, so every request is answered from one consistent set of
+  definitions, and a file that fails to load leaves the old ones in place.
+
+  The time taken to answer the last requests is kept, and their latency
+  percentiles are reported by the stats request.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.DefinitionsServer syscall_definitions.pickle
+
+  will serve the definitions of syscall_definitions.pickle on the default
+  socket of sysDef/DefinitionsClient.py until interrupted.
+
+"""
+
+import collections
+import numbers
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from sysDef import DefinitionsQuery
+from sysDef.DefinitionsClient import ProtocolError
+from sysDef.DefinitionsClient import get_default_socket_path
+from sysDef.DefinitionsClient import receive_frame
+from sysDef.DefinitionsClient import send_frame
+from sysDef.DefinitionsDatabase import read_definitions
+from sysDef.SyscallManual import SyscallManual
+from sysDef.SyscallNumberTable import build_number_table
+
+
+# how often, in seconds, the definitions file is checked for changes.
+RELOAD_INTERVAL = 1.0
+
+# the number of the last requests whose latency is kept.
+LATENCY_SAMPLES = 10000
+
+# the latency percentiles reported.
+PERCENTILES = (50, 90, 99)
+
+
+
+class LoadedDefinitions(object):
+    """
+    <Purpose>
+      The definitions of a file, along with their indexes. Never modified
+      once created.
+
+    <Attributes>
+      file_name:
+        The pickle or database file the definitions were loaded from.
+
+      signature:
+        The (modification time, size, inode) of the file before it was
+        loaded.
+
+      syscall_manuals:
+        The list of SyscallManual objects of the file.
+
+      by_name:
+        A dictionary from each system call name to its SyscallManual.
+
+      query:
+        A DefinitionsQuery over syscall_manuals.
+
+      number_table:
+        A SyscallNumberTable over syscall_manuals, or None if the system call
+        numbers could not be read.
+
+      number_error:
+        Why the system call numbers could not be read, or None.
+
+    """
+
+    def __init__(self, file_name, syscall_table=None, arch=None):
+        """
+        <Purpose>
+          Loads the definitions of a file and builds their indexes.
+
+        <Arguments>
+          file_name:
+            A pickle or database file of definitions.
+
+          syscall_table:
+            The unistd header or syscall_*.tbl file to read the system call
+            numbers from. Defaults to the installed header of arch.
+
+          arch:
+            The architecture of the system call numbers. Defaults to the
+            architecture of this machine.
+
+        <Exceptions>
+          Any exception raised reading the file.
+
+        <Side Effects>
+          None
+
+        <Returns>
+          None
+        """
+
+        self.file_name = file_name
+        self.signature = get_file_signature(file_name)
+        self.syscall_manuals = read_definitions(file_name)
+
+        self.by_name = {}
+        for syscall_manual in self.syscall_manuals:
+            self.by_name.setdefault(syscall_manual.name, syscall_manual)
+
+        self.query = DefinitionsQuery.DefinitionsQuery(self.syscall_manuals)
+
+        self.number_error = None
+        try:
+            self.number_table = build_number_table(self.syscall_manuals,
+                                                   syscall_table, arch)
+        except IOError as error:
+            self.number_table = None
+            self.number_error = str(error)
+
+
+
+def get_file_signature(file_name):
+    """
+    Returns the (modification time, size, inode) of a file, or None if it does
+    not exist.
+    """
+
+    try:
+        status = os.stat(file_name)
+    except OSError:
+        return None
+
+    return (status.st_mtime, status.st_size, status.st_ino)
+
+
+
+def parse_predicate(specification):
+    """
+    <Purpose>
+      Builds a DefinitionsQuery predicate from its nested list form, eg
+      ["and", ["takes", "sockaddr", ["pointer"]], ["returns", "int"]]. See
+      sysDef/DefinitionsClient.py for the forms.
+
+    <Arguments>
+      specification:
+        The predicate as nested lists.
+
+    <Exceptions>
+      ValueError if the specification is malformed.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A Predicate.
+    """
+
+    if not isinstance(specification, list) or not specification:
+        raise ValueError("A predicate must be a non empty list.")
+
+    operator = specification[0]
+    operands = specification[1:]
+
+    if operator in ("and", "or") and operands:
+        predicates = [parse_predicate(operand) for operand in operands]
+        predicate = predicates[0]
+        for other in predicates[1:]:
+            if operator == "and":
+                predicate = predicate & other
+            else:
+                predicate = predicate | other
+        return predicate
+
+    if operator == "not" and len(operands) == 2:
+        return parse_predicate(operands[0]) - parse_predicate(operands[1])
+
+    if operator == "takes" and len(operands) in (1, 2):
+        flags = 0
+        for flag_name in (operands[1] if len(operands) == 2 else []):
+            flags |= _get_flag(flag_name)
+        return DefinitionsQuery.takes(operands[0], flags)
+
+    if operator == "flag" and len(operands) == 1:
+        return DefinitionsQuery.has_flag(_get_flag(operands[0]))
+
+    if operator == "args" and len(operands) == 1:
+        return DefinitionsQuery.arg_count(int(operands[0]))
+
+    if operator == "returns" and len(operands) == 1:
+        return DefinitionsQuery.returns(operands[0])
+
+    if operator == "all" and not operands:
+        return DefinitionsQuery.everything()
+
+    raise ValueError("Malformed predicate: " + repr(specification))
+
+
+
+def _get_flag(flag_name):
+    flag = DefinitionsQuery.FLAGS.get(flag_name)
+    if flag is None:
+        raise ValueError("Unknown flag: " + repr(flag_name))
+    return flag
+
+
+
+def _describe(syscall_manual):
+    # a SyscallManual as a message.
+    if syscall_manual is None:
+        return None
+
+    definition = syscall_manual.definition
+    return {"name": syscall_manual.name,
+            "type": SyscallManual.TYPE_NAMES.get(syscall_manual.type,
+                                                 str(syscall_manual.type)),
+            "definition": None if definition is None else repr(definition)}
+
+
+
+def get_percentiles(samples, percentiles=PERCENTILES):
+    """
+    Returns a dictionary from "p" followed by each percentile eg "p99", and
+    "max", to the nearest rank percentile of the given samples, or None if
+    there are none.
+    """
+
+    samples = sorted(samples)
+    result = {}
+    for percentile in percentiles:
+        if samples:
+            rank = max(0, (percentile * len(samples) + 99) // 100 - 1)
+            result["p" + str(percentile)] = samples[rank]
+        else:
+            result["p" + str(percentile)] = None
+
+    result["max"] = samples[-1] if samples else None
+
+    return result
+
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    # answers the requests of a connection until it is closed.
+
+    def handle(self):
+        while True:
+            try:
+                message = receive_frame(self.request)
+            except (ProtocolError, socket.error):
+                return
+
+            if message is None:
+                return
+
+            # whatever a request holds, it is answered and the connection
+            # kept.
+            start = time.time()
+            try:
+                response = {"ok": True, "result": self.server.answer(message)}
+            except Exception as error:
+                response = {"ok": False,
+                            "error": str(error) or error.__class__.__name__}
+
+            try:
+                send_frame(self.request, response)
+            except socket.error:
+                return
+
+            self.server.add_latency(time.time() - start)
+
+
+
+class DefinitionsServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    <Purpose>
+      Serves the definitions of a file over a Unix domain socket.
+
+    <Attributes>
+      definitions:
+        The LoadedDefinitions currently served. Replaced as a whole when the
+        file is loaded again.
+
+      reloads:
+        The number of times the file was loaded again.
+
+      reload_error:
+        Why the file last failed to load, or None.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, file_name, socket_path=None, syscall_table=None,
+                 arch=None, reload_interval=RELOAD_INTERVAL):
+        """
+        <Purpose>
+          Loads the definitions of a file and listens on a socket.
+
+        <Arguments>
+          file_name:
+            A pickle or database file of definitions.
+
+          socket_path:
+            The path of the socket. Defaults to the default socket of
+            sysDef/DefinitionsClient.py. A stale socket left by a server that
+            is not running is replaced.
+
+          syscall_table:
+            The unistd header or syscall_*.tbl file to read the system call
+            numbers from.
+
+          arch:
+            The architecture of the system call numbers. Defaults to the
+            architecture of this machine.
+
+          reload_interval:
+            How often, in seconds, the file is checked for changes. The file
+            is never checked if None.
+
+        <Exceptions>
+          Any exception raised reading the file.
+          socket.error if another server is listening on the socket.
+
+        <Side Effects>
+          Creates the socket, and starts a thread checking the file for
+          changes.
+
+        <Returns>
+          None
+        """
+
+        if socket_path is None:
+            socket_path = get_default_socket_path()
+
+        self._syscall_table = syscall_table
+        self._arch = arch
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._requests = 0
+        self._started = time.time()
+        self._stopped = threading.Event()
+
+        self.definitions = LoadedDefinitions(file_name, syscall_table, arch)
+        self.reloads = 0
+        self.reload_error = None
+
+        _remove_stale_socket(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+
+        if reload_interval is not None:
+            watcher = threading.Thread(target=self._watch, args=(reload_interval,))
+            watcher.daemon = True
+            watcher.start()
+
+
+    def answer(self, message):
+        """
+        <Purpose>
+          Answers a request.
+
+        <Arguments>
+          message:
+            The request, a dictionary with an "op" key.
+
+        <Exceptions>
+          ValueError, KeyError or TypeError if the request is malformed.
+
+        <Side Effects>
+          Loads the definitions file again for reload requests.
+
+        <Returns>
+          The result of the request.
+        """
+
+        # a single set of definitions answers the whole request.
+        definitions = self.definitions
+        op = message["op"]
+
+        if op == "name":
+            return _describe(definitions.by_name.get(message["name"]))
+
+        if op == "number":
+            if definitions.number_table is None:
+                raise ValueError("No system call numbers: " +
+                                 definitions.number_error)
+            number = message["number"]
+            if(not isinstance(number, numbers.Integral) or
+               isinstance(number, bool)):
+                raise ValueError("Not a system call number: " + repr(number))
+            return _describe(definitions.number_table.lookup(number))
+
+        if op == "query":
+            predicate = parse_predicate(message["predicate"])
+            return [_describe(syscall_manual)
+                    for syscall_manual in definitions.query.select(predicate)]
+
+        if op == "stats":
+            return self.get_stats()
+
+        if op == "reload":
+            self.reload(True)
+            return self.get_stats()
+
+        raise ValueError("Unknown op: " + repr(op))
+
+
+    def add_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+            self._requests += 1
+
+
+    def get_stats(self):
+        """
+        Returns a dictionary with the file served, the number of definitions,
+        requests and reloads and the latency percentiles, in microseconds, of
+        the last LATENCY_SAMPLES requests.
+        """
+
+        with self._lock:
+            latencies = list(self._latencies)
+            requests = self._requests
+
+        latency_usec = {}
+        for key, seconds in get_percentiles(latencies).items():
+            latency_usec[key] = None if seconds is None else seconds * 1000000.0
+
+        definitions = self.definitions
+        return {"file": definitions.file_name,
+                "definitions": len(definitions.syscall_manuals),
+                "numbers": definitions.number_table is not None,
+                "requests": requests,
+                "reloads": self.reloads,
+                "reload_error": self.reload_error,
+                "uptime_seconds": time.time() - self._started,
+                "latency_usec": latency_usec}
+
+
+    def reload(self, force=False):
+        """
+        <Purpose>
+          Loads the definitions file again if it changed, and replaces the
+          definitions served once it is fully loaded.
+
+        <Arguments>
+          force:
+            If True the file is loaded even if it did not change.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          Sets reload_error if the file fails to load, keeping the definitions
+          served.
+
+        <Returns>
+          True if the definitions were replaced.
+        """
+
+        file_name = self.definitions.file_name
+        if not force and get_file_signature(file_name) == self.definitions.signature:
+            return False
+
+        try:
+            definitions = LoadedDefinitions(file_name, self._syscall_table,
+                                            self._arch)
+        except Exception as error:
+            self.reload_error = str(error)
+            return False
+
+        self.definitions = definitions
+        self.reloads += 1
+        self.reload_error = None
+        return True
+
+
+    def _watch(self, reload_interval):
+        while not self._stopped.wait(reload_interval):
+            self.reload()
+
+
+    def server_close(self):
+        self._stopped.set()
+        socketserver.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+
+def _remove_stale_socket(socket_path):
+    # removes a socket no server listens on.
+    if not os.path.exists(socket_path):
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except socket.error:
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+
+    raise socket.error("A server is already listening on " + socket_path + ".")
+
+
+
+def main():
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="Serve system call " +
+                                     "definitions over a Unix domain socket.")
+    parser.add_argument("definitions", metavar="FILE",
+                        help="a pickle or database file of definitions.")
+    parser.add_argument("--socket", metavar="PATH", default=None,
+                        help="the socket to listen on. Defaults to " +
+                        get_default_socket_path() + ".")
+    parser.add_argument("--arch", default=None,
+                        help="the architecture of the system call numbers. " +
+                        "Defaults to the architecture of this machine.")
+    parser.add_argument("--syscall-table", metavar="PATH", default=None,
+                        help="the unistd header or syscall_*.tbl file to read " +
+                        "the numbers from.")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="how often, in seconds, the file is checked for " +
+                        "changes. Defaults to " + str(RELOAD_INTERVAL) + ".")
+    args = parser.parse_args()
+
+    server = DefinitionsServer(args.definitions, args.socket,
+                               args.syscall_table, args.arch,
+                               args.reload_interval)
+
+    # the socket is removed when the server is terminated.
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(0))
+
+    definitions = server.definitions
+    sys.stderr.write("Serving " + str(len(definitions.syscall_manuals)) +
+                     " definitions of " + args.definitions + " on " +
+                     server.server_address + "\n")
+    if definitions.number_table is None:
+        sys.stderr.write("No system call numbers: " + definitions.number_error +
+                         "\n")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
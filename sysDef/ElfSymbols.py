@@ -0,0 +1,689 @@
+"""
+<Purpose>
+  Read the symbols exported by a shared library, eg libc, from its ELF file
+  without loading it into the process.
+
+  Looking up names on a ctypes.CDLL performs a dlsym for each name and keeps a
+  function pointer on the CDLL object for every name found. Instead, the
+  shared object is mapped into memory and its dynamic symbol table is read
+  once, the same way the dynamic loader finds it:
+    - the PT_DYNAMIC segment gives the addresses of the dynamic symbol table
+      (.dynsym), its string table (.dynstr), the symbol hash table
+      (.gnu.hash or .hash) and the symbol version tables (.gnu.version,
+      .gnu.version_d).
+    - the number of symbols is not stored in the dynamic segment. It is found
+      by walking the last chain of .gnu.hash, or is the number of chains of
+      .hash.
+    - a symbol is exported if it is defined, global or weak, not hidden and
+      its version is not local. Symbols whose only versions are hidden, eg
+      compatibility versions kept for old binaries, cannot be found by dlsym
+      and are not exported. Neither are the absolute symbols naming the
+      versions of the library, eg GLIBC_2.2.5.
+
+  32 and 64 bit ELF files of either byte order are read. Section headers are
+  not used, so stripped shared objects are read as well.
+
+  Finding a library by name runs "ldconfig -p" once per lookup, and gcc or
+  ld are only run, through ctypes.util.find_library, for libraries that
+  ldconfig does not list. find_cached_library_path keeps the paths found in
+  a cache file, so later runs find them without running any program until
+  the ldconfig cache changes.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.ElfSymbols c
+
+  will print the number of symbols exported by libc, and running:
+    python -m sysDef.ElfSymbols c open chown32
+
+  will print the versions of open and chown32 in libc.
+
+"""
+
+import json
+import mmap
+import os
+import struct
+import subprocess
+import tempfile
+
+
+# values of the ELF file header.
+ELF_MAGIC = b"\x7fELF"
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+# program header types.
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+# dynamic section tags.
+DT_NULL = 0
+DT_HASH = 4
+DT_STRTAB = 5
+DT_SYMTAB = 6
+DT_STRSZ = 10
+DT_SYMENT = 11
+DT_GNU_HASH = 0x6ffffef5
+DT_VERSYM = 0x6ffffff0
+DT_VERDEF = 0x6ffffffc
+DT_VERDEFNUM = 0x6ffffffd
+
+# symbol bindings, types and visibilities.
+STB_GLOBAL = 1
+STB_WEAK = 2
+STB_GNU_UNIQUE = 10
+STT_FUNC = 2
+STT_GNU_IFUNC = 10
+STV_DEFAULT = 0
+STV_PROTECTED = 3
+SHN_UNDEF = 0
+SHN_ABS = 0xfff1
+
+# symbol version indexes.
+VER_NDX_LOCAL = 0
+VER_NDX_GLOBAL = 1
+VERSYM_HIDDEN = 0x8000
+VER_FLG_BASE = 1
+
+# the directories searched for a shared library when ldconfig does not know
+# it.
+LIBRARY_DIRECTORIES = ["/lib64", "/usr/lib64", "/lib", "/usr/lib",
+                       "/usr/local/lib"]
+
+# the file the paths of the libraries found are kept in across runs.
+LIBRARY_CACHE_FILE = os.path.join("~", ".cache", "parse-syscall-definitions",
+                                  "libraries.json")
+
+# the cache of ldconfig. The cached paths of libraries are found again when it
+# changes.
+LD_SO_CACHE = "/etc/ld.so.cache"
+
+# the paths of the libraries found by find_cached_library_path in this
+# process.
+_library_paths = {}
+
+# the formats of the ELF structures by their class: file header after
+# e_ident, program header, dynamic entry, symbol and the field names of the
+# symbol in the order of the format.
+_FORMATS = {
+    ELFCLASS32: ("HHIIIIIHHHHHH", "IIIIIIII", "iI", "IIIBBH",
+                 ("name", "value", "size", "info", "other", "shndx")),
+    ELFCLASS64: ("HHIQQQIHHHHHH", "IIQQQQQQ", "qQ", "IBBHQQ",
+                 ("name", "info", "other", "shndx", "value", "size")),
+}
+
+# symbol names as native strings.
+if bytes is str:
+    def _to_str(data):
+        return data
+else:
+    def _to_str(data):
+        return data.decode("latin-1")
+
+
+
+class ElfError(Exception):
+    """
+    Raised when a file is not an ELF shared object that can be read.
+    """
+
+
+
+def read_dynamic_symbols(library_path):
+    """
+    <Purpose>
+      Reads all the symbols defined in the dynamic symbol table of a shared
+      library, with their versions.
+
+    <Arguments>
+      library_path:
+        The path of the shared library, eg /lib/x86_64-linux-gnu/libc.so.6
+
+    <Exceptions>
+      ElfError if the file is not an ELF shared object with a dynamic symbol
+      table.
+      IOError or OSError if the file cannot be read.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A dictionary from each symbol name defined and visible outside the
+      library to a list of (version, hidden, function) tuples, one for each
+      version of the symbol. version is None for unversioned symbols, hidden
+      is True for versions dlsym cannot find and function is True for
+      functions.
+    """
+
+    library_file = open(library_path, "rb")
+    try:
+        size = os.fstat(library_file.fileno()).st_size
+        if size < 64:
+            raise ElfError(library_path + " is not an ELF file.")
+
+        data = mmap.mmap(library_file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        library_file.close()
+
+    try:
+        return _ElfReader(data, library_path).read_dynamic_symbols()
+    finally:
+        data.close()
+
+
+
+def get_exported_names(library_path):
+    """
+    Returns the set of the symbol names a dlsym on the given shared library
+    can find, ie with a version that is not hidden.
+    """
+
+    exported = set()
+    for name, versions in read_dynamic_symbols(library_path).items():
+        for version, hidden, function in versions:
+            if not hidden:
+                exported.add(name)
+                break
+
+    return exported
+
+
+
+class SharedLibrary(object):
+    """
+    <Purpose>
+      The symbols exported by a shared library, read once from its ELF file
+      without loading it.
+
+    <Attributes>
+      path:
+        The path of the shared library.
+
+      exported_names:
+        A frozenset of the names a dlsym on the library can find.
+
+    """
+
+    def __init__(self, name):
+        """
+        Reads the symbols of the shared library with the given name, eg "c",
+        "libc.so.6" or a path. Raises ElfError if no name is given or the
+        library is not found.
+        """
+
+        if name is None:
+            raise ElfError("No library name given.")
+
+        self.path = find_library_path(name)
+        if self.path is None:
+            raise ElfError("Library " + name + " not found.")
+
+        self.exported_names = frozenset(get_exported_names(self.path))
+
+
+    def __contains__(self, name):
+        return name in self.exported_names
+
+
+    def __repr__(self):
+        return "<SharedLibrary " + self.path + ">"
+
+
+
+def find_library_path(name):
+    """
+    <Purpose>
+      Finds the path of a shared library, without loading it.
+
+    <Arguments>
+      name:
+        A library name as given to ctypes.util.find_library, eg "c", a file
+        name, eg "libc.so.6", or a path.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      Runs ldconfig -p once, and only if ldconfig does not know the library,
+      the programs ctypes.util.find_library runs.
+
+    <Returns>
+      The path of the library, or None if it was not found. Only libraries of
+      the same word size as the running python are returned.
+    """
+
+    if os.path.isabs(name):
+        return name
+
+    # both the file name and the path come from the same ldconfig output.
+    libraries = _read_ldconfig_cache()
+
+    if ".so" not in name:
+        # same as ctypes.util.find_library, eg libc.so.6 for "c".
+        prefix = "lib" + name + ".so"
+        path = _choose_library_path([path for file_name, path in libraries
+                                     if file_name.startswith(prefix)])
+        if path is not None:
+            return path
+
+        # ctypes also looks for libraries with gcc and ld.
+        import ctypes.util
+
+        name = ctypes.util.find_library(name)
+        if name is None:
+            return None
+        if os.path.isabs(name):
+            return name
+
+    candidates = [path for file_name, path in libraries if file_name == name]
+    for directory in LIBRARY_DIRECTORIES:
+        candidates.append(os.path.join(directory, name))
+
+    return _choose_library_path(candidates)
+
+
+
+def _read_ldconfig_cache():
+    # the (file name, path) of every library in the ldconfig cache, eg
+    # "libc.so.6 (libc6,x86-64) => /lib/x86_64-linux-gnu/libc.so.6"
+    try:
+        ldconfig = subprocess.Popen(["ldconfig", "-p"], stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE,
+                                    universal_newlines=True)
+        output = ldconfig.communicate()[0]
+    except OSError:
+        output = ""
+
+    libraries = []
+    for line in output.splitlines():
+        parts = line.split(" => ", 1)
+        if len(parts) == 2:
+            libraries.append((parts[0].split(" (")[0].strip(), parts[1].strip()))
+
+    return libraries
+
+
+
+def _choose_library_path(candidates):
+    # the first candidate of the same word size as the running python.
+    word_size = ELFCLASS64 if struct.calcsize("P") == 8 else ELFCLASS32
+    for path in candidates:
+        if _get_elf_class(path) == word_size:
+            return path
+
+    return None
+
+
+
+def _get_elf_class(path):
+    # the class of an ELF file, or None if it is not one.
+    try:
+        elf_file = open(path, "rb")
+    except (IOError, OSError):
+        return None
+
+    try:
+        ident = elf_file.read(5)
+    finally:
+        elf_file.close()
+
+    if len(ident) != 5 or ident[:4] != ELF_MAGIC:
+        return None
+
+    return bytearray(ident)[4]
+
+
+
+class _ElfReader(object):
+    """
+    Reads the dynamic symbol table of a mapped ELF file.
+    """
+
+    def __init__(self, data, path):
+        self.data = data
+        self.path = path
+
+        ident = bytearray(data[:16])
+        if data[:4] != ELF_MAGIC or ident[4] not in _FORMATS or \
+           ident[5] not in (ELFDATA2LSB, ELFDATA2MSB):
+            raise ElfError(path + " is not an ELF file.")
+
+        self.elf_class = ident[4]
+        self.byte_order = "<" if ident[5] == ELFDATA2LSB else ">"
+        self.word_size = 8 if self.elf_class == ELFCLASS64 else 4
+
+        (header_format, program_format, dynamic_format, symbol_format,
+         self.symbol_fields) = _FORMATS[self.elf_class]
+        self.header = self._struct(header_format)
+        self.program_header = self._struct(program_format)
+        self.dynamic_entry = self._struct(dynamic_format)
+        self.symbol = self._struct(symbol_format)
+
+
+    def _struct(self, fields):
+        return struct.Struct(self.byte_order + fields)
+
+
+    def _unpack(self, structure, offset):
+        if offset < 0 or offset + structure.size > len(self.data):
+            raise ElfError(self.path + " is truncated.")
+
+        return structure.unpack_from(self.data, offset)
+
+
+    def _get_segments(self):
+        # the (type, offset, address, file size) of every program header.
+        header = self._unpack(self.header, 16)
+        phoff, phentsize, phnum = header[4], header[8], header[9]
+
+        segments = []
+        for index in range(phnum):
+            fields = self._unpack(self.program_header, phoff + index * phentsize)
+            if self.elf_class == ELFCLASS64:
+                p_type, p_flags, p_offset, p_vaddr, p_paddr, p_filesz = fields[:6]
+            else:
+                p_type, p_offset, p_vaddr, p_paddr, p_filesz = fields[:5]
+            segments.append((p_type, p_offset, p_vaddr, p_filesz))
+
+        return segments
+
+
+    def _to_offset(self, address):
+        # addresses in the dynamic segment are virtual addresses of loaded
+        # segments.
+        for p_type, p_offset, p_vaddr, p_filesz in self.loads:
+            if p_vaddr <= address < p_vaddr + p_filesz:
+                return address - p_vaddr + p_offset
+
+        raise ElfError(self.path + ": address " + hex(address) +
+                       " is not in a loaded segment.")
+
+
+    def _get_dynamic(self):
+        # the dynamic entries as a dictionary from their tag to their value.
+        for p_type, p_offset, p_vaddr, p_filesz in self.segments:
+            if p_type == PT_DYNAMIC:
+                break
+        else:
+            raise ElfError(self.path + " has no dynamic segment.")
+
+        dynamic = {}
+        for offset in range(p_offset, p_offset + p_filesz,
+                            self.dynamic_entry.size):
+            tag, value = self._unpack(self.dynamic_entry, offset)
+            if tag == DT_NULL:
+                break
+            dynamic.setdefault(tag, value)
+
+        return dynamic
+
+
+    def _get_string(self, offset):
+        start = self.strtab + offset
+        end = self.data.find(b"\0", start, self.strtab_end)
+        if end < 0:
+            raise ElfError(self.path + ": unterminated string.")
+
+        return _to_str(self.data[start:end])
+
+
+    def _count_symbols(self, dynamic):
+        # the number of symbols is the number of chains of the .hash table.
+        if DT_HASH in dynamic:
+            return self._unpack(self._struct("II"),
+                                self._to_offset(dynamic[DT_HASH]))[1]
+
+        if DT_GNU_HASH not in dynamic:
+            raise ElfError(self.path + " has no symbol hash table.")
+
+        # the symbols of .gnu.hash are sorted by bucket. The last symbol is at
+        # the end of the chain of the highest bucket, marked by its lowest bit.
+        offset = self._to_offset(dynamic[DT_GNU_HASH])
+        nbuckets, symoffset, bloom_size, bloom_shift = \
+            self._unpack(self._struct("4I"), offset)
+        buckets_offset = offset + 16 + bloom_size * self.word_size
+        buckets = self._unpack(self._struct(str(nbuckets) + "I"), buckets_offset)
+
+        last_symbol = max(buckets) if nbuckets else 0
+        if last_symbol < symoffset:
+            return symoffset
+
+        chain = self._struct("I")
+        chains_offset = buckets_offset + nbuckets * 4
+        while not self._unpack(chain, chains_offset +
+                               (last_symbol - symoffset) * 4)[0] & 1:
+            last_symbol += 1
+
+        return last_symbol + 1
+
+
+    def _get_version_names(self, dynamic):
+        # the names of the versions defined by the library by their index.
+        # The base version is the name of the library itself.
+        version_names = {}
+        if DT_VERDEF not in dynamic:
+            return version_names
+
+        verdef = self._struct("HHHHIII")
+        verdaux = self._struct("II")
+        offset = self._to_offset(dynamic[DT_VERDEF])
+        for index in range(dynamic.get(DT_VERDEFNUM, 0)):
+            vd_version, vd_flags, vd_ndx, vd_cnt, vd_hash, vd_aux, vd_next = \
+                self._unpack(verdef, offset)
+            if vd_cnt and not vd_flags & VER_FLG_BASE:
+                vda_name = self._unpack(verdaux, offset + vd_aux)[0]
+                version_names[vd_ndx] = self._get_string(vda_name)
+
+            if vd_next == 0:
+                break
+            offset += vd_next
+
+        return version_names
+
+
+    def read_dynamic_symbols(self):
+        self.segments = self._get_segments()
+        self.loads = [segment for segment in self.segments
+                      if segment[0] == PT_LOAD]
+        dynamic = self._get_dynamic()
+
+        if DT_SYMTAB not in dynamic or DT_STRTAB not in dynamic:
+            raise ElfError(self.path + " has no dynamic symbol table.")
+
+        self.strtab = self._to_offset(dynamic[DT_STRTAB])
+        self.strtab_end = min(self.strtab + dynamic.get(DT_STRSZ, len(self.data)),
+                              len(self.data))
+        symtab = self._to_offset(dynamic[DT_SYMTAB])
+        syment = dynamic.get(DT_SYMENT, self.symbol.size)
+        count = self._count_symbols(dynamic)
+        version_names = self._get_version_names(dynamic)
+
+        if DT_VERSYM in dynamic:
+            versym_offset = self._to_offset(dynamic[DT_VERSYM])
+            versyms = self._unpack(self._struct(str(count) + "H"), versym_offset)
+        else:
+            versyms = (VER_NDX_GLOBAL,) * count
+
+        name_field = self.symbol_fields.index("name")
+        info_field = self.symbol_fields.index("info")
+        other_field = self.symbol_fields.index("other")
+        shndx_field = self.symbol_fields.index("shndx")
+
+        symbols = {}
+        # the first symbol is always the undefined symbol.
+        for index in range(1, count):
+            fields = self._unpack(self.symbol, symtab + index * syment)
+            if fields[shndx_field] == SHN_UNDEF:
+                continue
+
+            binding = fields[info_field] >> 4
+            if binding not in (STB_GLOBAL, STB_WEAK, STB_GNU_UNIQUE):
+                continue
+
+            if fields[other_field] & 3 not in (STV_DEFAULT, STV_PROTECTED):
+                continue
+
+            version_index = versyms[index] & ~VERSYM_HIDDEN
+            if version_index == VER_NDX_LOCAL:
+                continue
+
+            name = self._get_string(fields[name_field])
+            if fields[shndx_field] == SHN_ABS and \
+               version_names.get(version_index) == name:
+                continue
+
+            symbol_type = fields[info_field] & 0xf
+            symbols.setdefault(name, []).append(
+                (version_names.get(version_index),
+                 (versyms[index] & VERSYM_HIDDEN) != 0,
+                 symbol_type in (STT_FUNC, STT_GNU_IFUNC)))
+
+        return symbols
+
+
+
+def find_cached_library_path(name, cache_file=LIBRARY_CACHE_FILE):
+    """
+    <Purpose>
+      Finds the path of a shared library once, see find_library_path, and
+      keeps it in a cache file for later runs. A cached path is used as long
+      as the file exists and the ldconfig cache has not changed.
+
+    <Arguments>
+      name:
+        A library name as given to ctypes.util.find_library, eg "c", a file
+        name, eg "libc.so.6", or a path.
+
+      cache_file:
+        The cache file. If None paths are only cached in this process.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      Runs the programs find_library_path runs if the path is not cached, and
+      writes the cache file. Failing to write it is ignored.
+
+    <Returns>
+      The path of the library, or None if it was not found.
+    """
+
+    # paths are cached for the word size of the running python.
+    key = name + "@" + str(struct.calcsize("P") * 8)
+    path = _library_paths.get(key)
+    if path is not None:
+        return path
+
+    signature = _get_file_signature(LD_SO_CACHE)
+    cache = {"ld_so_cache": signature, "paths": {}}
+    if cache_file is not None:
+        cache_file = os.path.expanduser(cache_file)
+        stored = _read_library_cache(cache_file)
+        if stored is not None and stored.get("ld_so_cache") == signature:
+            cache = stored
+            path = cache["paths"].get(key)
+            if path is not None and os.path.isfile(path):
+                path = str(path)
+                _library_paths[key] = path
+                return path
+
+    path = find_library_path(name)
+    if path is None:
+        return None
+
+    _library_paths[key] = path
+    if cache_file is not None:
+        cache["paths"][key] = path
+        _write_library_cache(cache_file, cache)
+
+    return path
+
+
+
+def _get_file_signature(path):
+    # the [modification time, size] of a file, or None.
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None
+
+    return [status.st_mtime, status.st_size]
+
+
+
+def _read_library_cache(cache_file):
+    try:
+        cache_file_object = open(cache_file)
+    except (IOError, OSError):
+        return None
+
+    try:
+        cache = json.load(cache_file_object)
+    except ValueError:
+        return None
+    finally:
+        cache_file_object.close()
+
+    if not isinstance(cache, dict) or not isinstance(cache.get("paths"), dict):
+        return None
+
+    return cache
+
+
+
+def _write_library_cache(cache_file, cache):
+    # the cache is written to a temporary file which then replaces it, so
+    # processes reading it never see it half written.
+    directory = os.path.dirname(cache_file)
+    try:
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        descriptor, temporary_name = tempfile.mkstemp(dir=directory or ".")
+        try:
+            with os.fdopen(descriptor, "w") as temporary_file:
+                json.dump(cache, temporary_file)
+            os.rename(temporary_name, cache_file)
+        except Exception:
+            os.unlink(temporary_name)
+            raise
+    except (IOError, OSError):
+        pass
+
+
+
+def main():
+    import sys
+
+    if(len(sys.argv) < 2):
+        print("Usage: python -m sysDef.ElfSymbols <library> [symbol_name]...")
+        exit()
+
+    library_path = find_library_path(sys.argv[1])
+    if library_path is None:
+        print("Library " + sys.argv[1] + " not found.")
+        exit()
+
+    symbols = read_dynamic_symbols(library_path)
+
+    if(len(sys.argv) == 2):
+        print(library_path + ": " + str(len(get_exported_names(library_path))) +
+              " exported symbols, " + str(len(symbols)) + " defined symbols.")
+        return
+
+    for name in sys.argv[2:]:
+        versions = []
+        for version, hidden, function in symbols.get(name, []):
+            versions.append((version or "") + (" (hidden)" if hidden else ""))
+
+        if versions:
+            print(name + ": " + ", ".join(versions))
+        else:
+            print(name + " not found in " + library_path + ".")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+<Purpose>
+  Collect figures about a run, to find out why it is slow:
+    - the wall and CPU time of each stage eg reading the names of the system
+      calls or parsing their definitions,
+    - the time taken to fetch and to parse each man page, and so the latency
+      of every system call sharing it,
+    - the number of man subprocesses spawned, the bytes of the man pages
+      read to be parsed, the bytes read to group system call names by man
+      page, which RoffSource parses without reading them again, and the hits
+      and misses of the man page cache,
+    - the number of system calls of each type eg FOUND or NO_MAN_ENTRY.
+
+  Instrumentation is disabled by default, and then every instrumented point
+  costs a single function call. It is enabled with a Stats object collecting
+  the figures, which are then available as a JSON document:
+
+    stats = enable()
+    syscall_definitions_list = get_syscall_definitions_list(syscall_names_list)
+    disable()
+    print(json.dumps(stats.get_document()))
+
+  Hooks added to a Stats object are called with every stage and man page as
+  soon as it completes, eg to report progress.
+
+"""
+
+import json
+import os
+import threading
+import time
+
+
+# the counters of a Stats object.
+COUNTERS = ["man_processes", "bytes_read", "grouping_bytes_read", "cache_hits",
+            "cache_misses"]
+
+# default number of the slowest man pages reported.
+TOP_PAGES = 10
+
+# the Stats object of the current run, or None if instrumentation is disabled.
+_stats = None
+
+
+
+class Stats(object):
+    """
+    <Purpose>
+      The figures collected during a run.
+
+    <Attributes>
+      stages:
+        A dictionary from the name of each stage to a dictionary with its
+        wall_seconds, cpu_seconds and children_cpu_seconds, the CPU time of
+        waited for subprocesses eg man.
+
+      counts:
+        A dictionary from each of COUNTERS to its value.
+
+      pages:
+        A list with a dictionary for each man page read: its page (the name it
+        was read through), names (all the system calls sharing it),
+        fetch_seconds and parse_seconds.
+
+      types:
+        A dictionary from the name of each type of SyscallManual to the number
+        of system calls of that type.
+
+      hooks:
+        A list of functions called with ("stage", stage dictionary) or
+        ("page", page dictionary) whenever a stage or a page completes.
+
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.pages = []
+        self.types = dict.fromkeys(_get_type_names().values(), 0)
+        self.hooks = []
+
+        # pages are added by the threads of a pool.
+        self._lock = threading.Lock()
+
+
+    def add_hook(self, hook):
+        """
+        Adds a function called as hook(kind, record) with every stage and page
+        completed.
+        """
+
+        self.hooks.append(hook)
+
+
+    def count(self, name, amount=1):
+        """
+        Adds amount to the counter with the given name.
+        """
+
+        with self._lock:
+            self.counts[name] += amount
+
+
+    def merge_counts(self, counts):
+        """
+        Adds the given counters, eg counted by a worker process, to the counters.
+        """
+
+        with self._lock:
+            for name, amount in counts.items():
+                self.counts[name] += amount
+
+
+    def stage(self, name):
+        """
+        Returns a context manager timing the stage with the given name. The
+        times of stages run more than once are added up.
+        """
+
+        return _StageTimer(self, name)
+
+
+    def add_stage(self, name, wall_seconds, cpu_seconds, children_cpu_seconds):
+        """
+        Adds the times of a run of the stage with the given name.
+        """
+
+        with self._lock:
+            stage = self.stages.setdefault(name, {"name": name,
+                                                  "wall_seconds": 0.0,
+                                                  "cpu_seconds": 0.0,
+                                                  "children_cpu_seconds": 0.0})
+            stage["wall_seconds"] += wall_seconds
+            stage["cpu_seconds"] += cpu_seconds
+            stage["children_cpu_seconds"] += children_cpu_seconds
+
+        self._call_hooks("stage", stage)
+
+
+    def add_page(self, page):
+        """
+        Adds the dictionary of a man page read, see the pages attribute.
+        """
+
+        with self._lock:
+            self.pages.append(page)
+
+        self._call_hooks("page", page)
+
+
+    def add_syscall_manuals(self, syscall_manuals):
+        """
+        Counts the types of the given SyscallManual objects.
+        """
+
+        type_names = _get_type_names()
+
+        with self._lock:
+            for syscall_manual in syscall_manuals:
+                self.types[type_names[syscall_manual.type]] += 1
+
+
+    def _call_hooks(self, kind, record):
+        for hook in self.hooks:
+            hook(kind, record)
+
+
+    def get_slowest_pages(self, top=TOP_PAGES):
+        """
+        Returns the dictionaries of the top man pages taking the longest to
+        fetch and parse, slowest first.
+        """
+
+        with self._lock:
+            pages = list(self.pages)
+
+        pages.sort(key=lambda page: page["fetch_seconds"] + page["parse_seconds"],
+                   reverse=True)
+        return pages[:top]
+
+
+    def get_document(self, top=TOP_PAGES):
+        """
+        <Purpose>
+          Returns all the figures as a dictionary that can be stored as JSON.
+
+        <Arguments>
+          top:
+            The number of the slowest man pages reported.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          A dictionary with the stages, counts, types, the number of pages,
+          the fetch and parse latency of each system call by its name, and the
+          slowest pages.
+        """
+
+        with self._lock:
+            pages = list(self.pages)
+
+        # the system calls sharing a page share the time taken to read it.
+        syscalls = {}
+        for page in pages:
+            for name in page["names"]:
+                syscalls[name] = {"page": page["page"],
+                                  "fetch_seconds": page["fetch_seconds"],
+                                  "parse_seconds": page["parse_seconds"]}
+
+        return {
+            "stages": self.stages,
+            "counts": self.counts,
+            "types": self.types,
+            "pages": len(pages),
+            "syscalls": syscalls,
+            "slowest_pages": self.get_slowest_pages(top),
+        }
+
+
+    def write(self, file_name, top=TOP_PAGES):
+        """
+        Writes the document of get_document to a JSON file.
+        """
+
+        stats_file = open(file_name, "w")
+        try:
+            json.dump(self.get_document(top), stats_file, indent=2,
+                      sort_keys=True, separators=(",", ": "))
+            stats_file.write("\n")
+        finally:
+            stats_file.close()
+
+
+
+class _StageTimer(object):
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+
+    def __enter__(self):
+        self.start = time.time()
+        self.start_times = os.times()
+        return self
+
+
+    def __exit__(self, exception_type, exception, traceback):
+        times = os.times()
+        self.stats.add_stage(self.name, time.time() - self.start,
+                             (times[0] + times[1]) -
+                             (self.start_times[0] + self.start_times[1]),
+                             (times[2] + times[3]) -
+                             (self.start_times[2] + self.start_times[3]))
+        return False
+
+
+
+class _NoStage(object):
+    # the stage of a disabled instrumentation.
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+_NO_STAGE = _NoStage()
+
+
+
+def _get_type_names():
+    # SyscallManual is instrumented itself, so it is imported once needed.
+    from sysDef.SyscallManual import SyscallManual
+
+    return SyscallManual.TYPE_NAMES
+
+
+
+def enable(stats=None):
+    """
+    Enables instrumentation in this process, collecting the figures into the
+    given Stats object or a new one, which is returned.
+    """
+
+    global _stats
+
+    if stats is None:
+        stats = Stats()
+
+    _stats = stats
+    return stats
+
+
+
+def disable():
+    """
+    Disables instrumentation in this process.
+    """
+
+    global _stats
+    _stats = None
+
+
+
+def get_stats():
+    """
+    Returns the Stats object collecting the figures, or None if
+    instrumentation is disabled.
+    """
+
+    return _stats
+
+
+
+def count(name, amount=1):
+    """
+    Adds amount to the counter with the given name, eg "man_processes", if
+    instrumentation is enabled.
+    """
+
+    if _stats is not None:
+        _stats.count(name, amount)
+
+
+
+def stage(name):
+    """
+    Returns a context manager timing the stage with the given name if
+    instrumentation is enabled, or doing nothing otherwise.
+    """
+
+    if _stats is None:
+        return _NO_STAGE
+
+    return _stats.stage(name)
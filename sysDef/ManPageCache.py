@@ -0,0 +1,417 @@
+"""
+<Purpose>
+  A persistent on-disk cache of man page text.
+
+  Rendering a man page is by far the most expensive part of parsing a system
+  call definition. A ManPageCache wraps a function that reads man pages, such as
+  SyscallManual.read_man_page, and stores the text it returns in a cache
+  directory so that subsequent runs do not need to invoke man at all.
+
+  Entries are keyed by:
+    - the identity of the man page given by the source it is read from, eg the
+      real path of the roff file, its modification time and size, or the
+      directory or archive of a DirectorySource or ArchiveSource along with
+      the page file (see ManPageSource.get_page_identity),
+    - the man, groff and nroff executables (path, modification time and size),
+    - the locale settings which affect the rendering of man pages,
+    - the function used to read the man page.
+  so an entry is never used if the man page or the tools rendering it changed.
+  Looking up an entry does not spawn any subprocess. Pages of sources which
+  cannot identify them, eg a DictSource, are never cached.
+
+  By default only the SYNOPSIS section of each page is stored, which is all
+  SyscallManual needs.
+
+  The cache directory can be shared by several processes at once. Entries are
+  written to a temporary file which is then atomically renamed into place, and
+  the least recently used entries are removed once the cache grows larger than
+  its size limit.
+
+  Example:
+
+    read_man_page = ManPageCache("~/.cache/parse-syscall-definitions")
+    syscall_manual = SyscallManual("open", read_man_page("open"))
+
+"""
+
+import errno
+import hashlib
+import os
+import tempfile
+
+from sysDef import Instrumentation
+from sysDef.ManPageSource import get_source_page_identity
+from sysDef.ManPageSource import group_by_source_page
+from sysDef.RoffManual import get_file_identity
+from sysDef.SyscallManual import extract_synopsis
+from sysDef.SyscallManual import read_man_page as read_man_page_with_man
+
+
+# default size limit of the cache directory in bytes.
+MAX_SIZE = 32 * 1024 * 1024
+
+# executables which take part in rendering man pages.
+_TOOLS = ["man", "groff", "nroff"]
+
+# environment variables which affect the rendering of man pages.
+_ENVIRONMENT = ["LANG", "LC_ALL", "LC_CTYPE", "LC_MESSAGES", "MANWIDTH",
+                "MANPATH", "MANOPT"]
+
+
+
+class ManPageCache:
+    """
+    <Purpose>
+      A ManPageCache is a function that returns the text of the man page of a
+      system call, reading it through read_man_page only if it is not already
+      in the cache directory.
+
+    <Attributes>
+      cache_directory:
+        The directory holding the cached entries.
+
+      max_size:
+        The size limit of the cache directory in bytes.
+
+      read_man_page:
+        The function used to read man pages which are not in the cache.
+
+      section:
+        The man section of the pages read by read_man_page.
+
+      synopsis_only:
+        Whether only the SYNOPSIS section of each page is stored.
+
+      hits, misses:
+        The number of lookups found and not found in the cache.
+
+    """
+
+    def __init__(self, cache_directory, max_size=MAX_SIZE, read_man_page=None,
+                 section="2", synopsis_only=True):
+        """
+        <Purpose>
+          Creates a ManPageCache object.
+
+        <Arguments>
+          cache_directory:
+            The directory to store the entries in. Created if it does not exist.
+
+          max_size:
+            The size limit of the cache directory in bytes.
+
+          read_man_page:
+            The function used to read man pages which are not in the cache.
+            Defaults to reading man pages using man. It must return an empty
+            string if no man entry exists.
+
+          section:
+            The man section of the pages read by read_man_page.
+
+          synopsis_only:
+            If True only the part of each man page from the SYNOPSIS line up to
+            the DESCRIPTION line is stored and returned.
+
+        <Exceptions>
+          OSError if the cache directory cannot be created.
+
+        <Side Effects>
+          Creates the cache directory.
+
+        <Returns>
+          None
+        """
+
+        if read_man_page is None:
+            read_man_page = read_man_page_with_man
+
+        self.cache_directory = os.path.abspath(os.path.expanduser(cache_directory))
+        self.max_size = max_size
+        self.read_man_page = read_man_page
+        self.section = section
+        self.synopsis_only = synopsis_only
+        self.hits = 0
+        self.misses = 0
+
+        # the part of the keys shared by all entries, computed on first use.
+        self._key_prefix = None
+
+        # an estimate of the size of the cache directory, kept up to date with
+        # the entries written by this object.
+        self._size = None
+
+        _make_directory(self.cache_directory)
+
+
+    def __call__(self, page_name):
+        """
+        <Purpose>
+          Returns the text of the man page with the given name.
+
+        <Arguments>
+          page_name:
+            The name of the man page eg the name of a system call.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          Stores the man page in the cache directory if it was not already there.
+
+        <Returns>
+          The text of the man page, or an empty string if no man entry exists.
+        """
+
+        entry_path = self._get_entry_path(page_name)
+        if entry_path is None:
+            return self._read_man_page(page_name)
+
+        man_page = self._read_entry(entry_path)
+        if man_page is not None:
+            self.hits += 1
+            Instrumentation.count("cache_hits")
+            return man_page
+
+        self.misses += 1
+        Instrumentation.count("cache_misses")
+
+        man_page = self._read_man_page(page_name)
+        self._write_entry(entry_path, man_page)
+
+        return man_page
+
+
+    def get_page_identity(self, page_name):
+        """
+        Identifies the man page with the given name as the source read by
+        read_man_page does. See ManPageSource.get_page_identity.
+        """
+
+        return get_source_page_identity(self.read_man_page, page_name,
+                                        self.section)
+
+
+    def group(self, page_names_list):
+        """
+        Groups the given names by the man page they resolve to, as the source
+        read by read_man_page does. See ManPageSource.group.
+        """
+
+        return group_by_source_page(self.read_man_page, page_names_list,
+                                    self.section)
+
+
+    def _read_man_page(self, page_name):
+        man_page = self.read_man_page(page_name)
+        if self.synopsis_only:
+            man_page = extract_synopsis(man_page)
+
+        return man_page
+
+
+    def __getstate__(self):
+        # the size estimate is only valid within this process.
+        state = self.__dict__.copy()
+        state["_size"] = None
+        return state
+
+
+    def _get_entry_path(self, page_name):
+        # the key of an entry identifies the man page file and everything used
+        # to render it. The entry is stored under the hash of the key, or not
+        # at all if the source cannot identify the man page.
+        page_identity = self.get_page_identity(page_name)
+        if page_identity is None:
+            return None
+
+        if self._key_prefix is None:
+            self._key_prefix = _get_key_prefix(self.read_man_page, self.section,
+                                               self.synopsis_only)
+
+        key = self._key_prefix + "\n" + page_identity
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+        return os.path.join(self.cache_directory, digest[:2], digest)
+
+
+    def _read_entry(self, entry_path):
+        try:
+            entry_file = open(entry_path, "rb")
+        except IOError:
+            return None
+
+        try:
+            entry_bytestring = entry_file.read()
+        finally:
+            entry_file.close()
+
+        Instrumentation.count("bytes_read", len(entry_bytestring))
+        man_page = entry_bytestring.decode("utf-8")
+
+        # mark the entry as recently used.
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+
+        return man_page
+
+
+    def _write_entry(self, entry_path, man_page):
+        entry_directory = os.path.dirname(entry_path)
+        _make_directory(entry_directory)
+
+        # write into a temporary file first and then rename it, so that other
+        # processes never see a partially written entry.
+        data = man_page.encode("utf-8")
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=entry_directory,
+                                                           prefix=".tmp")
+        try:
+            os.write(file_descriptor, data)
+        finally:
+            os.close(file_descriptor)
+
+        os.rename(temporary_path, entry_path)
+
+        if self._size is None:
+            self._size = self.get_size()
+        else:
+            self._size += len(data)
+
+        if self._size > self.max_size:
+            self.evict()
+
+
+    def get_size(self):
+        """
+        Returns the total size of the entries in the cache directory.
+        """
+
+        size = 0
+        for entry_path, entry_size, entry_mtime in self._list_entries():
+            size += entry_size
+
+        return size
+
+
+    def evict(self):
+        """
+        <Purpose>
+          Removes the least recently used entries until the cache directory is
+          within its size limit.
+
+        <Arguments>
+          None
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          Removes entries from the cache directory.
+
+        <Returns>
+          None
+        """
+
+        entries = self._list_entries()
+        size = sum([entry_size for entry_path, entry_size, entry_mtime in entries])
+
+        # oldest entries first.
+        entries.sort(key=lambda entry: entry[2])
+        for entry_path, entry_size, entry_mtime in entries:
+            if size <= self.max_size:
+                break
+
+            # another process might have removed the entry already.
+            try:
+                os.remove(entry_path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+            size -= entry_size
+
+        self._size = size
+
+
+    def clear(self):
+        """
+        Removes all entries from the cache directory.
+        """
+
+        for entry_path, entry_size, entry_mtime in self._list_entries():
+            try:
+                os.remove(entry_path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+        self._size = 0
+
+
+    def _list_entries(self):
+        # list the (path, size, mtime) of all entries in the cache directory.
+        entries = []
+        for subdirectory in os.listdir(self.cache_directory):
+            subdirectory_path = os.path.join(self.cache_directory, subdirectory)
+            if not os.path.isdir(subdirectory_path):
+                continue
+
+            for entry_name in os.listdir(subdirectory_path):
+                if entry_name.startswith(".tmp"):
+                    continue
+
+                entry_path = os.path.join(subdirectory_path, entry_name)
+                try:
+                    entry_stat = os.stat(entry_path)
+                except OSError:
+                    continue
+
+                entries.append((entry_path, entry_stat.st_size, entry_stat.st_mtime))
+
+        return entries
+
+
+
+def _get_key_prefix(read_man_page, section, synopsis_only):
+    # identify everything, apart from the man page itself, that affects the
+    # text stored in an entry.
+    key_parts = [
+      getattr(read_man_page, "__module__", "") + "." +
+      getattr(read_man_page, "__name__", type(read_man_page).__name__),
+      section,
+      str(synopsis_only)
+    ]
+
+    # methods of different sources, eg RoffSource().read_page, share their
+    # module and name.
+    owner = getattr(read_man_page, "__self__", None)
+    if owner is not None:
+        key_parts.append(type(owner).__name__)
+
+    for variable in _ENVIRONMENT:
+        key_parts.append(variable + "=" + os.environ.get(variable, ""))
+
+    for tool in _TOOLS:
+        key_parts.append(tool + "=" + get_file_identity(_find_executable(tool)))
+
+    return "\n".join(key_parts)
+
+
+
+def _find_executable(name):
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return os.path.realpath(path)
+
+    return None
+
+
+
+def _make_directory(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
@@ -0,0 +1,615 @@
+"""
+<Purpose>
+  Sources of man page text.
+
+  A ManPageSource is a function that returns the text of the man page of a
+  system call up to its DESCRIPTION line, same as SyscallManual.read_man_page,
+  so it can be given wherever a read_man_page function is expected, eg to
+  get_syscall_definitions_list or ManPageCache. Its read_page method returns
+  the whole text of a man page, eg of the syscalls man page whose list of
+  system call names comes after the DESCRIPTION line.
+
+  The sources are:
+    - ManCommandSource: runs man, which depends on the man, groff and locale
+      of the system.
+    - RoffSource: renders the roff source files of the man pages (see
+      sysDef/RoffManual.py).
+    - DirectorySource: a directory with a file of pre-rendered text for each
+      man page, named after the page.
+    - ArchiveSource: a tar or zip archive with the same files, eg a snapshot
+      written by write_archive.
+    - DictSource: a dictionary from page names to their text.
+
+  The last three do not depend on the system at all, so runs using them are
+  deterministic and the parser can be measured without any subprocess.
+
+  Each source also identifies its man pages without reading them, eg by the
+  directory or archive they are read from along with the page file, which
+  ManPageCache keys its entries on, and groups the system call names sharing
+  a man page so that each page is read and parsed once.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.ManPageSource snapshot man_pages.tar.gz
+
+  will read the syscalls man page and the man pages of all system calls using
+  man and store them in the man_pages.tar.gz archive. Then running:
+    python parse_syscall_definitions.py --source man_pages.tar.gz
+
+  will parse the definitions from the archive instead of using man.
+
+"""
+
+import io
+import os
+import signal
+import subprocess
+import tarfile
+import time
+import zipfile
+
+from sysDef import Instrumentation
+from sysDef.RoffManual import get_file_identity
+from sysDef.RoffManual import get_page_identity
+from sysDef.RoffManual import group_by_man_page
+from sysDef.RoffManual import read_roff_man_page
+from sysDef.RoffManual import render_roff
+from sysDef.RoffManual import resolve_man_page
+from sysDef.SyscallManual import extract_synopsis
+from sysDef.SyscallManual import parse_syscall_names_list
+from sysDef.SyscallManual import read_man_page as read_man_page_with_man
+
+
+# the extension of the files holding rendered man pages, if any.
+_EXTENSIONS = ["", ".txt"]
+
+
+
+class ManPageSource(object):
+    """
+    <Purpose>
+      The interface of man page sources. Subclasses implement read_page.
+
+    <Attributes>
+      section:
+        The man section of the pages.
+
+    """
+
+    section = "2"
+
+
+    def __call__(self, syscall_name):
+        """
+        <Purpose>
+          Returns the text of the man page of a system call from its SYNOPSIS
+          line up to its DESCRIPTION line.
+
+          Same as SyscallManual.read_man_page, system calls ending with 32 or 64
+          without a man page of their own get the man page of the name without
+          the number eg chown32 gets the man page of chown.
+
+        <Arguments>
+          syscall_name:
+            The name of the system call.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          The text of the man page, or an empty string if no man entry exists.
+        """
+
+        man_page = self.read_page(syscall_name)
+
+        if(man_page == "" and
+           (syscall_name.endswith("32") or syscall_name.endswith("64"))):
+            man_page = self.read_page(syscall_name[:-2])
+
+        return extract_synopsis(man_page)
+
+
+    def read_page(self, page_name):
+        """
+        Returns the whole text of the man page with the given name, or an empty
+        string if there is no such page.
+        """
+
+        raise NotImplementedError
+
+
+    def get_page_identity(self, page_name):
+        """
+        <Purpose>
+          Identifies the man page the given name resolves to without reading
+          it. The identity changes whenever the man page does.
+
+          By default the man page is the roff file installed on the system, see
+          RoffManual.get_page_identity, which is the one man renders.
+
+        <Arguments>
+          page_name:
+            The name of the man page eg chown32.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          A string identifying the man page, or None if the source cannot
+          identify it without reading it.
+        """
+
+        return get_page_identity(page_name, self.section)
+
+
+    def group(self, page_names_list):
+        """
+        <Purpose>
+          Groups the given names, eg system call names, by the man page they
+          resolve to, so that each man page is read and parsed once.
+
+          By default the names are grouped by the roff files installed on the
+          system, see RoffManual.group_by_man_page, which are the ones man
+          renders.
+
+        <Arguments>
+          page_names_list:
+            A list of man page names.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          A list of lists of names, one for each man page, in the order the man
+          pages are first met in page_names_list. Names without a man page are
+          placed in a list of their own.
+        """
+
+        return group_by_man_page(page_names_list, self.section)
+
+
+    def _group_by_text(self, page_names_list):
+        # names whose man pages have the same text share a man page.
+        page_names_lists = []
+        page_indexes = {}
+        for page_name in page_names_list:
+            man_page = self._read_page(page_name, "grouping_bytes_read")
+            if(man_page == "" and
+               (page_name.endswith("32") or page_name.endswith("64"))):
+                man_page = self._read_page(page_name[:-2], "grouping_bytes_read")
+
+            if man_page == "":
+                page_names_lists.append([page_name])
+                continue
+
+            if man_page not in page_indexes:
+                page_indexes[man_page] = len(page_names_lists)
+                page_names_lists.append([])
+
+            page_names_lists[page_indexes[man_page]].append(page_name)
+
+        return page_names_lists
+
+
+    def _read_page(self, page_name, counter):
+        # same as read_page, adding the bytes read from files, if any, to the
+        # given counter.
+        return self.read_page(page_name)
+
+
+
+class ManCommandSource(ManPageSource):
+    """
+    Reads man pages using man.
+    """
+
+    def __call__(self, syscall_name):
+        # man is stopped as soon as the DESCRIPTION line is read.
+        return read_man_page_with_man(syscall_name)
+
+
+    def read_page(self, page_name):
+        # https://blog.nelhage.com/2010/02/a-very-subtle-bug/
+        # restore the default SIGPIPE handler so that man and the programs it
+        # runs exit quietly once the pipe is closed.
+        process = subprocess.Popen(['man', self.section, page_name],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   preexec_fn=lambda:
+                                       signal.signal(signal.SIGPIPE, signal.SIG_DFL))
+        Instrumentation.count("man_processes")
+        man_page_bytestring = process.communicate()[0]
+        Instrumentation.count("bytes_read", len(man_page_bytestring))
+
+        # if a man entry does not exist no definitions exists.
+        if process.returncode != 0:
+            return ""
+
+        return man_page_bytestring.decode("utf-8")
+
+
+
+class RoffSource(ManPageSource):
+    """
+    Renders man pages from their roff source files, found in man_directories.
+    See RoffManual.find_man_page.
+    """
+
+    def __init__(self, man_directories=None):
+        self.man_directories = man_directories
+
+        # the roff text of the man pages read by group, under the first name of
+        # each group, until the name is read.
+        self._roff_texts = {}
+
+
+    def __call__(self, syscall_name):
+        # only the SYNOPSIS section is rendered.
+        roff_text = self._roff_texts.pop(syscall_name, None)
+        if roff_text is None:
+            return read_roff_man_page(syscall_name, self.man_directories)
+
+        return "\n".join(render_roff(roff_text, "DESCRIPTION")) + "\n"
+
+
+    def __getstate__(self):
+        # the roff texts are not sent to worker processes, which read the pages
+        # again instead.
+        state = self.__dict__.copy()
+        state["_roff_texts"] = {}
+        return state
+
+
+    def group(self, page_names_list):
+        # the man page files are read while grouping, so they are kept to be
+        # rendered without reading and decompressing them again. Their bytes
+        # are only counted as grouping_bytes_read.
+        self._roff_texts = {}
+        return group_by_man_page(page_names_list, self.section,
+                                 self.man_directories, self._roff_texts)
+
+
+    def read_page(self, page_name):
+        path, roff_text = resolve_man_page(page_name, self.section,
+                                           self.man_directories)
+        if path is None:
+            return ""
+
+        return "\n".join(render_roff(roff_text)) + "\n"
+
+
+    def get_page_identity(self, page_name):
+        return get_page_identity(page_name, self.section, self.man_directories)
+
+
+
+class DictSource(ManPageSource):
+    """
+    Reads man pages from a dictionary from page names to their text.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+
+
+    def read_page(self, page_name):
+        return self.pages.get(page_name, "")
+
+
+    def get_page_identity(self, page_name):
+        # the dictionary can be changed at any time.
+        return None
+
+
+    def group(self, page_names_list):
+        return self._group_by_text(page_names_list)
+
+
+    def __len__(self):
+        return len(self.pages)
+
+
+
+class DirectorySource(ManPageSource):
+    """
+    Reads man pages from a directory holding a file for each page, named after
+    the page eg "open" or "open.txt", with the text of the page encoded in
+    UTF-8.
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise IOError("Not a directory: " + directory)
+
+        self.directory = directory
+
+
+    def read_page(self, page_name):
+        return self._read_page(page_name, "bytes_read")
+
+
+    def _read_page(self, page_name, counter):
+        path = self._find_page_file(page_name)
+        if path is None:
+            return ""
+
+        page_file = open(path, "rb")
+        try:
+            page_bytestring = page_file.read()
+        finally:
+            page_file.close()
+
+        Instrumentation.count(counter, len(page_bytestring))
+        return page_bytestring.decode("utf-8")
+
+
+    def get_page_identity(self, page_name):
+        # the directory along with the page file, or if there is no page file
+        # the directory itself, which is modified when a page is added.
+        directory = os.path.realpath(self.directory)
+
+        path = self._find_page_file(page_name)
+        if(path is None and
+           (page_name.endswith("32") or page_name.endswith("64"))):
+            path = self._find_page_file(page_name[:-2])
+
+        if path is None:
+            return ("directory=" + get_file_identity(directory) + "\n" +
+                    "missing=" + page_name)
+
+        return ("directory=" + directory + "\n" +
+                "page=" + get_file_identity(os.path.realpath(path)))
+
+
+    def group(self, page_names_list):
+        # snapshots hold a file for every name, even if they share a man page.
+        return self._group_by_text(page_names_list)
+
+
+    def _find_page_file(self, page_name):
+        # page names never hold a path.
+        if os.sep in page_name or page_name in ("", ".", ".."):
+            return None
+
+        for extension in _EXTENSIONS:
+            path = os.path.join(self.directory, page_name + extension)
+            if os.path.isfile(path):
+                return path
+
+        return None
+
+
+
+class ArchiveSource(DictSource):
+    """
+    Reads man pages from a tar archive, possibly compressed, or a zip archive,
+    holding a file for each page as in DirectorySource. Files may be in
+    subdirectories of the archive. The whole archive is read once, when the
+    source is created.
+    """
+
+    def __init__(self, archive_name):
+        # identify the archive before reading it, so that the pages are never
+        # older than their identity.
+        self._archive_identity = get_file_identity(os.path.realpath(archive_name))
+
+        pages = {}
+        for member_name, data in _read_archive(archive_name):
+            page_name = os.path.basename(member_name)
+            if page_name.endswith(".txt"):
+                page_name = page_name[:-len(".txt")]
+            if page_name:
+                pages[page_name] = data.decode("utf-8")
+
+        DictSource.__init__(self, pages)
+        self.archive_name = archive_name
+
+
+    def get_page_identity(self, page_name):
+        # the archive along with the name of the page file in it.
+        if(page_name not in self.pages and
+           (page_name.endswith("32") or page_name.endswith("64"))):
+            page_name = page_name[:-2]
+
+        if page_name not in self.pages:
+            return "archive=" + self._archive_identity + "\nmissing=" + page_name
+
+        return "archive=" + self._archive_identity + "\npage=" + page_name
+
+
+
+def _read_archive(archive_name):
+    # the (name, data) of every file in a tar or zip archive.
+    if zipfile.is_zipfile(archive_name):
+        archive = zipfile.ZipFile(archive_name)
+        try:
+            return [(info.filename, archive.read(info.filename))
+                    for info in archive.infolist()
+                    if not info.filename.endswith("/")]
+        finally:
+            archive.close()
+
+    archive = tarfile.open(archive_name, "r:*")
+    try:
+        members = []
+        for member in archive.getmembers():
+            if member.isfile():
+                member_file = archive.extractfile(member)
+                try:
+                    members.append((member.name, member_file.read()))
+                finally:
+                    member_file.close()
+        return members
+    finally:
+        archive.close()
+
+
+
+def get_source_page_identity(read_man_page, page_name, section="2"):
+    """
+    <Purpose>
+      Identifies the man page with the given name as read by the given
+      function. See ManPageSource.get_page_identity.
+
+    <Arguments>
+      read_man_page:
+        A ManPageSource or ManPageCache object, one of their methods eg
+        read_page, or any other function reading the man pages installed on
+        the system eg SyscallManual.read_man_page.
+
+      page_name:
+        The name of the man page eg chown32.
+
+      section:
+        The section of the man page, if read_man_page is not a source.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A string identifying the man page, or None if it cannot be identified
+      without reading it.
+    """
+
+    source = _get_source(read_man_page)
+    if source is None:
+        return get_page_identity(page_name, section)
+
+    return source.get_page_identity(page_name)
+
+
+
+def group_by_source_page(read_man_page, page_names_list, section="2"):
+    """
+    Groups the given names by the man page they resolve to, as read by the
+    given function. See get_source_page_identity and ManPageSource.group.
+    """
+
+    source = _get_source(read_man_page)
+    if source is None:
+        return group_by_man_page(page_names_list, section)
+
+    return source.group(page_names_list)
+
+
+
+def _get_source(read_man_page):
+    # the source itself, or the source a method such as read_page is bound to,
+    # if read_man_page is a source at all.
+    if hasattr(read_man_page, "get_page_identity"):
+        return read_man_page
+
+    owner = getattr(read_man_page, "__self__", None)
+    if hasattr(owner, "get_page_identity"):
+        return owner
+
+    return None
+
+
+
+def open_source(path):
+    """
+    Returns a DirectorySource if the given path is a directory, or an
+    ArchiveSource otherwise.
+    """
+
+    if os.path.isdir(path):
+        return DirectorySource(path)
+
+    return ArchiveSource(path)
+
+
+
+def write_archive(pages, archive_name):
+    """
+    <Purpose>
+      Stores man pages into a tar or zip archive that can be read by
+      ArchiveSource.
+
+    <Arguments>
+      pages:
+        A dictionary from page names to their text.
+
+      archive_name:
+        The name of the archive. Archives ending in .zip are zip archives, and
+        the rest tar archives compressed according to their extension eg
+        .tar.gz.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      Writes the archive file.
+
+    <Returns>
+      None
+    """
+
+    if archive_name.endswith(".zip"):
+        archive = zipfile.ZipFile(archive_name, "w", zipfile.ZIP_DEFLATED)
+        try:
+            for page_name in sorted(pages):
+                archive.writestr(page_name, pages[page_name].encode("utf-8"))
+        finally:
+            archive.close()
+        return
+
+    mode = "w"
+    for extension, compression in ((".gz", "gz"), (".tgz", "gz"),
+                                   (".bz2", "bz2"), (".xz", "xz")):
+        if archive_name.endswith(extension):
+            mode = "w:" + compression
+
+    archive = tarfile.open(archive_name, mode)
+    try:
+        for page_name in sorted(pages):
+            data = pages[page_name].encode("utf-8")
+            info = tarfile.TarInfo(page_name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            archive.addfile(info, io.BytesIO(data))
+    finally:
+        archive.close()
+
+
+
+def main():
+    import sys
+
+    if(len(sys.argv) not in (3, 4) or sys.argv[1] != "snapshot" or
+       (len(sys.argv) == 4 and sys.argv[3] != "--roff")):
+        print("Usage: python -m sysDef.ManPageSource snapshot <archive> [--roff]")
+        exit()
+
+    if(len(sys.argv) == 4):
+        source = RoffSource()
+    else:
+        source = ManCommandSource()
+
+    # the list of names comes after the DESCRIPTION line of the syscalls page,
+    # so it is stored whole.
+    pages = {"syscalls": source.read_page("syscalls")}
+    for syscall_name in parse_syscall_names_list(pages["syscalls"]):
+        man_page = source(syscall_name)
+        if man_page != "":
+            pages[syscall_name] = man_page
+
+    write_archive(pages, sys.argv[2])
+    print(str(len(pages)) + " man pages stored in " + sys.argv[2])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,702 @@
+"""
+<Purpose>
+  Read man pages directly from their roff source files instead of rendering
+  them through man and groff.
+
+  Manual pages are installed as (usually compressed) roff files, e.g.
+  /usr/share/man/man2/open.2.gz. The only part of a man page needed to parse a
+  system call definition is its SYNOPSIS section, which is made up of a handful
+  of simple macros:
+
+    .SH SYNOPSIS
+    .nf
+    .B #include <fcntl.h>
+    .PP
+    .BI "int open(const char *" pathname ", int " flags );
+    .fi
+    .SH DESCRIPTION
+
+  This module renders these macros into the same plain text lines that man
+  would produce, without invoking any subprocess:
+
+    SYNOPSIS
+    #include <fcntl.h>
+
+    int open(const char *pathname, int flags);
+    DESCRIPTION
+
+  so the rendered text can be passed to SyscallManual in place of the output of
+  man. Pages that redirect to other pages with a ".so" request, eg chown32
+  redirecting to chown, are followed.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.RoffManual open
+
+  will print the rendered SYNOPSIS section of the open man page.
+
+"""
+
+import bz2
+import gzip
+import os
+import re
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+from sysDef import Instrumentation
+
+
+# directories searched for man pages if MANPATH is not set.
+MAN_DIRECTORIES = ["/usr/local/share/man", "/usr/share/man", "/usr/local/man",
+                   "/usr/man"]
+
+# how many ".so" redirections to follow before giving up.
+MAX_REDIRECTS = 5
+
+# possible extensions of (compressed) man page files, in order of preference.
+_EXTENSIONS = ["", ".gz", ".bz2", ".xz"]
+
+# macros whose arguments are joined without spaces, alternating between fonts
+# eg .BI "int open(const char *" pathname ", int " flags );
+_ALTERNATING_MACROS = set(["BI", "IB", "BR", "RB", "IR", "RI"])
+
+# macros whose arguments are joined with spaces eg .B #include <fcntl.h>
+_FONT_MACROS = set(["B", "I", "R", "SM", "SB"])
+
+# macros that break the current line and leave an empty line behind them.
+_PARAGRAPH_MACROS = set(["PP", "P", "LP", "sp", "TP", "IP", "HP"])
+
+# characters given by name eg \(aq or \[aq].
+_SPECIAL_CHARACTERS = {
+    "aq": "'", "dq": '"', "lq": '"', "rq": '"', "oq": "'", "cq": "'",
+    "em": "-", "en": "-", "hy": "-", "mi": "-", "rs": "\\", "ti": "~",
+    "ha": "^", "bu": "*", "lB": "[", "rB": "]", "lC": "{", "rC": "}",
+    "la": "<", "ra": ">", "ga": "`", "bv": "|", "ba": "|", "**": "*",
+}
+
+# single character escapes eg \- or \e.
+_SINGLE_ESCAPES = {
+    "-": "-", " ": " ", "~": " ", "0": " ", "e": "\\", "\\": "\\", "&": "",
+    "|": "", "^": "", ",": "", "/": "", "c": "", ":": "", "%": "",
+}
+
+# escape sequences: font changes, named characters, strings and single
+# character escapes.
+_ESCAPE = re.compile(r"\\(f\[[^\]]*\]|f\(..|f.|\(..|\[[^\]]*\]|\*\(..|\*\[[^\]]*\]|\*.|.)")
+
+
+
+def find_man_page(page_name, section="2", man_directories=None):
+    """
+    <Purpose>
+      Finds the file holding the man page with the given name in the given
+      section.
+
+    <Arguments>
+      page_name:
+        The name of the man page eg open.
+
+      section:
+        The section of the man page.
+
+      man_directories:
+        A list of directories to search. Defaults to the directories in the
+        MANPATH environment variable or MAN_DIRECTORIES if it is not set.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The path of the man page file or None if it was not found.
+    """
+
+    if man_directories is None:
+        man_directories = get_man_directories()
+
+    file_name = page_name + "." + section
+    for man_directory in man_directories:
+        section_directory = os.path.join(man_directory, "man" + section)
+        for extension in _EXTENSIONS:
+            path = os.path.join(section_directory, file_name + extension)
+            if os.path.isfile(path):
+                return path
+
+    return None
+
+
+
+def get_man_directories():
+    """
+    Returns the list of directories man pages are searched in.
+    """
+
+    manpath = os.environ.get("MANPATH")
+    if not manpath:
+        return MAN_DIRECTORIES
+
+    # an empty entry in MANPATH stands for the default directories.
+    man_directories = []
+    for man_directory in manpath.split(":"):
+        if man_directory == "":
+            man_directories.extend(MAN_DIRECTORIES)
+        else:
+            man_directories.append(man_directory)
+
+    return man_directories
+
+
+
+def get_page_identity(page_name, section="2", man_directories=None):
+    """
+    <Purpose>
+      Identifies the man page file the given name resolves to without reading
+      it. The identity changes whenever the man page file is modified, or, if
+      there is no man page, whenever a man page is added.
+
+      Names ending with 32 or 64 without a man page of their own resolve to the
+      man page without the number at the end, same as read_man_page.
+
+    <Arguments>
+      page_name:
+        The name of the man page eg chown32.
+
+      section:
+        The section of the man page.
+
+      man_directories:
+        A list of directories to search. See find_man_page.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A string made up of the real path of the man page file, its modification
+      time and its size.
+    """
+
+    if man_directories is None:
+        man_directories = get_man_directories()
+
+    path = _find_syscall_man_page(page_name, section, man_directories)
+    if path is not None:
+        return "page=" + get_file_identity(os.path.realpath(path))
+
+    # if there is no man page, the identity is made up of the section
+    # directories which are modified when a man page is added.
+    identity_parts = ["missing=" + page_name]
+    for man_directory in man_directories:
+        section_directory = os.path.join(man_directory, "man" + section)
+        identity_parts.append(get_file_identity(section_directory))
+
+    return "\n".join(identity_parts)
+
+
+
+def get_page_path(page_name, section="2", man_directories=None):
+    """
+    <Purpose>
+      Returns the real path of the file holding the content of the man page the
+      given name resolves to, following ".so" redirections and symbolic links.
+      Names resolving to the same path share the same man page, eg chown,
+      fchown, lchown and chown32.
+
+      Names ending with 32 or 64 without a man page of their own resolve to the
+      man page without the number at the end, same as read_man_page.
+
+    <Arguments>
+      page_name:
+        The name of the man page eg chown32.
+
+      section:
+        The section of the man page.
+
+      man_directories:
+        A list of directories to search. See find_man_page.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The real path of the man page file or None if there is no man page.
+    """
+
+    return _resolve_syscall_man_page(page_name, section, man_directories,
+                                     "grouping_bytes_read")[0]
+
+
+
+def group_by_man_page(page_names_list, section="2", man_directories=None,
+                      roff_texts=None):
+    """
+    <Purpose>
+      Groups the given man page names, eg system call names, by the man page
+      file they resolve to. See get_page_path.
+
+    <Arguments>
+      page_names_list:
+        A list of man page names.
+
+      section:
+        The section of the man pages.
+
+      man_directories:
+        A list of directories to search. See find_man_page.
+
+      roff_texts:
+        An optional dictionary. The contents of each man page file, read to
+        follow its redirections, are stored in it under the first name of its
+        list, so the page can be rendered without reading it again.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      The bytes read are counted as grouping_bytes_read, not bytes_read. See
+      sysDef/Instrumentation.py.
+
+    <Returns>
+      A list of lists of names, one for each man page file, in the order the
+      man pages are first met in page_names_list. Names without a man page file
+      are placed in a list of their own since man might still find a man page
+      for them elsewhere.
+    """
+
+    if man_directories is None:
+        man_directories = get_man_directories()
+
+    page_names_lists = []
+    page_indexes = {}
+    for page_name in page_names_list:
+        path, roff_text = _resolve_syscall_man_page(page_name, section,
+                                                    man_directories,
+                                                    "grouping_bytes_read")
+        if path is None:
+            page_names_lists.append([page_name])
+            continue
+
+        if path not in page_indexes:
+            page_indexes[path] = len(page_names_lists)
+            page_names_lists.append([])
+            if roff_texts is not None:
+                roff_texts[page_name] = roff_text
+
+        page_names_lists[page_indexes[path]].append(page_name)
+
+    return page_names_lists
+
+
+
+def get_file_identity(path):
+    """
+    Returns a string made up of the path, modification time and size of a file.
+    """
+
+    if path is None:
+        return "none"
+
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return path + ":none"
+
+    return path + ":" + repr(file_stat.st_mtime) + ":" + str(file_stat.st_size)
+
+
+
+def _resolve_syscall_man_page(page_name, section, man_directories,
+                              counter="bytes_read"):
+    # same as resolve_man_page, falling back to the name without 32 or 64 at
+    # the end.
+    path, roff_text = resolve_man_page(page_name, section, man_directories,
+                                       counter)
+    if(path is None and
+       (page_name.endswith("32") or page_name.endswith("64"))):
+        path, roff_text = resolve_man_page(page_name[:-2], section,
+                                           man_directories, counter)
+
+    return path, roff_text
+
+
+
+def _find_syscall_man_page(page_name, section, man_directories):
+    path = find_man_page(page_name, section, man_directories)
+    if(path is None and
+       (page_name.endswith("32") or page_name.endswith("64"))):
+        path = find_man_page(page_name[:-2], section, man_directories)
+
+    return path
+
+
+
+def read_roff_file(path, counter="bytes_read"):
+    """
+    <Purpose>
+      Reads a, possibly compressed, roff file.
+
+    <Arguments>
+      path:
+        The path of the roff file.
+
+      counter:
+        The counter the bytes read are added to, eg grouping_bytes_read if
+        the file is not read to be parsed. See sysDef/Instrumentation.py.
+
+    <Exceptions>
+      Exception if the file is compressed with xz and lzma is not available.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The contents of the file as a string.
+    """
+
+    if path.endswith(".gz"):
+        roff_file = gzip.open(path, "rb")
+    elif path.endswith(".bz2"):
+        roff_file = bz2.BZ2File(path, "rb")
+    elif path.endswith(".xz"):
+        if lzma is None:
+            raise Exception("lzma is required to read " + path)
+        roff_file = lzma.open(path, "rb")
+    else:
+        roff_file = open(path, "rb")
+
+    try:
+        roff_bytestring = roff_file.read()
+    finally:
+        roff_file.close()
+
+    Instrumentation.count(counter, len(roff_bytestring))
+
+    return roff_bytestring.decode("utf-8", "replace")
+
+
+
+def resolve_man_page(page_name, section="2", man_directories=None,
+                     counter="bytes_read"):
+    """
+    <Purpose>
+      Finds and reads the man page with the given name, following any ".so"
+      redirections to the page that holds the actual content.
+
+    <Arguments>
+      page_name:
+        The name of the man page eg chown32.
+
+      section:
+        The section of the man page.
+
+      man_directories:
+        A list of directories to search. See find_man_page.
+
+      counter:
+        The counter the bytes read are added to. See read_roff_file.
+
+    <Exceptions>
+      Exception if there are more than MAX_REDIRECTS redirections.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      (path, roff_text):
+        The real path of the file holding the content of the man page and its
+        contents, or (None, None) if the man page was not found.
+    """
+
+    path = find_man_page(page_name, section, man_directories)
+
+    for redirect in range(MAX_REDIRECTS + 1):
+        if path is None:
+            return None, None
+
+        # pages can also be redirected with symbolic links.
+        path = os.path.realpath(path)
+        roff_text = read_roff_file(path, counter)
+
+        so_target = _get_so_target(roff_text)
+        if so_target is None:
+            return path, roff_text
+
+        # the target of a ".so" request is relative to the top man directory
+        # eg ".so man2/chown.2"
+        man_directory = os.path.dirname(os.path.dirname(path))
+        target_path = os.path.join(man_directory, so_target)
+
+        path = None
+        for extension in _EXTENSIONS:
+            if os.path.isfile(target_path + extension):
+                path = target_path + extension
+                break
+
+    raise Exception("Too many redirections while reading man page " + page_name)
+
+
+
+def _get_so_target(roff_text):
+    # a redirecting page holds nothing but comments and a single ".so" request.
+    for line in roff_text.split("\n"):
+        line = line.strip()
+        if line == "" or line.startswith(".\\\"") or line.startswith("'\\\""):
+            continue
+
+        if line.startswith(".so "):
+            return line[4:].strip()
+
+        return None
+
+    return None
+
+
+
+def render_roff(roff_text, stop_at=None):
+    """
+    <Purpose>
+      Renders the roff source of a man page into plain text lines, similar to
+      the output of man after removing the formatting.
+
+      Only the requests and escapes found in man pages are supported. Filled
+      text lines are joined into a single line up to the next break instead of
+      being wrapped at the width of a terminal.
+
+    <Arguments>
+      roff_text:
+        The roff source of the man page.
+
+      stop_at:
+        An optional section heading eg DESCRIPTION. If given rendering stops
+        right after that heading.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A list of the rendered lines.
+    """
+
+    rendered_lines = []
+
+    # text lines waiting to be joined, while in fill mode.
+    filled_words = []
+    fill = True
+
+    roff_lines = roff_text.split("\n")
+    line_index = 0
+    while line_index < len(roff_lines):
+        line = roff_lines[line_index]
+        line_index += 1
+
+        # an escaped newline joins the line with the next one.
+        while line.endswith("\\") and not line.endswith("\\\\") and line_index < len(roff_lines):
+            line = line[:-1] + roff_lines[line_index]
+            line_index += 1
+
+        # remove comments.
+        comment_index = line.find("\\\"")
+        if comment_index != -1:
+            if line[:comment_index].strip() in (".", "'", ""):
+                continue
+            line = line[:comment_index]
+
+        if not (line.startswith(".") or line.startswith("'")):
+            text = _render_text(line)
+            if fill:
+                if text.strip() == "":
+                    _flush(rendered_lines, filled_words)
+                    rendered_lines.append("")
+                else:
+                    filled_words.append(text.strip())
+            else:
+                rendered_lines.append(text.rstrip())
+            continue
+
+        # a request (macro) line.
+        request, arguments = _split_request(line[1:])
+
+        if request in _ALTERNATING_MACROS or request in _FONT_MACROS:
+            if request in _ALTERNATING_MACROS:
+                text = "".join([_render_text(argument) for argument in arguments])
+            else:
+                text = " ".join([_render_text(argument) for argument in arguments])
+
+            if fill:
+                filled_words.append(text.strip())
+            else:
+                rendered_lines.append(text.rstrip())
+            continue
+
+        # any other request breaks the current line.
+        _flush(rendered_lines, filled_words)
+
+        if request in ("SH", "SS"):
+            heading = " ".join([_render_text(argument) for argument in arguments])
+            rendered_lines.append(heading)
+            if request == "SH" and heading == stop_at:
+                break
+            fill = True
+        elif request in ("nf", "EX", "TS"):
+            fill = False
+        elif request in ("fi", "EE", "TE"):
+            fill = True
+        elif request in _PARAGRAPH_MACROS:
+            rendered_lines.append("")
+
+    _flush(rendered_lines, filled_words)
+
+    return rendered_lines
+
+
+
+def _flush(rendered_lines, filled_words):
+    # join the text lines gathered while in fill mode into a single line.
+    if len(filled_words) > 0:
+        rendered_lines.append(" ".join(filled_words))
+        del filled_words[:]
+
+
+
+def _split_request(request_line):
+    # split a request line into the name of the request and its arguments.
+    # Arguments are separated by spaces unless they are quoted, and "" within a
+    # quoted argument stands for a quote.
+    request_line = request_line.lstrip()
+    parts = request_line.split(None, 1)
+    if len(parts) == 0:
+        return "", []
+
+    request = parts[0]
+    if len(parts) == 1:
+        return request, []
+
+    arguments = []
+    rest = parts[1]
+    index = 0
+    while index < len(rest):
+        if rest[index] == " " or rest[index] == "\t":
+            index += 1
+            continue
+
+        argument = ""
+        if rest[index] == '"':
+            index += 1
+            while index < len(rest):
+                if rest[index] == '"':
+                    if rest[index + 1:index + 2] == '"':
+                        argument += '"'
+                        index += 2
+                        continue
+                    index += 1
+                    break
+                argument += rest[index]
+                index += 1
+        else:
+            while index < len(rest) and rest[index] not in " \t":
+                # an escaped space does not separate arguments.
+                if rest[index] == "\\" and index + 1 < len(rest):
+                    argument += rest[index:index + 2]
+                    index += 2
+                    continue
+                argument += rest[index]
+                index += 1
+
+        arguments.append(argument)
+
+    return request, arguments
+
+
+
+def _render_text(text):
+    # replace all escape sequences with the text they stand for.
+    return _ESCAPE.sub(_render_escape, text).replace("\t", " ")
+
+
+
+def _render_escape(match):
+    escape = match.group(1)
+
+    if escape.startswith("f"):
+        # font changes are dropped.
+        return ""
+
+    if escape.startswith("("):
+        return _SPECIAL_CHARACTERS.get(escape[1:], "")
+
+    if escape.startswith("["):
+        return _SPECIAL_CHARACTERS.get(escape[1:-1], "")
+
+    if escape.startswith("*"):
+        # predefined strings, mostly quotes.
+        return _SPECIAL_CHARACTERS.get(escape.lstrip("*([").rstrip("]"), "")
+
+    return _SINGLE_ESCAPES.get(escape, escape)
+
+
+
+def read_roff_man_page(syscall_name, man_directories=None):
+    """
+    <Purpose>
+      Reads the SYNOPSIS section of the man page of the system call whose name
+      is given as a parameter, from the roff source of the man page. This can
+      be used in place of SyscallManual.read_man_page.
+
+    <Arguments>
+      syscall_name:
+        The name of the system call for which to read the man page.
+
+      man_directories:
+        A list of directories to search. See find_man_page.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      man_page:
+        The rendered text of the man page up to the DESCRIPTION line or an empty
+        string if no man entry exists.
+    """
+
+    # same as read_man_page, syscalls ending with 32 or 64 might only have a man
+    # page without the number at the end.
+    path, roff_text = _resolve_syscall_man_page(syscall_name, "2",
+                                                man_directories)
+    if path is None:
+        return ""
+
+    return "\n".join(render_roff(roff_text, "DESCRIPTION")) + "\n"
+
+
+
+def main():
+    import sys
+
+    if(len(sys.argv) != 2):
+        print("Usage: python -m sysDef.RoffManual <syscall_name>")
+        exit()
+
+    man_page = read_roff_man_page(sys.argv[1])
+    synopsis = man_page[man_page.find("SYNOPSIS"):]
+    print(synopsis)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""
+<Purpose>
+  Decode the system calls of strace logs into records annotated with the
+  names and types of their parameters, taken from the definitions parsed
+  from the man pages, eg the line:
+
+    1234  open("/etc/x", O_RDONLY) = 3 <0.000012>
+
+  is decoded into:
+
+    {"pid": 1234, "time": null, "syscall": "open", "status": "complete",
+     "args": [{"name": "pathname", "type": "const char *", "value": "\\"/etc/x\\""},
+              {"name": "flags", "type": "int", "value": "O_RDONLY"}],
+     "result": "3", "errno": null, "duration": 1.2e-05}
+
+  Logs of strace -f, with or without timestamps (-t, -tt, -ttt, -r) and
+  durations (-T), are supported. Calls interrupted by other processes are
+  decoded as an "unfinished" and a "resumed" record, the arguments of the
+  latter matched with the last parameters. Signals and exits are decoded as
+  records with an "event" and their text.
+
+  The names and types of the parameters of each system call are looked up
+  once, into an argument table built from a list of SyscallManual objects.
+
+  Large logs are split into chunks ending on line boundaries, which a pool of
+  worker processes read through mmap and decode into temporary files. The
+  files are appended to the output in the order of the chunks, so the memory
+  used does not grow with the size of the log.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.StraceDecoder syscall_definitions.pickle trace.log trace.jsonl
+
+  will decode trace.log, one JSON record per line, into trace.jsonl.
+
+"""
+
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+
+from sysDef.SyscallManual import SyscallManual
+
+
+# the size of the chunks of a log decoded by each worker, in bytes.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# an optional pid, as "[pid 1234]" or "1234", and an optional timestamp
+# followed by the rest of the line.
+_PREFIX = (r"(?:\[pid\s+(\d+)\]|(\d+)(?=\s))?\s*" +
+           r"(?:(\d+[.:][\d.:]*)\s+)?")
+
+# the start of a line of a system call or of a resumed system call, up to
+# its arguments.
+_SYSCALL = re.compile(_PREFIX + r"(?:(\w+)\(|<\.\.\. (\w+) resumed>\s*)")
+
+# the start of any other line.
+_OTHER = re.compile(_PREFIX)
+
+# signals and exits eg "--- SIGCHLD {...} ---" or "+++ exited with 0 +++".
+_EVENT = re.compile(r"(---|\+\+\+)\s*(.*?)\s*(?:---|\+\+\+)\s*$")
+
+# the result of a system call after its arguments, eg " = -1 ENOENT (No
+# such file or directory) <0.000012>".
+_RESULT = re.compile(r"\s*=\s*(\S+)(?:\s+([A-Z][A-Z0-9_]+)\b)?.*?" +
+                     r"(?:\s+<(\d+(?:\.\d+)?)>)?\s*$")
+
+# the characters that end or nest an argument.
+_SPECIAL = re.compile(r"[\"\\,()\[\]{}]")
+
+# a string argument, possibly truncated eg "abc"...
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"(?:\.\.\.)?'
+
+# arguments made up of strings and plain values only, without any nesting,
+# up to their closing parenthesis, and each of these arguments. The loops are
+# unrolled so that lines not matching fail without backtracking.
+_FLAT_ARGUMENTS = re.compile(r'[^"()\[\]{}]*(?:' + _STRING + r'[^"()\[\]{}]*)*\)')
+_FLAT_ARGUMENT = re.compile(r'[^",]*(?:' + _STRING + r'[^",]*)*')
+
+_UNFINISHED = "<unfinished ...>"
+
+
+
+def build_argument_table(syscall_manuals):
+    """
+    <Purpose>
+      Builds the table of the parameters of each system call used to decode
+      its arguments.
+
+    <Arguments>
+      syscall_manuals:
+        A list of SyscallManual objects.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A dictionary from each system call name with a FOUND definition to a
+      tuple of (name, type) tuples, one for each of its parameters. Variadic
+      parameters (...) are left out.
+    """
+
+    argument_table = {}
+    for syscall_manual in syscall_manuals:
+        if(syscall_manual.type != SyscallManual.FOUND or
+           syscall_manual.name in argument_table):
+            continue
+
+        parameters = []
+        for parameter in syscall_manual.definition.parameters:
+            if parameter.ellipsis:
+                continue
+            parameters.append(_get_parameter_name_and_type(parameter))
+
+        argument_table[syscall_manual.name] = tuple(parameters)
+
+    return argument_table
+
+
+
+def _get_parameter_name_and_type(parameter):
+    # the type of a parameter is its representation without its name. Names
+    # may hold array sizes eg buf[.count].
+    name = parameter.name
+    representation = repr(parameter)
+    index = representation.rfind(name)
+    parameter_type = (representation[:index].strip() +
+                      representation[index + len(name):])
+
+    return name.split("[", 1)[0], parameter_type
+
+
+
+def split_arguments(text, start=0):
+    """
+    <Purpose>
+      Splits the arguments of a system call as printed by strace, up to the
+      parenthesis closing them. Commas within strings, arrays, structures and
+      nested parentheses do not split arguments.
+
+    <Arguments>
+      text:
+        The text of the arguments.
+
+      start:
+        The index of the first character of the arguments in text, right after
+        the opening parenthesis.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A tuple of the list of the arguments and the index right after the
+      closing parenthesis, or None if the arguments are not closed, eg in an
+      unfinished system call.
+    """
+
+    # most arguments are strings and plain values, split without a loop.
+    flat = _FLAT_ARGUMENTS.match(text, start)
+    if flat is not None:
+        end = flat.end()
+        if "\"" in flat.group():
+            arguments = _FLAT_ARGUMENT.findall(text, start, end - 1)
+        else:
+            arguments = text[start:end - 1].split(",")
+
+        arguments = [argument.strip() for argument in arguments]
+        return [argument for argument in arguments if argument], end
+
+    arguments = []
+    depth = 0
+    in_string = False
+    skip = -1
+    argument_start = start
+
+    for match in _SPECIAL.finditer(text, start):
+        position = match.start()
+        if position <= skip:
+            continue
+
+        character = text[position]
+        if in_string:
+            if character == "\\":
+                skip = position + 1
+            elif character == "\"":
+                in_string = False
+
+        elif character == "\"":
+            in_string = True
+
+        elif character in "([{":
+            depth += 1
+
+        elif character in "]}":
+            depth -= 1
+
+        elif character == ")":
+            if depth > 0:
+                depth -= 1
+                continue
+
+            argument = text[argument_start:position].strip()
+            if argument or arguments:
+                arguments.append(argument)
+            return arguments, position + 1
+
+        elif character == "," and depth == 0:
+            arguments.append(text[argument_start:position].strip())
+            argument_start = position + 1
+
+    argument = text[argument_start:].strip()
+    if argument:
+        arguments.append(argument)
+
+    return arguments, None
+
+
+
+def decode_line(line, argument_table):
+    """
+    <Purpose>
+      Decodes a line of an strace log.
+
+    <Arguments>
+      line:
+        The line, without its line ending.
+
+      argument_table:
+        The table returned by build_argument_table.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A dictionary, see the purpose of the module, or None for empty lines.
+      Lines that cannot be decoded are returned as {"unparsed": line}.
+    """
+
+    match = _SYSCALL.match(line)
+    if match is None:
+        return _decode_other_line(line)
+
+    pid_in_brackets, pid, time, syscall_name, resumed_name = match.groups()
+    pid = pid_in_brackets or pid
+    position = match.end()
+
+    if syscall_name is not None:
+        status = "complete"
+    else:
+        status = "resumed"
+        syscall_name = resumed_name
+
+    # an unfinished call ends with its arguments so far.
+    if line.endswith(_UNFINISHED):
+        status = "unfinished"
+        arguments, end = split_arguments(line[:-len(_UNFINISHED)], position)
+    else:
+        arguments, end = split_arguments(line, position)
+
+    parameters = argument_table.get(syscall_name, ())
+
+    # the arguments of a resumed call are its last ones.
+    if status == "resumed" and len(arguments) < len(parameters):
+        parameters = parameters[len(parameters) - len(arguments):]
+
+    args = [{"name": name, "type": parameter_type, "value": value}
+            for (name, parameter_type), value in zip(parameters, arguments)]
+
+    # variadic arguments or the arguments of unknown system calls.
+    for value in arguments[len(args):]:
+        args.append({"name": None, "type": None, "value": value})
+
+    record = {"pid": int(pid) if pid else None, "time": time,
+              "syscall": syscall_name, "status": status, "args": args,
+              "result": None, "errno": None, "duration": None}
+
+    if end is not None:
+        result = _RESULT.match(line, end)
+        if result is not None:
+            record["result"], record["errno"], duration = result.groups()
+            if duration:
+                record["duration"] = float(duration)
+
+    return record
+
+
+
+def _decode_other_line(line):
+    # decode signals and exits.
+    match = _OTHER.match(line)
+    position = match.end()
+    if position == len(line):
+        return None if line.strip() == "" else {"unparsed": line}
+
+    event = _EVENT.match(line, position)
+    if event is None:
+        return {"unparsed": line}
+
+    pid = match.group(1) or match.group(2)
+    return {"pid": int(pid) if pid else None, "time": match.group(3),
+            "event": "signal" if event.group(1) == "---" else "exit",
+            "text": event.group(2)}
+
+
+
+def get_chunks(log_name, chunk_size=CHUNK_SIZE):
+    """
+    Returns a list of (start, end) byte offsets splitting a log file into
+    chunks of about chunk_size bytes, each ending on a line boundary.
+    """
+
+    size = os.path.getsize(log_name)
+    if size == 0:
+        return []
+
+    log_file = open(log_name, "rb")
+    try:
+        log_map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        log_file.close()
+
+    chunks = []
+    try:
+        start = 0
+        while start < size:
+            end = log_map.find(b"\n", min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            chunks.append((start, end))
+            start = end
+    finally:
+        log_map.close()
+
+    return chunks
+
+
+
+def decode_log(log_name, output_name, syscall_manuals, workers=None,
+               chunk_size=CHUNK_SIZE):
+    """
+    <Purpose>
+      Decodes an strace log into a file with a JSON record for each line.
+
+    <Arguments>
+      log_name:
+        The name of the strace log file.
+
+      output_name:
+        The name of the output file, written as JSON lines.
+
+      syscall_manuals:
+        A list of SyscallManual objects, or an argument table returned by
+        build_argument_table.
+
+      workers:
+        The number of worker processes. Defaults to the number of cores in
+        the system. If set to 1 the log is decoded in this process.
+
+      chunk_size:
+        The size of the chunks the log is split into, in bytes.
+
+    <Exceptions>
+      IOError if the log cannot be read or the output written.
+
+    <Side Effects>
+      Writes the output file, and temporary files next to it.
+
+    <Returns>
+      A tuple of the number of lines decoded and the number of lines that
+      could not be decoded.
+    """
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if isinstance(syscall_manuals, dict):
+        argument_table = syscall_manuals
+    else:
+        argument_table = build_argument_table(syscall_manuals)
+
+    output_directory = os.path.dirname(os.path.abspath(output_name))
+    temporary_directory = tempfile.mkdtemp(dir=output_directory, prefix=".tmp")
+
+    # the table is passed along with each chunk so that it reaches the
+    # workers of the pool.
+    arguments_list = [(log_name, start, end, argument_table,
+                       os.path.join(temporary_directory, str(index)))
+                      for index, (start, end)
+                      in enumerate(get_chunks(log_name, chunk_size))]
+
+    lines = 0
+    unparsed = 0
+    output_file = open(output_name, "wb")
+    try:
+        if workers <= 1 or len(arguments_list) <= 1:
+            results = (_decode_chunk(arguments) for arguments in arguments_list)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(min(workers, len(arguments_list)))
+            results = pool.imap(_decode_chunk, arguments_list)
+
+        try:
+            # the chunks are appended in order as soon as they are decoded.
+            for part_name, part_lines, part_unparsed in results:
+                part_file = open(part_name, "rb")
+                try:
+                    shutil.copyfileobj(part_file, output_file)
+                finally:
+                    part_file.close()
+                os.remove(part_name)
+
+                lines += part_lines
+                unparsed += part_unparsed
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+    finally:
+        output_file.close()
+        shutil.rmtree(temporary_directory, True)
+
+    return lines, unparsed
+
+
+
+def _decode_chunk(arguments):
+    # decode the lines of a chunk of a log into a part file. Returns the name
+    # of the part file, the number of lines decoded and how many could not be.
+    log_name, start, end, argument_table, part_name = arguments
+
+    log_file = open(log_name, "rb")
+    try:
+        log_map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        log_file.close()
+
+    try:
+        text = log_map[start:end].decode("utf-8", "replace")
+    finally:
+        log_map.close()
+
+    lines = 0
+    unparsed = 0
+    part_file = open(part_name, "wb")
+    try:
+        encoded_lines = []
+        for line in text.split("\n"):
+            record = decode_line(line.rstrip("\r"), argument_table)
+            if record is None:
+                continue
+
+            lines += 1
+            if "unparsed" in record:
+                unparsed += 1
+
+            encoded_lines.append(json.dumps(record, separators=(",", ":")))
+
+        if encoded_lines:
+            part_file.write(("\n".join(encoded_lines) + "\n").encode("ascii"))
+    finally:
+        part_file.close()
+
+    return part_name, lines, unparsed
+
+
+
+def main():
+    import argparse
+    import sys
+    import time
+
+    from sysDef.DefinitionsDatabase import read_definitions
+
+    parser = argparse.ArgumentParser(description="Decode strace logs into " +
+                                     "JSON records annotated with the " +
+                                     "parameters of each system call.")
+    parser.add_argument("definitions", metavar="FILE",
+                        help="a pickle or database file of definitions.")
+    parser.add_argument("log", help="the strace log to decode.")
+    parser.add_argument("output", help="the JSON lines file to write.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes. Defaults to the " +
+                        "number of cores.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="size of the chunks of the log decoded by each " +
+                        "worker, in bytes.")
+    args = parser.parse_args()
+
+    argument_table = build_argument_table(read_definitions(args.definitions))
+
+    start = time.time()
+    lines, unparsed = decode_log(args.log, args.output, argument_table,
+                                 args.workers, args.chunk_size)
+    seconds = time.time() - start
+
+    sys.stderr.write(str(lines) + " lines decoded (" + str(unparsed) +
+                     " not understood) in %.2f seconds, %d lines per second.\n"
+                     % (seconds, lines / max(seconds, 1e-9)))
+
+if __name__ == "__main__":
+    main()
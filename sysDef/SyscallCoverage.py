@@ -0,0 +1,331 @@
+"""
+<Purpose>
+  Check which system calls are covered by a list of targets, eg shared
+  libraries such as libc, libpthread, librt or libaio and python modules such
+  as os, fcntl, select, resource, mmap or signal, possibly of several
+  installed python versions.
+
+  Targets are inspected in parallel by a pool of worker processes. Each
+  worker reads the names a target exports once:
+    - lib:NAME  a shared library, eg lib:c, lib:aio or
+                lib:/usr/lib/x86_64-linux-gnu/liburing.so.2. Its path is
+                found once, before the workers start, and its symbols are
+                read from its ELF file without loading it (see
+                sysDef/ElfSymbols.py).
+    - py:NAME   a python module or an attribute of one, eg py:fcntl or
+                py:socket.socket for the methods of socket objects. It is
+                imported by the worker.
+    - py:NAME@PYTHON  the same, imported by the python interpreter PYTHON,
+                eg py:os@python2.7 or py:select@/usr/bin/python3.8.
+
+  The result is a matrix of system calls and targets. With first_match, the
+  targets are examined in the order given and each system call is only
+  covered by the first target exporting it.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.SyscallCoverage syscall_definitions.pickle lib:c lib:rt py:os py:fcntl
+
+  will print, in CSV, which of the system calls of the pickle file each of
+  the four targets covers, followed by the number of system calls covered by
+  each target.
+
+"""
+
+import multiprocessing
+import subprocess
+
+from sysDef.ElfSymbols import ElfError
+from sysDef.ElfSymbols import SharedLibrary
+from sysDef.ElfSymbols import find_cached_library_path
+
+
+# the targets examined when none are given: the ones of syscall_libraries.py.
+DEFAULT_TARGETS = ["py:os", "py:socket", "py:socket.socket", "py:sys", "lib:c"]
+
+# run by other python interpreters to find which of the names read from its
+# standard input the target given as its argument has. Works with python 2
+# and python 3.
+_REMOTE_SCRIPT = """
+import sys
+import importlib
+parts = sys.argv[1].split(".")
+for index in range(len(parts), 0, -1):
+    try:
+        target = importlib.import_module(".".join(parts[:index]))
+    except ImportError:
+        continue
+    for part in parts[index:]:
+        target = getattr(target, part)
+    break
+else:
+    raise ImportError("No module named " + sys.argv[1])
+names = set(sys.stdin.read().split()).intersection(dir(target))
+for name in sorted(names):
+    if getattr(target, name, False):
+        sys.stdout.write(name + "\\n")
+"""
+
+
+
+class CoverageMatrix(object):
+    """
+    <Purpose>
+      Which targets cover which system calls.
+
+    <Attributes>
+      syscall_names:
+        The list of system call names examined, the rows of the matrix.
+
+      targets:
+        The list of targets examined, the columns of the matrix.
+
+      covered:
+        A dictionary from each target to the set of system call names it
+        covers. With first_match each name is in the set of one target only.
+
+      errors:
+        A dictionary from each target that could not be inspected to the
+        reason. These targets cover nothing.
+
+    """
+
+    def __init__(self, syscall_names, targets, covered, errors):
+        self.syscall_names = syscall_names
+        self.targets = targets
+        self.covered = covered
+        self.errors = errors
+
+
+    def get_row(self, syscall_name):
+        """
+        Returns a list with a boolean for each target, True if it covers the
+        given system call.
+        """
+
+        return [syscall_name in self.covered[target] for target in self.targets]
+
+
+    def get_uncovered(self):
+        """
+        Returns the list of the system call names no target covers.
+        """
+
+        covered = set().union(*self.covered.values())
+        return [name for name in self.syscall_names if name not in covered]
+
+
+    def write_csv(self, csv_file):
+        """
+        Writes the matrix to a file, one row for each system call with 1 in
+        the columns of the targets covering it.
+        """
+
+        csv_file.write(",".join(["syscall"] + self.targets) + "\n")
+        for syscall_name in self.syscall_names:
+            cells = [syscall_name]
+            for is_covered in self.get_row(syscall_name):
+                cells.append("1" if is_covered else "")
+            csv_file.write(",".join(cells) + "\n")
+
+
+
+def get_coverage_matrix(syscall_names, targets, first_match=False, workers=None):
+    """
+    <Purpose>
+      Inspects a list of targets in parallel and finds which of the given
+      system calls each one covers.
+
+    <Arguments>
+      syscall_names:
+        A list of system call names.
+
+      targets:
+        A list of targets, eg ["lib:c", "py:os", "py:fcntl@python2.7"].
+
+      first_match:
+        If True, each system call is covered only by the first target, in the
+        order given, exporting it.
+
+      workers:
+        The number of worker processes. Defaults to the number of cores in
+        the system. If set to 1 the targets are inspected one at a time in
+        this process.
+
+    <Exceptions>
+      ValueError if a target is not of a known kind.
+
+    <Side Effects>
+      Finds the paths of the shared libraries of the targets, see
+      ElfSymbols.find_cached_library_path, imports the python modules of the
+      targets in the worker processes, and runs the python interpreters of
+      the targets given one.
+
+    <Returns>
+      A CoverageMatrix.
+    """
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    # duplicate targets are inspected once.
+    unique_targets = []
+    for target in targets:
+        _parse_target(target)
+        if target not in unique_targets:
+            unique_targets.append(target)
+
+    # libraries are found once here rather than by every worker.
+    names = frozenset(syscall_names)
+    arguments_list = []
+    for target in unique_targets:
+        kind, name, interpreter = _parse_target(target)
+        path = None
+        if kind == "lib":
+            path = find_cached_library_path(name)
+        arguments_list.append((target, names, path))
+
+    if workers <= 1 or len(arguments_list) <= 1:
+        results = [_inspect_target(arguments) for arguments in arguments_list]
+    else:
+        pool = multiprocessing.Pool(min(workers, len(arguments_list)))
+        try:
+            results = pool.map(_inspect_target, arguments_list, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    covered = {}
+    errors = {}
+    remaining = set(names)
+    for target, exported, error in results:
+        if error is not None:
+            errors[target] = error
+
+        if first_match:
+            exported = remaining.intersection(exported)
+            remaining -= exported
+
+        covered[target] = exported
+
+    return CoverageMatrix(list(syscall_names), unique_targets, covered, errors)
+
+
+
+def _parse_target(target):
+    # the kind, name and python interpreter of a target.
+    kind, separator, name = target.partition(":")
+    if not separator or not name or kind not in ("lib", "py"):
+        raise ValueError("Unexpected target " + target + ", expected " +
+                         "lib:NAME, py:NAME or py:NAME@PYTHON.")
+
+    interpreter = None
+    if kind == "py" and "@" in name:
+        name, interpreter = name.split("@", 1)
+
+    return kind, name, interpreter
+
+
+
+def _inspect_target(arguments):
+    # the names out of the given ones a target exports. Errors are returned
+    # rather than raised so that one broken target does not stop the rest.
+    # Libraries come with their path, None if it was not found.
+    target, names, path = arguments
+    kind, name, interpreter = _parse_target(target)
+
+    try:
+        if kind == "lib":
+            if path is None:
+                raise ElfError("Library " + name + " not found.")
+            exported = names.intersection(SharedLibrary(path).exported_names)
+        elif interpreter is not None:
+            exported = _inspect_remote_module(name, interpreter, names)
+        else:
+            exported = _inspect_module(name, names)
+    except Exception as e:
+        return target, frozenset(), str(e) or e.__class__.__name__
+
+    return target, frozenset(exported), None
+
+
+
+def _inspect_module(name, names):
+    parts = name.split(".")
+    for index in range(len(parts), 0, -1):
+        try:
+            target = __import__(".".join(parts[:index]), fromlist=["*"])
+        except ImportError:
+            continue
+
+        for part in parts[index:]:
+            target = getattr(target, part)
+        break
+    else:
+        raise ImportError("No module named " + name)
+
+    return set([attribute for attribute in names.intersection(dir(target))
+                if getattr(target, attribute, False)])
+
+
+
+def _inspect_remote_module(name, interpreter, names):
+    process = subprocess.Popen([interpreter, "-c", _REMOTE_SCRIPT, name],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    output, errors = process.communicate("\n".join(names))
+    if process.returncode != 0:
+        lines = errors.strip().splitlines()
+        raise Exception(lines[-1] if lines else interpreter + " failed.")
+
+    return set(output.split())
+
+
+
+def main():
+    import argparse
+    import sys
+    import time
+
+    from sysDef.DefinitionsDatabase import read_definitions
+
+    parser = argparse.ArgumentParser(description="Check which system calls " +
+                                     "a list of libraries and python modules " +
+                                     "cover.")
+    parser.add_argument("definitions", metavar="FILE",
+                        help="a pickle or database file of definitions.")
+    parser.add_argument("targets", metavar="TARGET", nargs="*",
+                        help="lib:NAME, py:NAME or py:NAME@PYTHON. Defaults " +
+                        "to " + " ".join(DEFAULT_TARGETS) + ".")
+    parser.add_argument("--first-match", action="store_true",
+                        help="cover each system call only by the first " +
+                        "target exporting it.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes. Defaults to the " +
+                        "number of cores.")
+    args = parser.parse_args()
+
+    syscall_names = [sd.name for sd in read_definitions(args.definitions)]
+
+    start = time.time()
+    matrix = get_coverage_matrix(syscall_names, args.targets or DEFAULT_TARGETS,
+                                 args.first_match, args.workers)
+    seconds = time.time() - start
+
+    matrix.write_csv(sys.stdout)
+
+    sys.stderr.write("\n")
+    for target in matrix.targets:
+        line = target + ": " + str(len(matrix.covered[target]))
+        if target in matrix.errors:
+            line += " (" + matrix.errors[target] + ")"
+        sys.stderr.write(line + "\n")
+
+    sys.stderr.write(str(len(matrix.get_uncovered())) + " of " +
+                     str(len(syscall_names)) + " system calls not covered. " +
+                     str(len(matrix.targets)) + " targets inspected in " +
+                     "%.2f seconds.\n" % seconds)
+
+if __name__ == "__main__":
+    main()
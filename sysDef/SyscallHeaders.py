@@ -0,0 +1,368 @@
+"""
+<Purpose>
+  Enumerate the system calls of an architecture, along with their numbers,
+  from the installed kernel uapi headers, eg asm/unistd_64.h, or from a kernel
+  syscall table file, eg arch/x86/entry/syscalls/syscall_64.tbl, instead of
+  the syscalls man page.
+
+  The names of the syscalls man page depend on how old the man page is and
+  include system calls of every architecture, some never implemented. The
+  headers list exactly the system calls of the ABI the system was built for,
+  and are read in a single regular expression pass, without running man.
+
+  The two lists can be merged, or compared to find the system calls missing a
+  man page listing and the listed ones the architecture does not have.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.SyscallHeaders
+
+  will print the number and name of each system call of this machine's
+  architecture. Running:
+    python -m sysDef.SyscallHeaders i386
+    python -m sysDef.SyscallHeaders linux/arch/x86/entry/syscalls/syscall_64.tbl
+
+  will do the same for the i386 ABI and for a syscall table file, and running:
+    python -m sysDef.SyscallHeaders --diff
+
+  will print the system calls listed only in the syscalls man page or only in
+  the headers.
+
+"""
+
+import glob
+import os
+import platform
+import re
+
+
+# directories searched for uapi headers, along with their multiarch
+# subdirectories eg /usr/include/x86_64-linux-gnu.
+INCLUDE_DIRECTORIES = ["/usr/include", "/usr/local/include"]
+
+# the header listing the system calls of each architecture, as named by
+# platform.machine(). Architectures not listed use the generic table.
+ARCH_HEADERS = {
+    "x86_64": "asm/unistd_64.h",
+    "amd64": "asm/unistd_64.h",
+    "i386": "asm/unistd_32.h",
+    "i486": "asm/unistd_32.h",
+    "i586": "asm/unistd_32.h",
+    "i686": "asm/unistd_32.h",
+    "x32": "asm/unistd_x32.h",
+}
+
+GENERIC_HEADER = "asm-generic/unistd.h"
+
+# the ABIs of the lines of a syscall_*.tbl file that belong to each
+# architecture.
+ARCH_ABIS = {
+    "x86_64": ("common", "64"),
+    "amd64": ("common", "64"),
+    "i386": ("i386",),
+    "x32": ("common", "x32"),
+}
+
+# macros used by the headers but defined elsewhere, eg in asm/unistd.h.
+KNOWN_MACROS = {"__X32_SYSCALL_BIT": 0x40000000}
+
+# macros that look like system call numbers but are not.
+_NOT_SYSCALLS = ("syscalls", "arch_specific_syscall")
+
+# a #define of a number, another macro, or the sum of two of them eg
+#   #define __NR_read 0
+#   #define __NR_read (__X32_SYSCALL_BIT + 0)
+#   #define __NR_fcntl __NR3264_fcntl
+_DEFINE = re.compile(r"^[ \t]*#[ \t]*define[ \t]+(\w+)[ \t]+\(?[ \t]*(\w+)" +
+                     r"(?:[ \t]*\+[ \t]*(\w+))?[ \t]*\)?[ \t]*$", re.MULTILINE)
+
+# a line of a syscall table: <number> <abi> <name> [<entry point> ...]
+_TABLE_LINE = re.compile(r"^[ \t]*(\d+)[ \t]+(\w+)[ \t]+(\w+)", re.MULTILINE)
+
+
+
+def parse_unistd_header(header_text):
+    """
+    <Purpose>
+      Parses the __NR_ macros of a unistd header into system call names and
+      numbers.
+
+      Numbers defined in terms of other macros of the same header or of
+      KNOWN_MACROS, eg the x32 (__X32_SYSCALL_BIT + 0) or the generic
+      __NR3264_fcntl, are resolved. Conditional sections are not evaluated,
+      so headers such as asm-generic/unistd.h may list the system calls of
+      both their 32 and 64 bit variants.
+
+    <Arguments>
+      header_text:
+        The text of the header.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A list of (name, number) tuples in the order of the header. Macros whose
+      value cannot be resolved are skipped.
+    """
+
+    values = dict(KNOWN_MACROS)
+    syscall_numbers = []
+    for macro, first, second in _DEFINE.findall(header_text):
+        value = _resolve(values, first)
+        if second and value is not None:
+            second_value = _resolve(values, second)
+            value = None if second_value is None else value + second_value
+
+        if value is None:
+            continue
+
+        values[macro] = value
+
+        if macro.startswith("__NR_") and macro[5:] not in _NOT_SYSCALLS:
+            syscall_numbers.append((macro[5:], value))
+
+    return syscall_numbers
+
+
+
+def _resolve(values, token):
+    if token[0].isdigit():
+        try:
+            return int(token, 0)
+        except ValueError:
+            return None
+
+    return values.get(token)
+
+
+
+def parse_syscall_table(table_text, abis=None):
+    """
+    <Purpose>
+      Parses a kernel syscall table file eg syscall_64.tbl, whose lines are
+      made up of the number, ABI and name of each system call followed by its
+      entry points, into system call names and numbers.
+
+    <Arguments>
+      table_text:
+        The text of the table file.
+
+      abis:
+        The ABIs of the lines to keep eg ("common", "64"). Defaults to all.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A list of (name, number) tuples in the order of the table.
+    """
+
+    return [(name, int(number))
+            for number, abi, name in _TABLE_LINE.findall(table_text)
+            if abis is None or abi in abis]
+
+
+
+def find_unistd_header(arch=None):
+    """
+    <Purpose>
+      Finds the installed header listing the system calls of an architecture.
+
+    <Arguments>
+      arch:
+        The architecture as named by platform.machine() eg x86_64 or i386, or
+        x32. Defaults to the architecture of this machine.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The path of the header or None if it was not found.
+    """
+
+    if arch is None:
+        arch = platform.machine()
+
+    header_names = [ARCH_HEADERS.get(arch, GENERIC_HEADER)]
+    if header_names[0] != GENERIC_HEADER:
+        header_names.append(GENERIC_HEADER)
+
+    for header_name in header_names:
+        for include_directory in INCLUDE_DIRECTORIES:
+            # the multiarch directory of the architecture comes first.
+            candidates = [os.path.join(include_directory, arch + "-linux-gnu",
+                                       header_name),
+                          os.path.join(include_directory, header_name)]
+            candidates.extend(sorted(glob.glob(os.path.join(include_directory,
+                                                            "*-linux-gnu*",
+                                                            header_name))))
+            for path in candidates:
+                if os.path.isfile(path):
+                    return path
+
+    return None
+
+
+
+def read_syscall_numbers(path=None, arch=None):
+    """
+    <Purpose>
+      Reads the system call names and numbers of an architecture from a
+      unistd header or a syscall table file.
+
+    <Arguments>
+      path:
+        The path of a header or a syscall_*.tbl file. Defaults to the installed
+        header of the architecture.
+
+      arch:
+        The architecture, used to find the header and to choose the ABIs of a
+        table file. Defaults to the architecture of this machine.
+
+    <Exceptions>
+      IOError if the header is not found or cannot be read.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A list of (name, number) tuples sorted by number.
+    """
+
+    if arch is None:
+        arch = platform.machine()
+
+    if path is None:
+        path = find_unistd_header(arch)
+        if path is None:
+            raise IOError("No unistd header found for " + arch + ".")
+
+    header_file = open(path, "rb")
+    try:
+        text = header_file.read().decode("utf-8", "replace")
+    finally:
+        header_file.close()
+
+    if path.endswith(".tbl"):
+        syscall_numbers = parse_syscall_table(text, ARCH_ABIS.get(arch))
+    else:
+        syscall_numbers = parse_unistd_header(text)
+
+    return sorted(syscall_numbers, key=lambda name_number: name_number[1])
+
+
+
+def get_syscall_names_list(path=None, arch=None):
+    """
+    Returns the list of the system call names of an architecture, in the
+    order of their numbers. See read_syscall_numbers.
+    """
+
+    # a name can have several numbers, eg one for each abi. the set finds the
+    # names already seen, the list keeps their order.
+    seen = set()
+    syscall_names_list = []
+    for name, number in read_syscall_numbers(path, arch):
+        if name not in seen:
+            seen.add(name)
+            syscall_names_list.append(name)
+
+    return syscall_names_list
+
+
+
+def merge_syscall_names_lists(man_names_list, header_names_list):
+    """
+    Returns the sorted list of the system call names in either list, each name
+    once.
+    """
+
+    return sorted(set(man_names_list).union(header_names_list))
+
+
+
+def diff_syscall_names_lists(man_names_list, header_names_list):
+    """
+    <Purpose>
+      Compares the system call names of the syscalls man page with the ones of
+      the headers.
+
+    <Arguments>
+      man_names_list:
+        The names parsed from the syscalls man page.
+
+      header_names_list:
+        The names read from the headers.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A tuple of the sorted list of the names only in the man page, eg the
+      system calls of other architectures or never implemented, and the sorted
+      list of the names only in the headers, eg system calls newer than the
+      man page.
+    """
+
+    man_names = set(man_names_list)
+    header_names = set(header_names_list)
+
+    return sorted(man_names - header_names), sorted(header_names - man_names)
+
+
+
+def main():
+    import sys
+
+    arguments = sys.argv[1:]
+    diff = "--diff" in arguments
+    if diff:
+        arguments.remove("--diff")
+
+    if len(arguments) > 1:
+        print("Usage: python -m sysDef.SyscallHeaders [--diff] [ARCH | PATH]")
+        exit()
+
+    path = None
+    arch = None
+    if arguments:
+        if os.path.isfile(arguments[0]):
+            path = arguments[0]
+        else:
+            arch = arguments[0]
+
+    if not diff:
+        for name, number in read_syscall_numbers(path, arch):
+            print(str(number) + "\t" + name)
+        return
+
+    from sysDef.SyscallManual import parse_syscall_names_list
+
+    only_in_man, only_in_headers = \
+        diff_syscall_names_lists(parse_syscall_names_list(),
+                                 get_syscall_names_list(path, arch))
+
+    print("Only in the syscalls man page (" + str(len(only_in_man)) + "):")
+    for name in only_in_man:
+        print(name)
+
+    print("")
+    print("Only in the headers (" + str(len(only_in_headers)) + "):")
+    for name in only_in_headers:
+        print(name)
+
+if __name__ == "__main__":
+    main()
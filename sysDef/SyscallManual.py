@@ -30,7 +30,7 @@
   Example running this program:
 
   running:
-    python SyscallManual.py open
+    python -m sysDef.SyscallManual open
 
   will return the definition of the open syscall which is:
     Syscall Name: open
@@ -42,14 +42,449 @@ import re
 import signal
 import subprocess
 
-from Definition import Definition
+from sysDef import Instrumentation
+from sysDef.Definition import Definition
 
 
 # controls printing
 DEBUG = False
 
+# a regular expression used to sanitize the read lines. Specifically it removes
+# the backspace characters and the character they hide to allow searching for
+# substrings. e.g. the string "example\b" will be replaced with the string
+# "exampl".
+_CHAR_BACKSPACE = re.compile(".\b")
 
-class SyscallManual:
+
+
+def read_man_page(syscall_name):
+    """
+    <Purpose>
+      Reads the man entry of the system call whose name is given as a parameter,
+      up to its DESCRIPTION line.
+
+      The output of man is read line by line as it is produced. Once the
+      DESCRIPTION line is read, the rest of the man page is not needed so man is
+      terminated instead of rendering the whole page.
+
+    <Arguments>
+      syscall_name:
+        The name of the system call for which to read the man page.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      man_page:
+        The text of the man page from its SYNOPSIS line up to its DESCRIPTION
+        line, or an empty string if no man entry exists. If either line is
+        missing the whole man page is returned instead.
+    """
+
+    man_page = _read_man_page_synopsis(syscall_name)
+
+    # if a man entry does not exist no definitions exists.
+    if man_page is None:
+        return ""
+
+    # in some platforms attempts to access the man page of system calls ending
+    # with 32 eg chown32 return the man page of the system call without the 32
+    # eg chown. Same goes for syscalls ending with 64. Other platforms can
+    # instead return an empty string which means the syscall definition will not
+    # be discovered. If this happens check if there is a man page for the
+    # syscall without the number at the end.
+    if(man_page == "" and
+       (syscall_name.endswith("32") or syscall_name.endswith("64"))):
+        man_page = _read_man_page_synopsis(syscall_name[:-2])
+        if man_page is None:
+            return ""
+
+    return man_page
+
+
+
+def _read_man_page_synopsis(page_name):
+    # the text of a man page as read_man_page returns it, or None if man
+    # failed eg because there is no man entry.
+    #
+    # https://blog.nelhage.com/2010/02/a-very-subtle-bug/
+    # restore the default SIGPIPE handler so that man and the programs it runs
+    # exit quietly once the pipe is closed.
+    process = subprocess.Popen(['man', '2', page_name], stdout=subprocess.PIPE,
+                               preexec_fn=lambda:
+                                   signal.signal(signal.SIGPIPE, signal.SIG_DFL))
+    Instrumentation.count("man_processes")
+
+    # readline is used instead of iterating over the file, which reads ahead in
+    # large blocks on python v2.
+    man_page_lines = []
+    synopsis_index = None
+    complete = False
+    try:
+        lines = (_decode_line(line)
+                 for line in iter(process.stdout.readline, b""))
+        for line, sanitized_line in find_synopsis(lines, keep_preceding=True):
+            if synopsis_index is None and sanitized_line == "SYNOPSIS":
+                synopsis_index = len(man_page_lines)
+            man_page_lines.append(line)
+            complete = (sanitized_line.strip() == "DESCRIPTION")
+    finally:
+        process.stdout.close()
+        if complete and process.poll() is None:
+            process.terminate()
+        returncode = process.wait()
+
+    if complete:
+        # drop the lines before the SYNOPSIS line.
+        return "\n".join(man_page_lines[synopsis_index:]) + "\n"
+
+    if returncode != 0:
+        return None
+
+    return "\n".join(man_page_lines)
+
+
+
+def _decode_line(line):
+    Instrumentation.count("bytes_read", len(line))
+    return line.decode("utf-8").rstrip("\n")
+
+
+
+def find_synopsis(man_page_lines, keep_preceding=False):
+    """
+    <Purpose>
+      Goes over the lines of a man page in a single pass and yields the lines
+      from the SYNOPSIS line up to and including the DESCRIPTION line. Lines
+      after the DESCRIPTION line are never read.
+
+    <Arguments>
+      man_page_lines:
+        An iterable of the lines of a man page as returned by man.
+
+      keep_preceding:
+        If True the lines before the SYNOPSIS line are yielded as well.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A generator of (line, sanitized_line) tuples where sanitized_line is the
+      line with its backspace characters removed.
+    """
+
+    in_synopsis = False
+    for line in man_page_lines:
+        # line could include backspaces \b which prevents from searching the line
+        # correctly. Remove backspaces.
+        # e.g. __llllsseeeekk(2)                  1.2
+        sanitized_line = _CHAR_BACKSPACE.sub("", line)
+
+        if not in_synopsis:
+            # the synopsis line itself is part of the synopsis.
+            in_synopsis = (sanitized_line == "SYNOPSIS")
+            if not (in_synopsis or keep_preceding):
+                continue
+
+        yield line, sanitized_line
+
+        # when we reach the description line then we can safely stop.
+        if in_synopsis and sanitized_line.strip() == "DESCRIPTION":
+            return
+
+
+
+def extract_synopsis(man_page):
+    """
+    <Purpose>
+      Returns the part of the text of a man page from the SYNOPSIS line up to
+      and including the DESCRIPTION line, which is the only part SyscallManual
+      needs.
+
+    <Arguments>
+      man_page:
+        The text of a man page as returned by man.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The SYNOPSIS part of the man page, or the whole man page if either line
+      is missing.
+    """
+
+    synopsis_lines = []
+    complete = False
+    for line, sanitized_line in find_synopsis(man_page.split("\n")):
+        synopsis_lines.append(line)
+        complete = (sanitized_line.strip() == "DESCRIPTION")
+
+    if not complete:
+        return man_page
+
+    return "\n".join(synopsis_lines) + "\n"
+
+
+
+def parse_man_page(man_page):
+    """
+    <Purpose>
+      Parses all the definitions given in the SYNOPSIS section of a man page.
+
+      A man page is usually shared by several system calls, eg chown, fchown,
+      lchown and chown32, so the definitions of a man page are parsed once and
+      the definition of each system call is then chosen from them.
+
+    <Arguments>
+      man_page:
+        The text of the man page. An empty string means that no man entry
+        exists.
+
+    <Exceptions>
+      Exception if the SYNOPSIS or DESCRIPTION line is missing.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      (page_type, all_definitions):
+        page_type is SyscallManual.NO_MAN_ENTRY if no manual entry was found,
+        SyscallManual.UNIMPLEMENTED if the system calls of the man page were
+        identified as unimplemented and SyscallManual.FOUND otherwise.
+        all_definitions is the list of Definition objects in the order they
+        appear in the man page.
+    """
+
+    # if a man entry does not exist no definitions exists.
+    if man_page == "":
+        return SyscallManual.NO_MAN_ENTRY, []
+
+    """
+    Example of the open man page, upto the definitions part:
+    
+    <--start example-->
+          OPEN(2)                  Linux Programmer's Manual           OPEN(2)
+    
+          NAME
+                 open, creat - open and possibly create a file or device
+    
+          SYNOPSIS
+                 #include <sys/types.h>
+                 #include <sys/stat.h>
+                 #include <fcntl.h>
+    
+                 int open(const char *pathname, int flags);
+                 int open(const char *pathname, int flags, mode_t mode);
+    
+                 int creat(const char *pathname, mode_t mode);
+    
+          DESCRIPTION
+    <--end example-->
+    
+    
+    Note that, as shown in the example above, a man page can have multiple
+    definitions for the same system call (2 definitions given for open) and it
+    can also include definitions of similar but different system calls (creat).
+    
+    """
+
+    # remove all lines until the "SYNOPSIS" line since the definitions of the
+    # system calls are given right after this line, and keep the lines up to
+    # the 'DESCRIPTION' line, indicating the end of the synopsis part. Refer
+    # to the example man page given above for more information. Each line is
+    # sanitized only once, as it is read.
+    synopsis_lines = []
+    for line, sanitized_line in find_synopsis(man_page.split("\n")):
+        synopsis_lines.append(sanitized_line.strip())
+
+    if len(synopsis_lines) == 0:
+        raise Exception("Reached end of man page while looking for SYNOPSIS line.")
+
+    if synopsis_lines[-1] != "DESCRIPTION":
+        raise Exception("Reached end of man page while looking for DESCRIPTION line.")
+
+    # drop the SYNOPSIS and DESCRIPTION lines.
+    synopsis_lines = synopsis_lines[1:-1]
+
+    # examine each line in between for whether it is a definition.
+    all_definitions = []
+    line_index = 0
+    while line_index < len(synopsis_lines):
+        line = synopsis_lines[line_index]
+        line_index += 1
+
+        # if the line includes the word "Unimplemented" then the system call is
+        # unimplemented.
+        if("Unimplemented" in line):
+            return SyscallManual.UNIMPLEMENTED, []
+
+        # we can skip the type definition lines.
+        if(line.startswith("typedef")):
+            continue
+
+        # remove comments if any. comments are wrapped in "/* */"
+        if("/*" in line and "*/" in line):
+            line = line[:line.find("/*")] + line[line.rfind("*/") + 2:]
+            line = line.strip()
+
+        # a definition line must contain at least two parts (separated by
+        # whitespace) and an opening bracket, otherwise it's not a definition. It
+        # is possible that definition spans multiple lines hence we don't
+        # expect it to have its closing bracket in the current line.
+        if(not (len(line.split()) > 1 and "(" in line)):
+            continue
+
+        # a definition can sometimes span multiple lines. If a definition line
+        # does not end with a semi-colon then the definition spans multiple lines.
+        # For up to three times or until the line ends with a semi-colon, join the
+        # line with the subsequent line.
+        times = 0
+        while(not line.endswith(";")):
+            # join the line with the subsequent line, without skipping it, to
+            # avoid skipping a definition.
+            if(line_index + times == len(synopsis_lines)):
+                break
+
+            line += " " + synopsis_lines[line_index + times]
+
+            # remove comments from the newly created line.
+            if("/*" in line and "*/" in line):
+                line = line[:line.find("/*")] + line[line.rfind("*/") + 2:]
+                line = line.strip()
+
+            # definitions cannot span more than 3 lines so don't join more than 3 lines.
+            times += 1
+            if(times == 3):
+                break
+
+        # at this point a complete definition must contain at least two
+        # parts(separated by whitespace), an opening bracket, a closing bracket
+        # and end with a semi-colon. if any of these requirements are missing,
+        # then the line is not a definition and we skip it.
+        if(not(len(line.split()) > 1 and "(" in line and line.endswith(");"))):
+            continue
+
+        if DEBUG:
+            print(line)
+
+        all_definitions.append(Definition(line))
+
+    return SyscallManual.FOUND, all_definitions
+
+
+
+def parse_syscall_names_list(man_page=None):
+    """
+    <Purpose>
+      Reads the man entry for 'syscalls' and parses all the names of the system 
+      calls in the system.
+    
+    <Arguments>
+      man_page:
+        The text of the 'syscalls' man page, if it was already read by the
+        caller. If None the man page is read using man.
+    
+    <Exceptions>
+      None
+    
+    <Side Effects>
+      None
+    
+    <Returns>
+      syscall_names_list: 
+        A list of all the system call names gathered from the man page of the 
+        syscalls man entry.
+    """
+
+
+
+    if man_page is None:
+        from sysDef.ManPageSource import ManCommandSource
+        man_page = ManCommandSource().read_page("syscalls")
+
+    # split into a list of lines.
+    man_page_lines = man_page.split("\n")
+
+    # remove all lines until the line with the first system call which includes
+    # the text "_llseek(2)" on a GNU/Linux 3.5.0-36-generic
+    while True:
+        if len(man_page_lines) == 0:
+            raise Exception("_llseek not found in syscalls man page.")
+
+        line = man_page_lines[0]
+
+        # line could include backspaces \b which prevents from searching the line
+        # correctly. Remove backspaces.
+        # eg: # __llllsseeeekk(2)                  1.2
+        line = _CHAR_BACKSPACE.sub("", line)
+
+        if "_llseek(2)" in line:
+            break
+
+        # if this is not the line we are looking for then remove the line and
+        # continue.
+        man_page_lines.pop(0)
+
+    # At this point the first item in man_page_lines should contain the name of
+    # the first system call. Get the names of all system calls up to the last one
+    # which should be the "writev" system call.
+    syscall_names_list = []
+
+    # loop until the last entry of the list of syscall names is writev.
+    while True:
+        if len(man_page_lines) == 0:
+            raise Exception("Reached the end of syscalls man page while trying to " +
+                          "read the syscall names.")
+
+        line = man_page_lines.pop(0).strip()
+
+        # sanitize line (remove backspaces)
+        line = _CHAR_BACKSPACE.sub("", line)
+
+        # skip empty lines.
+        if(line == ''):
+            continue
+
+        # we only need the name of the system call which should be the first part of
+        # the line.
+        #
+        # Example lines in syscalls man entry:
+        # afs_syscall(2)                            Not implemented
+        # alarm(2)
+        # alloc_hugepages(2)          2.5.36        Removed in 2.5.44
+        # perf_event_open(2)          2.6.31        Was called perf_counter_open()
+        #                                           in 2.6.31; renamed in 2.6.32
+        syscall_name = line.split(None, 1)[0].strip()
+
+        # all syscall names are followed by the "(2)" text. if not then they must be
+        # something else we don't need, so let's skip it.
+        if(not syscall_name.endswith("(2)")):
+            continue
+
+        # remove the "(2)" part and add it to the list.
+        syscall_name = syscall_name[:syscall_name.find("(2)")]
+        syscall_names_list.append(syscall_name)
+
+
+        # once we add the writev syscall we break since there are no more syscalls
+        # after this.
+        if(syscall_name == "writev"):
+            break
+
+    return syscall_names_list
+
+
+
+class SyscallManual(object):
     """
     <Purpose>
       A SyscallManual is made up of the system call name and its definition 
@@ -88,6 +523,12 @@ class SyscallManual:
       definition:
         Holds the definition object if the type is FOUND. Otherwise definition is 
         set to None.
+
+      page_fingerprint:
+        Identifies the man page the definition was parsed from, as an
+        (identity, digest) tuple of the identity given by its source and the
+        hash of its text. Used to tell whether the man page changed since. None
+        if unknown.
     
     """
 
@@ -97,8 +538,15 @@ class SyscallManual:
     UNIMPLEMENTED = 3
     FOUND = 4
 
+    # the names of the types.
+    TYPE_NAMES = {NO_MAN_ENTRY: "NO_MAN_ENTRY", NOT_FOUND: "NOT_FOUND",
+                  UNIMPLEMENTED: "UNIMPLEMENTED", FOUND: "FOUND"}
+
+    # manuals are kept without an instance dictionary.
+    __slots__ = ("name", "type", "definition", "page_fingerprint")
+
 
-    def __init__(self, syscall_name):
+    def __init__(self, syscall_name, man_page=None, page_definitions=None):
         """
         <Purpose>
           Creates a SyscallManual object.
@@ -111,6 +559,17 @@ class SyscallManual:
           syscall_name:
             The name of the system call for which to create a SyscallManual 
             object.
+
+          man_page:
+            The text of the man page of the system call, if it was already read
+            by the caller. An empty string means that no man entry exists. If
+            None the man page is read using read_man_page.
+
+          page_definitions:
+            The (page_type, all_definitions) tuple returned by parse_man_page
+            for the man page of the system call, if it was already parsed by
+            the caller eg for another system call sharing the same man page.
+            If given, man_page is not used.
         
         <Exceptions>
           None
@@ -122,19 +581,32 @@ class SyscallManual:
           None
         """
         self.name = syscall_name
-        self.type, self.definition = self._parse_definition(self.name)
+        self.page_fingerprint = None
 
+        if page_definitions is None:
+            if man_page is None:
+                man_page = read_man_page(syscall_name)
 
-    def _parse_definition(self, syscall_name):
+            page_definitions = parse_man_page(man_page)
+
+        self.type, self.definition = self._choose_definition(self.name,
+                                                             page_definitions)
+
+
+    def _parse_definition(self, syscall_name, man_page):
         """
         <Purpose>
-          Reads the man entry of the system call whose name is given as a parameter
-          and returns its definition as a Description object along with what kind of
-          definition it is.
+          Parses the man entry of the system call whose name is given as a
+          parameter and returns its definition as a Description object along with
+          what kind of definition it is.
         
         <Arguments>
           syscall_name:
             The name of the system call for which to get the definition.
+
+          man_page:
+            The text of the man page of the system call. An empty string means
+            that no man entry exists.
         
         <Exceptions>
           None
@@ -143,181 +615,48 @@ class SyscallManual:
           None
         
         <Returns>
-          (self.NO_MAN_ENTRY, None):   if no manual entry was found.
-          (self.NOT_FOUND, None):      if man entry found but definition not found.
-          (self.UNIMPLEMENTED, None):  if the system call was identified as unimplemented.
-          (self.FOUND, Definition()):  if the definition was found.
+          See _choose_definition.
         """
 
-        if DEBUG:
-            print("Given name of syscall to parse: " + syscall_name)
+        return self._choose_definition(syscall_name, parse_man_page(man_page))
 
-        # read the man page of syscall_name into a byte string.
-        #
-        # TODO: reading entire man page: current implementation is not concerned
-        # with performance too much.
-        try:
-            man_page_bytestring = subprocess.check_output(['man', '2', syscall_name], preexec_fn=lambda:
-                          signal.signal(signal.SIGPIPE, signal.SIG_DFL))
-        except subprocess.CalledProcessError:
-            # if a man entry does not exist no definitions exists.
-            return self.NO_MAN_ENTRY, None
-
-        # cast to string and split into a list of lines.
-        man_page_lines = man_page_bytestring.decode("utf-8").split("\n")
 
+    def _choose_definition(self, syscall_name, page_definitions):
         """
-        Example of the open man page, upto the definitions part:
-        
-        <--start example-->
-              OPEN(2)                  Linux Programmer's Manual           OPEN(2)
-        
-              NAME
-                     open, creat - open and possibly create a file or device
-        
-              SYNOPSIS
-                     #include <sys/types.h>
-                     #include <sys/stat.h>
-                     #include <fcntl.h>
-        
-                     int open(const char *pathname, int flags);
-                     int open(const char *pathname, int flags, mode_t mode);
-        
-                     int creat(const char *pathname, mode_t mode);
-        
-              DESCRIPTION
-        <--end example-->
-        
-        
-        Note that, as shown in the example above, a man page can have multiple
-        definitions for the same system call (2 definitions given for open) and it
-        can also include definitions of similar but different system calls (creat).
-        
-        """
-
-        # in some platforms attempts to access the man page of system calls ending
-        # with 32 eg chown32 return the man page of the system call without the 32
-        # eg chown. Same goes for syscalls ending with 64. Other platforms can
-        # instead return an empty string which means the syscall definition will not
-        # be discovered. If this happens check if there is a man page for the
-        # syscall without the number at the end.
-        if len(man_page_lines) == 1 and man_page_lines[0] == '':
-            # read the man page of syscall_name into a byte string.
-            if(syscall_name.endswith("32") or syscall_name.endswith("64")):
-                try:
-                    man_page_bytestring = subprocess.check_output(['man', '2', syscall_name[:-2]])
-                except subprocess.CalledProcessError:
-                    # if a man entry does not exist no definition exists.
-                    return self.NO_MAN_ENTRY, None
-
-                # cast to string and split into a list of lines.
-                man_page_lines = man_page_bytestring.decode("utf-8").split("\n")
-            else:
-                return self.NO_MAN_ENTRY, None
-
-
-        # a regular expression used to sanitize the read lines. Specifically it
-        # removes the backspace characters and the character they hide to allow
-        # searching for substrings. e.g. the string "example\b" will be replaced
-        # with the string "exampl".
-        char_backspace = re.compile(".\b")
-
-        # remove all lines until the "SYNOPSIS" line since the definitions of the
-        # system calls are given right after this line. Refer to the example man
-        # page given above for more information.
-        while True:
-            if len(man_page_lines) == 0:
-                raise Exception("Reached end of man page while looking for SYNOPSIS ine")
-
-            # read the first line
-            line = man_page_lines[0]
-
-            # and then remove the line
-            man_page_lines.pop(0)
-
-            # line could include backspaces \b which prevents from searching the line
-            # correctly. Remove backspaces.
-            # e.g. __llllsseeeekk(2)                  1.2
-            line = char_backspace.sub("", line)
-
-            # if the line is the synopsis line we don't want to remove any more lines.
-            if (line == "SYNOPSIS"):
-                break
-
-        # examine the lines until the 'DESCRIPTION' line is met, indicating the end
-        # of the synopsis part. Examine each line in between for whether it is a
-        # definition.
-        all_definitions = []
-        while True:
-            if len(man_page_lines) == 0:
-                raise Exception("Reached end of man page while looking for DESCRIPTION line.")
-
-            line = man_page_lines.pop(0).strip()
-
-            # remove backspaces from line
-            line = char_backspace.sub("", line)
-
-            # when we reach the description line then we can safely stop.
-            if (line == "DESCRIPTION"):
-                break
+        <Purpose>
+          Chooses the definition of the system call whose name is given as a
+          parameter among the definitions parsed from its man page.
 
-            # if the line includes the word "Unimplemented" then the system call is
-            # unimplemented.
-            if("Unimplemented" in line):
-                return self.UNIMPLEMENTED, None
+        <Arguments>
+          syscall_name:
+            The name of the system call for which to get the definition.
 
-            # we can skip the type definition lines.
-            if(line.startswith("typedef")):
-                continue
+          page_definitions:
+            The (page_type, all_definitions) tuple returned by parse_man_page.
 
-            # remove comments if any. comments are wrapped in "/* */"
-            if("/*" in line and "*/" in line):
-                line = line[:line.find("/*")] + line[line.rfind("*/") + 2:]
-                line = line.strip()
+        <Exceptions>
+          None
 
-            # a definition line must contain at least two parts (separated by
-            # whitespace) and an opening bracket, otherwise it's not a definition. It
-            # is possible that definition spans multiple lines hence we don't
-            # expect it to have its closing bracket in the current line.
-            if(not (len(line.split()) > 1 and "(" in line)):
-                continue
+        <Side Effects>
+          None
 
-            # a definition can sometimes span multiple lines. If a definition line
-            # does not end with a semi-colon then the definition spans multiple lines.
-            # For up to three times or until the line ends with a semi-colon, join the
-            # line with the subsequent line.
-            times = 0
-            while(not line.endswith(";")):
-                # join the line with the subsequent line, without removing it from the
-                # man_page_lines, to avoid skipping a definition.
-                nextLine = char_backspace.sub("", man_page_lines[times]).strip()
-                line += " " + nextLine
-
-                # remove comments from the newly created line.
-                if("/*" in line and "*/" in line):
-                    line = line[:line.find("/*")] + line[line.rfind("*/") + 2:]
-                    line = line.strip()
-
-                # definitions cannot span more than 3 lines so don't join more than 3 lines.
-                times += 1
-                if(times == 3):
-                    break
-
-            # at this point a complete definition must contain at least two
-            # parts(separated by whitespace), an opening bracket, a closing bracket
-            # and end with a semi-colon. if any of these requirements are missing,
-            # then the line is not a definition and we skip it.
-            if(not(len(line.split()) > 1 and "(" in line and line.endswith(");"))):
-                continue
+        <Returns>
+          (self.NO_MAN_ENTRY, None):   if no manual entry was found.
+          (self.NOT_FOUND, None):      if man entry found but definition not found.
+          (self.UNIMPLEMENTED, None):  if the system call was identified as unimplemented.
+          (self.FOUND, Definition()):  if the definition was found.
+        """
 
-            if DEBUG:
-                print(line)
+        if DEBUG:
+            print("Given name of syscall to parse: " + syscall_name)
 
-            all_definitions.append(Definition(line))
+        page_type, all_definitions = page_definitions
+        if page_type != self.FOUND:
+            return page_type, None
 
         # We will consume some of these definitions but let's keep the
-        # all_definitions variable intact which holds all the definitions parsed
-        # from the man page. It might be useful in the future.
+        # all_definitions list intact since it is shared by all the system calls
+        # of the man page.
         definitions = all_definitions[:]
 
         # As shown in the example above, some manual pages include multiple
@@ -395,6 +734,20 @@ class SyscallManual:
             return self.FOUND, similar_definitions[0]
 
 
+    def __getstate__(self):
+        return (self.name, self.type, self.definition, self.page_fingerprint)
+
+
+    def __setstate__(self, state):
+        # manuals pickled by older versions have a dictionary of attributes as
+        # their state, possibly without a page_fingerprint.
+        if isinstance(state, dict):
+            state = (state["name"], state["type"], state["definition"],
+                     state.get("page_fingerprint"))
+
+        self.name, self.type, self.definition, self.page_fingerprint = state
+
+
     def __repr__(self):
         representation = "Syscall Name: " + self.name + "\nDefinition:   "
 
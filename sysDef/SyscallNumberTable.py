@@ -0,0 +1,302 @@
+"""
+<Purpose>
+  Map the system call numbers of an architecture to SyscallManual objects.
+
+  Traces and audit logs record system calls by number, while definitions are
+  keyed by name. A SyscallNumberTable joins the numbers read from the kernel
+  headers of an architecture (see sysDef/SyscallHeaders.py) with a list of
+  SyscallManual objects into dense arrays indexed by number:
+    - the index of the SyscallManual of each number in the list, and
+    - the number of parameters of its definition,
+  both -1 for numbers without a system call or without a definition.
+
+  Numbers are decoded one at a time with lookup, or in batches with
+  lookup_batch. If NumPy is installed the arrays are NumPy arrays and a batch
+  of numbers, given as a NumPy array, is decoded with array indexing, without
+  a python loop per number. Otherwise the arrays are array.array objects and
+  every number is looked up in turn.
+
+  Example running this program:
+
+  running:
+    python -m sysDef.SyscallNumberTable syscall_definitions.pickle 0 2 59
+
+  will print the name, number of parameters and definition of system calls 0,
+  2 and 59 of this machine's architecture, and running:
+    python -m sysDef.SyscallNumberTable syscall_definitions.pickle --arch i386
+
+  will print the whole table of the i386 ABI.
+
+"""
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sysDef.SyscallHeaders import read_syscall_numbers
+from sysDef.SyscallManual import SyscallManual
+
+
+# the value of the arrays for numbers without a system call or definition.
+MISSING = -1
+
+
+
+class SyscallNumberTable(object):
+    """
+    <Purpose>
+      Maps the system call numbers of an architecture to SyscallManual
+      objects through dense arrays.
+
+    <Attributes>
+      syscall_manuals:
+        The list of SyscallManual objects the definition indices refer to.
+
+      base:
+        The smallest system call number, stored at index 0 of the arrays eg
+        0x40000000 for x32.
+
+      names:
+        A list with the name of the system call of each number, from base, or
+        None for numbers without a system call.
+
+      definition_indices:
+        An array with the index in syscall_manuals of the SyscallManual of
+        each number, from base, or MISSING.
+
+      argument_counts:
+        An array with the number of parameters of the definition of each
+        number, from base, or MISSING for numbers without a FOUND definition.
+
+    """
+
+    def __init__(self, syscall_manuals, syscall_numbers):
+        """
+        <Purpose>
+          Creates a SyscallNumberTable.
+
+        <Arguments>
+          syscall_manuals:
+            A list of SyscallManual objects.
+
+          syscall_numbers:
+            A list of (name, number) tuples, eg returned by
+            SyscallHeaders.read_syscall_numbers.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          None
+        """
+
+        self.syscall_manuals = syscall_manuals
+
+        manual_indices = {}
+        for index, syscall_manual in enumerate(syscall_manuals):
+            manual_indices.setdefault(syscall_manual.name, index)
+
+        if syscall_numbers:
+            self.base = min([number for name, number in syscall_numbers])
+            size = max([number for name, number in syscall_numbers]) - self.base + 1
+        else:
+            self.base = 0
+            size = 0
+
+        self.names = [None] * size
+        definition_indices = array.array("i", [MISSING]) * size
+        argument_counts = array.array("i", [MISSING]) * size
+
+        for name, number in syscall_numbers:
+            offset = number - self.base
+            self.names[offset] = name
+
+            index = manual_indices.get(name)
+            if index is None:
+                continue
+
+            definition_indices[offset] = index
+
+            syscall_manual = syscall_manuals[index]
+            if syscall_manual.type == SyscallManual.FOUND:
+                argument_counts[offset] = len(syscall_manual.definition.parameters)
+
+        if numpy is not None:
+            definition_indices = numpy.array(definition_indices, dtype=numpy.int32)
+            argument_counts = numpy.array(argument_counts, dtype=numpy.int32)
+
+        self.definition_indices = definition_indices
+        self.argument_counts = argument_counts
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def get_name(self, number):
+        """
+        Returns the name of the system call with the given number, or None.
+        """
+
+        offset = number - self.base
+        if offset < 0 or offset >= len(self.names):
+            return None
+
+        return self.names[offset]
+
+
+    def lookup(self, number):
+        """
+        Returns the SyscallManual of the system call with the given number, or
+        None if there is no such system call or it has no SyscallManual.
+        """
+
+        offset = number - self.base
+        if offset < 0 or offset >= len(self.names):
+            return None
+
+        index = self.definition_indices[offset]
+        if index == MISSING:
+            return None
+
+        return self.syscall_manuals[index]
+
+
+    def lookup_batch(self, numbers):
+        """
+        <Purpose>
+          Decodes a batch of system call numbers.
+
+        <Arguments>
+          numbers:
+            A NumPy array of system call numbers, or any sequence of numbers.
+
+        <Exceptions>
+          None
+
+        <Side Effects>
+          None
+
+        <Returns>
+          A tuple of two arrays with an item for each number: the index in
+          syscall_manuals of its SyscallManual and the number of parameters of
+          its definition, MISSING where unknown. NumPy int32 arrays if NumPy is
+          installed, array.array objects otherwise.
+        """
+
+        if numpy is None:
+            return self._lookup_batch_array(numbers)
+
+        offsets = numpy.asarray(numbers, dtype=numpy.int64) - self.base
+        if len(self.names) == 0:
+            missing = numpy.full(offsets.shape, MISSING, dtype=numpy.int32)
+            return missing, missing.copy()
+
+        # invalid numbers are read from index 0 and then masked out.
+        valid = (offsets >= 0) & (offsets < len(self.names))
+        offsets = numpy.where(valid, offsets, 0)
+
+        definition_indices = numpy.where(valid, self.definition_indices[offsets],
+                                         MISSING).astype(numpy.int32)
+        argument_counts = numpy.where(valid, self.argument_counts[offsets],
+                                      MISSING).astype(numpy.int32)
+
+        return definition_indices, argument_counts
+
+
+    def _lookup_batch_array(self, numbers):
+        size = len(self.names)
+        definition_indices = array.array("i")
+        argument_counts = array.array("i")
+        for number in numbers:
+            offset = number - self.base
+            if 0 <= offset < size:
+                definition_indices.append(self.definition_indices[offset])
+                argument_counts.append(self.argument_counts[offset])
+            else:
+                definition_indices.append(MISSING)
+                argument_counts.append(MISSING)
+
+        return definition_indices, argument_counts
+
+
+
+def build_number_table(syscall_manuals, path=None, arch=None):
+    """
+    <Purpose>
+      Builds the SyscallNumberTable of an architecture from its kernel
+      headers.
+
+    <Arguments>
+      syscall_manuals:
+        A list of SyscallManual objects.
+
+      path:
+        The path of a unistd header or syscall_*.tbl file. Defaults to the
+        installed header of the architecture.
+
+      arch:
+        The architecture eg x86_64, i386 or x32. Defaults to the architecture
+        of this machine.
+
+    <Exceptions>
+      IOError if the header is not found or cannot be read.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A SyscallNumberTable.
+    """
+
+    return SyscallNumberTable(syscall_manuals, read_syscall_numbers(path, arch))
+
+
+
+def main():
+    import argparse
+
+    from sysDef.DefinitionsDatabase import read_definitions
+
+    parser = argparse.ArgumentParser(description="Map system call numbers to " +
+                                     "their definitions.")
+    parser.add_argument("definitions", metavar="FILE",
+                        help="a pickle or database file of definitions.")
+    parser.add_argument("numbers", metavar="NUMBER", type=int, nargs="*",
+                        help="the system call numbers to decode. Defaults to " +
+                        "all of them.")
+    parser.add_argument("--arch", default=None,
+                        help="the architecture eg x86_64, i386 or x32. " +
+                        "Defaults to the architecture of this machine.")
+    parser.add_argument("--syscall-table", metavar="PATH", default=None,
+                        help="the unistd header or syscall_*.tbl file to read " +
+                        "the numbers from.")
+    args = parser.parse_args()
+
+    table = build_number_table(read_definitions(args.definitions),
+                               args.syscall_table, args.arch)
+
+    numbers = args.numbers
+    if not numbers:
+        numbers = [table.base + offset for offset in range(len(table))
+                   if table.names[offset] is not None]
+
+    definition_indices, argument_counts = table.lookup_batch(numbers)
+    for number, index, count in zip(numbers, definition_indices, argument_counts):
+        name = table.get_name(number)
+        if name is None:
+            print(str(number) + "\t-")
+        elif count == MISSING:
+            print(str(number) + "\t" + name + "\t-")
+        else:
+            print(str(number) + "\t" + name + "\t" + str(count) + "\t" +
+                  str(table.syscall_manuals[index].definition))
+
+if __name__ == "__main__":
+    main()
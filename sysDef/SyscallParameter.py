@@ -1,5 +1,45 @@
+import re
 
-class SyscallParameter:
+
+# a parameter string, made up of single space separated parts, as it appears in
+# a definition e.g. "const char *pathname" or "char *const argv[]". The type
+# qualifiers must appear in the same order __repr__ gives them, so that every
+# matched parameter is represented exactly as it appears in the man page. The
+# parts matched are, in order:
+#   const, struct, union, enum, unsigned:  the qualifiers of the type.
+#   type:  a single word e.g. char
+# then either a function pointer
+#   function name:  e.g. "(*fn)(void *)" in "int (*fn)(void *)" in clone
+# or
+#   const pointer:  "*const " e.g. in "char *const argv[]"
+#   pointer:  the "*" before the name
+#   name:  the name of the parameter
+#   array:  the "[]" after the name
+# a parameter ending with ")" can only be a function pointer.
+_PARAMETER = re.compile(r"(const )?(struct )?(union )?(enum )?(unsigned )?(\S+) "
+                        r"(?:(\(\*.*\))|(\*const )?(\*)?(\S*?)(\[\])?(?<!\)))$")
+
+# the parts of the ellipsis parameter.
+_EMPTY_PARTS = (None,) * _PARAMETER.groups
+
+# default number of parameters kept by a ParameterCache.
+MAX_PARAMETERS = 8192
+
+# used to set the attributes of immutable parameters.
+_set_attribute = object.__setattr__
+
+
+
+def _flag_property(flag):
+    # a boolean attribute of a parameter stored as a single bit of its flags.
+    def get_flag(self):
+        return (self.flags & flag) != 0
+
+    return property(get_flag)
+
+
+
+class SyscallParameter(object):
     """
     <Purpose>
       This object is used to describe a parameter of system call definitions.
@@ -42,10 +82,53 @@ class SyscallParameter:
     
       self.const_pointer:
         int execve(const char *filename, char *const argv[], char *const envp[])
+
+      self.flags:
+        All the boolean attributes above packed into a single integer, one bit
+        for each of the flags given below. The boolean attributes are
+        properties reading the bits of flags.
+
+      SyscallParameter objects are immutable so that a single object can be
+      shared by all the definitions with the same parameter. See
+      ParameterCache.
     
     """
 
-    def __init__(self, parameter_string):
+    # flags of a SyscallParameter.
+    ELLIPSIS = 1 << 0
+    ENUM = 1 << 1
+    ARRAY = 1 << 2
+    CONST = 1 << 3
+    UNION = 1 << 4
+    STRUCT = 1 << 5
+    POINTER = 1 << 6
+    UNSIGNED = 1 << 7
+    FUNCTION = 1 << 8
+    CONST_POINTER = 1 << 9
+
+    # the names of the boolean attributes and their flags, in the order they
+    # were set by older versions.
+    FLAG_NAMES = [("ellipsis", ELLIPSIS), ("enum", ENUM), ("array", ARRAY),
+                  ("const", CONST), ("union", UNION), ("struct", STRUCT),
+                  ("pointer", POINTER), ("unsigned", UNSIGNED),
+                  ("function", FUNCTION), ("const_pointer", CONST_POINTER)]
+
+    # parameters are kept without an instance dictionary.
+    __slots__ = ("type", "name", "flags")
+
+    ellipsis = _flag_property(ELLIPSIS)
+    enum = _flag_property(ENUM)
+    array = _flag_property(ARRAY)
+    const = _flag_property(CONST)
+    union = _flag_property(UNION)
+    struct = _flag_property(STRUCT)
+    pointer = _flag_property(POINTER)
+    unsigned = _flag_property(UNSIGNED)
+    function = _flag_property(FUNCTION)
+    const_pointer = _flag_property(CONST_POINTER)
+
+
+    def __init__(self, parameter_string, strings=None):
         """
         <Purpose>
           Creates a SyscallParameter object.
@@ -66,6 +149,10 @@ class SyscallParameter:
           parameter_string:
             The string part from a system call definition that describes a single 
             parameter.
+
+          strings:
+            An optional dictionary used to intern the type and name of the
+            parameter, so that equal strings are shared by all parameters.
         
         <Exceptions>
           An Exception will be raised if the format of the parameter string is not
@@ -78,77 +165,81 @@ class SyscallParameter:
           None
         """
 
-        # Let's first initialize all required fields.
-        self.type = None
-        self.name = None
-        self.ellipsis = False
-
-        # fields describing the type of the parameter.
-        self.enum = False
-        self.array = False
-        self.const = False
-        self.union = False
-        self.struct = False
-        self.pointer = False
-        self.unsigned = False
-        self.function = False
-        self.const_pointer = False
-
         # a parameter could be the ellipsis ("...")
         if(parameter_string == "..."):
             # type and name of the parameter remain None
-            self.ellipsis = True
-            return
-
-        # parameter can be a function pointer eg in clone:
-        # int clone(int (*fn)(void *), void *child_stack, int flags, void *arg, ...)
-        # ==> int (*fn)(void *)
-        if(parameter_string.endswith(")")):
-            self.function = True
-            # type will hold the return type of the function
-            self.type = parameter_string[:parameter_string.find(" (*")].strip()
-            # name will hold everything else.
-            # TODO: could potentially be more fine-grained parsed.
-            self.name = parameter_string[parameter_string.find(" (*"):].strip()
-
+            flags = self.ELLIPSIS
+            parts = _EMPTY_PARTS
         else:
-            # otherwise name is the right-most part and everything else is the type.
-            self.type, self.name = parameter_string.rsplit(None, 1)
-
-        # if the name starts with a "*" the parameter is a pointer.
-        if(self.name.startswith("*")):
-            self.pointer = True
-            self.name = self.name[1:]    # remove the asterisk.
-
-        # if the name ends with a "[]" the parameter is an array.
-        if(self.name.endswith("[]")):
-            self.array = True
-            self.name = self.name[:-2]    # remove square brackets.
-
-        # split and examine the parts of the type.
-        while(len(self.type.split()) > 1):
-            item, self.type = self.type.split(None, 1)
-
-            if(item == "unsigned"):
-                self.unsigned = True
-            elif(item == "const"):
-                self.const = True
-            elif(item == "struct"):
-                self.struct = True
-            elif(item == "union"):
-                self.union = True
-            elif(item == "enum"):
-                self.enum = True
-            else:
-                # it could be a constant pointer eg char *const argv[] in execve in
-                # which case the item variable holds the correct type of the pointer and
-                # self.type variable should hold the string "*const"
-                if(self.type == "*const"):
-                    self.const_pointer = True
-                    self.type = item
-                else:
-                    # if this is not the case then an unexpected format was encountered.
-                    raise Exception("Unexpected part in parameter: " + parameter_string)
+            match = _PARAMETER.match(parameter_string)
+            if match is None:
+                raise Exception("Unexpected part in parameter: " + parameter_string)
+
+            flags = 0
+            parts = match.groups()
+
+        # fill in all fields from the parts of the parameter matched in a single
+        # pass. Parts that were not matched are None.
+        (const, struct, union, enum, unsigned, parameter_type, function_name,
+         const_pointer, pointer, name, array) = parts
+
+        if enum is not None:
+            flags |= self.ENUM
+        if array is not None:
+            flags |= self.ARRAY
+        if const is not None:
+            flags |= self.CONST
+        if union is not None:
+            flags |= self.UNION
+        if struct is not None:
+            flags |= self.STRUCT
+        if pointer is not None:
+            flags |= self.POINTER
+        if unsigned is not None:
+            flags |= self.UNSIGNED
+        if const_pointer is not None:
+            flags |= self.CONST_POINTER
+
+        # a function pointer has the whole "(*fn)(void *)" part as its name.
+        # TODO: could potentially be more fine-grained parsed.
+        if function_name is not None:
+            flags |= self.FUNCTION
+            name = function_name
+
+        if strings is not None:
+            parameter_type = strings.setdefault(parameter_type, parameter_type)
+            name = strings.setdefault(name, name)
+
+        _set_attribute(self, "type", parameter_type)
+        _set_attribute(self, "name", name)
+        _set_attribute(self, "flags", flags)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SyscallParameter objects are immutable.")
+
+
+    def __delattr__(self, name):
+        raise AttributeError("SyscallParameter objects are immutable.")
+
+
+    def __getstate__(self):
+        return (self.type, self.name, self.flags)
+
+
+    def __setstate__(self, state):
+        # parameters pickled by older versions have a dictionary of attributes
+        # as their state.
+        if isinstance(state, dict):
+            flags = 0
+            for flag_name, flag in self.FLAG_NAMES:
+                if state.get(flag_name):
+                    flags |= flag
+            state = (state.get("type"), state.get("name"), flags)
+
+        _set_attribute(self, "type", state[0])
+        _set_attribute(self, "name", state[1])
+        _set_attribute(self, "flags", state[2])
 
     def __repr__(self):
         """
@@ -239,3 +330,102 @@ class SyscallParameter:
         representation = representation.strip(", ") + ">"
 
         return representation
+
+
+
+
+class ParameterCache(object):
+    """
+    <Purpose>
+      A ParameterCache is a function that returns the SyscallParameter object
+      of a parameter string, parsing it only if it was not parsed before.
+
+      Parameters such as "int fd" or "const char *pathname" appear in hundreds
+      of definitions. All of them share a single immutable SyscallParameter
+      object, and the types and names of all parameters are interned.
+
+      The cache is bounded. Once it holds max_size parameters it is cleared and
+      starts over, same as the cache of the re module. Objects returned before
+      are still valid.
+
+    <Attributes>
+      max_size:
+        The maximum number of parameters kept.
+
+      hits, misses:
+        The number of parameter strings found and not found in the cache. When
+        the cache is shared by several threads these are approximate.
+
+    """
+
+    def __init__(self, max_size=MAX_PARAMETERS):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        # parameters by their parameter string, and interned strings.
+        self._parameters = {}
+        self._strings = {}
+
+
+    def __call__(self, parameter_string):
+        """
+        <Purpose>
+          Returns the SyscallParameter object of the given parameter string.
+
+        <Arguments>
+          parameter_string:
+            The parameter string with its whitespace normalized, as given to
+            SyscallParameter.
+
+        <Exceptions>
+          An Exception will be raised if the format of the parameter string is not
+          recognized.
+
+        <Side Effects>
+          Stores the parameter in the cache if it was not already there.
+
+        <Returns>
+          A shared SyscallParameter object.
+        """
+
+        parameter = self._parameters.get(parameter_string)
+        if parameter is not None:
+            self.hits += 1
+            return parameter
+
+        self.misses += 1
+
+        if len(self._parameters) >= self.max_size:
+            self.clear()
+
+        parameter = SyscallParameter(parameter_string, self._strings)
+        self._parameters[parameter_string] = parameter
+
+        return parameter
+
+
+    def __len__(self):
+        return len(self._parameters)
+
+
+    def intern(self, string):
+        """
+        Returns the shared copy of a string equal to the given one.
+        """
+
+        return self._strings.setdefault(string, string)
+
+
+    def clear(self):
+        """
+        Removes all parameters and interned strings from the cache.
+        """
+
+        self._parameters.clear()
+        self._strings.clear()
+
+
+
+# the cache used to parse the parameters of all definitions.
+parameter_cache = ParameterCache()
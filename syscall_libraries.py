@@ -16,16 +16,32 @@
   library. If the order is set, then the libraries will be examined in that
   order, and each system call will appear only once, in the library first met.
 
+  Nothing is looked up when this module is imported. libc is found the first
+  time it is needed and its path is cached across runs (see
+  sysDef/ElfSymbols.py), and the methods of socket objects are read from the
+  socket class, without opening a socket.
+
 """
 
-import ctypes.util
 import os
-import pickle
 import socket
 import sys
 
-libc_name = ctypes.util.find_library('c')
-libc = ctypes.CDLL(libc_name)
+from sysDef.DefinitionsDatabase import read_definitions
+from sysDef.ElfSymbols import ElfError
+from sysDef.ElfSymbols import LIBRARY_CACHE_FILE
+from sysDef.ElfSymbols import SharedLibrary
+from sysDef.ElfSymbols import find_cached_library_path
+
+
+
+def get_libc_name(cache_file=LIBRARY_CACHE_FILE):
+    """
+    Returns the path of libc, found the first time it is asked for and kept in
+    cache_file for later runs, or None if it was not found.
+    """
+
+    return find_cached_library_path("c", cache_file)
 
 
 class SyscallLibrary:
@@ -55,11 +71,130 @@ class SyscallLibrary:
 
 
 
+def get_exported_names(module, names):
+    """
+    <Purpose>
+      Takes a snapshot of the names a library exports, out of the given names.
+
+      The names of python modules and objects are listed once with dir. The
+      symbols of a shared library are read from its ELF file (see
+      sysDef/ElfSymbols.py). If the file of a ctypes.CDLL cannot be read,
+      each name is looked up in it once instead, without keeping the
+      function pointer on the library object.
+
+    <Arguments>
+      module:
+        The python module, object, SharedLibrary or ctypes.CDLL to examine.
+
+      names:
+        A set of the names to look for.
+
+    <Exceptions>
+      None
+
+    <Side Effects>
+      None
+
+    <Returns>
+      The set of the given names the module has a (true) attribute for.
+    """
+
+    if isinstance(module, SharedLibrary):
+        return names.intersection(module.exported_names)
+
+    # a ctypes.CDLL can only be given once ctypes is imported.
+    ctypes = sys.modules.get("ctypes")
+    if ctypes is not None and isinstance(module, ctypes.CDLL):
+        try:
+            return names.intersection(SharedLibrary(module._name).exported_names)
+        except (ElfError, IOError, OSError):
+            pass
+
+        exported = set()
+        for name in names:
+            try:
+                module[name]
+            except AttributeError:
+                continue
+            exported.add(name)
+
+        return exported
+
+    return set([name for name in names.intersection(dir(module))
+                if getattr(module, name, False)])
+
+
+
+def get_library_index(libraries, names, order=None):
+    """
+    <Purpose>
+      Builds an index from each name to the libraries containing it.
+
+    <Arguments>
+      libraries:
+        A list of SyscallLibrary objects.
+
+      names:
+        A set of the names to look for.
+
+      order:
+        An optional list of library names. If given, only these libraries are
+        examined, in this order, and each name is mapped only to the first
+        library containing it. Names already found are not looked up in the
+        remaining libraries.
+
+    <Exceptions>
+      An Exception is raised if a library in the order is not in libraries.
+
+    <Side Effects>
+      None
+
+    <Returns>
+      A dictionary from each name contained in a library to the list of the
+      libraries containing it.
+    """
+
+    libraries_by_name = {}
+    for lib in libraries:
+        libraries_by_name.setdefault(lib.name, lib)
+
+    if order:
+        examined = []
+        for libname in order:
+            if libname not in libraries_by_name:
+                raise Exception("Library " + libname + " not found.")
+
+            lib = libraries_by_name[libname]
+            if lib not in examined:
+                examined.append(lib)
+    else:
+        examined = libraries
+
+    library_index = {}
+    remaining = set(names)
+    for lib in examined:
+        exported = get_exported_names(lib.module, remaining)
+
+        # in order, a name belongs only to the first library containing it.
+        if order:
+            remaining -= exported
+
+        for name in exported:
+            library_index.setdefault(name, []).append(lib)
+
+    return library_index
+
+
+
 def syscalls_per_library(libraries, syscall_definitions, order=None):
     """
     <Purpose>
       Given a set of libraries and a set of system calls, examine which system
       call is contained in which library.
+
+      The names exported by each library are looked up once, into an index
+      from each name to its libraries, so every system call is answered with
+      a single dictionary lookup.
     
     <Arguments>
       libraries:
@@ -77,57 +212,32 @@ def syscalls_per_library(libraries, syscall_definitions, order=None):
         library it is found in.
     
     <Exceptions>
-      None
+      An Exception is raised if a library in the order is not in libraries.
     
     <Side Effects>
-      None
+      Adds the names of the system calls found to the syscalls_contained of
+      the libraries.
     
     <Returns>
       not_in_libraries:
         A list of the system calls not found in any of the examined libraries.
     """
 
-    # remove libraries not contained in the order.
-    if order:
-        index = 0
-        while index < len(libraries):
-            if libraries[index].name not in order:
-                libraries.pop(index)
-            else:
-                index += 1
+    names = set([sd.name for sd in syscall_definitions])
+    library_index = get_library_index(libraries, names, order)
 
     # a list to hold all system calls not contained in any of the examined
     # libraries.
     not_in_libraries = []
 
     for sd in syscall_definitions:
-        contained = False
-        if order:
-            # if a library order was given, examine libraries in that order and
-            # include each system call only once, in the first library found.
-            lib = None
-            for libname in order:
-                for l in libraries:
-                    if l.name == libname:
-                        lib = l
-                        break
-
-                if lib == None:
-                    raise Exception("Library " + libname + " not found.")
-
-                if(getattr(lib.module, sd.name, False)):
-                    lib.syscalls_contained.append(sd.name)
-                    contained = True
-                    break
-
-            else:
-                for lib in libraries:
-                    if(getattr(lib.module, sd.name, False)):
-                        lib.syscalls_contained.append(sd.name)
-                        contained = True
-
-            if not contained:
-                not_in_libraries.append(sd.name)
+        containing_libraries = library_index.get(sd.name)
+        if containing_libraries is None:
+            not_in_libraries.append(sd.name)
+            continue
+
+        for lib in containing_libraries:
+            lib.syscalls_contained.append(sd.name)
 
     return not_in_libraries
 
@@ -135,26 +245,29 @@ def syscalls_per_library(libraries, syscall_definitions, order=None):
 
 
 def main():
-    # need exactly one argument which is the pickle file from which to get the
-    # syscall definitions.
+    # need exactly one argument which is the pickle or database file from which
+    # to get the syscall definitions.
     if len(sys.argv) != 2:
         raise Exception("Please give the name of the pickle file from which to " +
                       "read syscall definitions.")
 
-    # get the syscall definitions from the pickle file
-    pickle_file = open(sys.argv[1], 'rb')
-    syscall_definitions = pickle.load(pickle_file)
+    # get the syscall definitions from the database or the pickle file, which
+    # might have been written by an older version.
+    syscall_definitions = read_definitions(sys.argv[1])
 
-    sock_obj = socket.socket()
+    libc_name = get_libc_name()
+    if libc_name is None:
+        raise Exception("libc not found.")
 
     # the libraries we want to examine for whether they contain a function
     # corresponding to a system call.
     libraries = [
       SyscallLibrary("os", os),
       SyscallLibrary("sys", sys),
-      SyscallLibrary("libc", libc),
+      SyscallLibrary("libc", SharedLibrary(libc_name)),
       SyscallLibrary("socket", socket),
-      SyscallLibrary("sock_obj", sock_obj)
+      # the methods of socket objects are the ones of their class.
+      SyscallLibrary("sock_obj", socket.socket)
     ]
 
     # the order in which the libraries will be examined for whether they contain a